@@ -0,0 +1,138 @@
+"""new billing state model
+
+Revision ID: a5d2f8c3e710
+Revises: 4c9f1e7b2d53
+Create Date: 2026-10-19 17:05:52.119834
+
+"""
+from datetime import datetime
+from uuid import uuid4
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy_utils import UUIDType
+
+# revision identifiers, used by Alembic.
+revision = "a5d2f8c3e710"
+down_revision = "4c9f1e7b2d53"
+branch_labels = None
+depends_on = None
+
+
+def backfill_billing_states():
+    """Summarize the existing invoices of every owner, oldest first"""
+    invoices = sa.table(
+        "invoices",
+        sa.column("id", UUIDType(binary=False)),
+        sa.column("user_id", UUIDType(binary=False)),
+        sa.column("apartment_application_id", UUIDType(binary=False)),
+        sa.column("status", sa.String()),
+        sa.column("amount", sa.Float()),
+        sa.column("next_date", sa.Date()),
+        sa.column("created_at", sa.DateTime()),
+        sa.column("updated_at", sa.DateTime()),
+    )
+    billing_states = sa.table(
+        "billing_states",
+        sa.column("id", UUIDType(binary=False)),
+        sa.column("created_at", sa.DateTime()),
+        sa.column("user_id", UUIDType(binary=False)),
+        sa.column("apartment_application_id", UUIDType(binary=False)),
+        sa.column("latest_invoice_id", UUIDType(binary=False)),
+        sa.column("latest_invoice_status", sa.String()),
+        sa.column("next_due_date", sa.Date()),
+        sa.column("amount_outstanding", sa.Float()),
+        sa.column("amount_in_arrears", sa.Float()),
+        sa.column("last_paid_at", sa.DateTime()),
+    )
+    now = datetime.utcnow()
+    connection = op.get_bind()
+    rows = connection.execute(
+        sa.select([invoices]).order_by(invoices.c.created_at, invoices.c.id)
+    )
+    states = {}
+    for invoice in rows:
+        if invoice.apartment_application_id:
+            owner = ("apartment_application_id", invoice.apartment_application_id)
+        elif invoice.user_id:
+            owner = ("user_id", invoice.user_id)
+        else:
+            continue
+        state = states.setdefault(
+            owner,
+            {
+                "id": uuid4(),
+                "created_at": now,
+                "user_id": None,
+                "apartment_application_id": None,
+                owner[0]: owner[1],
+                "amount_outstanding": 0,
+                "amount_in_arrears": 0,
+                "last_paid_at": None,
+            },
+        )
+        state["latest_invoice_id"] = invoice.id
+        state["latest_invoice_status"] = invoice.status
+        state["next_due_date"] = invoice.next_date
+        if invoice.status == "paid":
+            # the time an invoice was paid was not kept, its last update is
+            state["last_paid_at"] = invoice.updated_at or state["last_paid_at"]
+        else:
+            state["amount_outstanding"] += invoice.amount
+        if invoice.status == "failed":
+            state["amount_in_arrears"] += invoice.amount
+    for state in states.values():
+        state["amount_outstanding"] = round(state["amount_outstanding"], 2)
+        state["amount_in_arrears"] = round(state["amount_in_arrears"], 2)
+    if states:
+        op.bulk_insert(billing_states, list(states.values()))
+
+
+def upgrade():
+    # ### commands auto generated by Alembic - please adjust! ###
+    op.create_table(
+        "billing_states",
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), nullable=True),
+        sa.Column("id", UUIDType(binary=False), nullable=False),
+        sa.Column("user_id", UUIDType(binary=False), nullable=True),
+        sa.Column("apartment_application_id", UUIDType(binary=False), nullable=True),
+        sa.Column("latest_invoice_id", UUIDType(binary=False), nullable=False),
+        sa.Column("latest_invoice_status", sa.String(), nullable=False),
+        sa.Column("next_due_date", sa.Date(), nullable=False),
+        sa.Column("amount_outstanding", sa.Float(), nullable=False),
+        sa.Column("amount_in_arrears", sa.Float(), nullable=False),
+        sa.Column("last_paid_at", sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(
+            ["apartment_application_id"],
+            ["apartment_applications.id"],
+        ),
+        sa.ForeignKeyConstraint(
+            ["latest_invoice_id"],
+            ["invoices.id"],
+        ),
+        sa.ForeignKeyConstraint(
+            ["user_id"],
+            ["users.id"],
+        ),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint(
+            "apartment_application_id",
+            name="uix_billing_states_apartment_application_id",
+        ),
+        sa.UniqueConstraint("user_id", name="uix_billing_states_user_id"),
+    )
+    op.create_index(
+        "ix_billing_states_next_due_date",
+        "billing_states",
+        ["next_due_date"],
+        unique=False,
+    )
+    # ### end Alembic commands ###
+    backfill_billing_states()
+
+
+def downgrade():
+    # ### commands auto generated by Alembic - please adjust! ###
+    op.drop_index("ix_billing_states_next_due_date", table_name="billing_states")
+    op.drop_table("billing_states")
+    # ### end Alembic commands ###
@@ -0,0 +1,117 @@
+"""persisted apartment application status
+
+Revision ID: d3b8f6a2c914
+Revises: c7e3a1f9b265
+Create Date: 2026-10-19 18:21:07.408517
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "d3b8f6a2c914"
+down_revision = "c7e3a1f9b265"
+branch_labels = None
+depends_on = None
+
+
+def backfill_application_statuses():
+    """Set the status the former status case expression computed"""
+    applications = sa.table(
+        "apartment_applications",
+        sa.column("id"),
+        sa.column("is_rejected", sa.Boolean()),
+        sa.column("is_considered", sa.Boolean()),
+        sa.column("status", sa.String()),
+    )
+    contracts = sa.table(
+        "contracts",
+        sa.column("apartment_application_id"),
+        sa.column("landlord_has_signed", sa.Boolean()),
+        sa.column("tenant_has_signed", sa.Boolean()),
+        sa.column("landlord_has_provided_keys", sa.Boolean()),
+        sa.column("tenant_has_received_keys", sa.Boolean()),
+        sa.column("landlord_declined", sa.Boolean()),
+        sa.column("tenant_declined", sa.Boolean()),
+        sa.column("canceled", sa.Boolean()),
+        sa.column("expired", sa.Boolean()),
+    )
+    failed = sa.or_(
+        contracts.c.landlord_declined.is_(True),
+        contracts.c.tenant_declined.is_(True),
+        contracts.c.canceled.is_(True),
+        contracts.c.expired.is_(True),
+    )
+    signed = sa.and_(
+        contracts.c.landlord_has_signed.is_(True),
+        contracts.c.tenant_has_signed.is_(True),
+    )
+    keys_handed_over = sa.and_(
+        contracts.c.landlord_has_provided_keys.is_(True),
+        contracts.c.tenant_has_received_keys.is_(True),
+    )
+    has_contract = applications.c.id.in_(
+        sa.select([contracts.c.apartment_application_id])
+    )
+    considered = sa.and_(
+        applications.c.is_considered.is_(True),
+        applications.c.is_rejected.is_(False),
+    )
+
+    def with_contract(condition):
+        return sa.and_(
+            considered,
+            applications.c.id.in_(
+                sa.select([contracts.c.apartment_application_id]).where(condition)
+            ),
+        )
+
+    for status, condition in [
+        (
+            "new",
+            sa.and_(
+                applications.c.is_considered.is_(False),
+                applications.c.is_rejected.is_(False),
+            ),
+        ),
+        ("rejected", applications.c.is_rejected.is_(True)),
+        ("considered", sa.and_(considered, sa.not_(has_contract))),
+        ("failed", with_contract(failed)),
+        ("processing", with_contract(sa.and_(sa.not_(failed), sa.not_(signed)))),
+        (
+            "awarded",
+            with_contract(sa.and_(sa.not_(failed), signed, sa.not_(keys_handed_over))),
+        ),
+        (
+            "completed",
+            with_contract(sa.and_(sa.not_(failed), signed, keys_handed_over)),
+        ),
+    ]:
+        op.execute(applications.update().where(condition).values(status=status))
+
+
+def upgrade():
+    # ### commands auto generated by Alembic - please adjust! ###
+    op.add_column(
+        "apartment_applications", sa.Column("status", sa.String(), nullable=True)
+    )
+    backfill_application_statuses()
+    op.alter_column("apartment_applications", "status", nullable=False)
+    op.create_index(
+        "ix_apartment_applications_apartment_id_status",
+        "apartment_applications",
+        ["apartment_id", "status"],
+        unique=False,
+    )
+    # ### end Alembic commands ###
+
+
+def downgrade():
+    # ### commands auto generated by Alembic - please adjust! ###
+    op.drop_index(
+        "ix_apartment_applications_apartment_id_status",
+        table_name="apartment_applications",
+    )
+    op.drop_column("apartment_applications", "status")
+    # ### end Alembic commands ###
@@ -0,0 +1,378 @@
+"""
+Simulate a billing run at scale.
+
+Seeds --users subscribers and --tenancies completed tenancies (a landlord,
+an apartment, a tenant, an awarded application and a completed contract
+each) with --history months of paid invoices into a scratch database, of
+which --due-ratio are due today. Then runs both billing runs the way the
+workers do:
+
+* scheduling runs due_rent_applications and due_subscriptions through
+  dispatch_in_chunks like generate_rent_invoices and
+  generate_subscription_invoices, with the celery chunks recorded instead of
+  sent to a broker and billing keys claimed in memory
+* creation runs create_rent_invoice and create_subscription_invoice for
+  every dispatched call on --concurrency threads, standing in for worker
+  processes, against the fake payment gateway waiting --latency seconds per
+  call
+
+Reports the wall time of each phase, invoices per second, database
+statements per invoice, peak Python memory and the payment gateway's peak
+concurrency. Keep --concurrency within the connection pool (15 by default).
+
+The database is given with --database-url and must be a scratch one: its
+schema is created when missing and seeded rows are never removed.
+
+Usage: python benchmarks/billing_simulation.py --database-url postgresql://...
+           [--users 10000] [--tenancies 1000] [--history 12] [--due-ratio 1]
+           [--latency 0.2] [--concurrency 8] [--json]
+"""
+import argparse
+import json
+import os
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from uuid import uuid4
+
+SEED_BATCH_SIZE = 5000
+
+
+class MemoryClaims:
+    def __init__(self):
+        self.keys = set()
+
+    def claim(self, key: str) -> bool:
+        if key in self.keys:
+            return False
+        self.keys.add(key)
+        return True
+
+    def release(self, *keys: str):
+        self.keys.difference_update(keys)
+
+
+class RecordingTask:
+    """Stands in for the celery task, keeps the dispatched calls"""
+
+    def __init__(self, task):
+        self.task = task
+        self.calls = []
+
+    def chunks(self, calls, chunk_size):
+        self.calls.extend(calls)
+        return self
+
+    def apply_async(self, queue=None):
+        pass
+
+
+class StatementCounter:
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, *args):
+        with self._lock:
+            self.count += 1
+
+
+def invoice_history(owner: dict, months: int, due: bool, amount: float):
+    """Monthly paid invoices, the latest due today or in the middle of a month"""
+    today = datetime.utcnow().date()
+    latest_next_date = today if due else today + timedelta(days=15)
+    invoices = []
+    for month in reversed(range(months)):
+        next_date = latest_next_date - timedelta(days=30 * month)
+        invoices.append(
+            {
+                "id": uuid4(),
+                **owner,
+                "status": "paid",
+                "amount": amount,
+                "description": "Simulated invoice",
+                "payment_id": f"tr_sim{uuid4().hex[:10]}",
+                "next_date": next_date,
+                "created_at": datetime.combine(
+                    next_date - timedelta(days=30), datetime.min.time()
+                ),
+            }
+        )
+    latest = invoices[-1]
+    billing_state = {
+        "id": uuid4(),
+        **owner,
+        "latest_invoice_id": latest["id"],
+        "latest_invoice_status": "paid",
+        "next_due_date": latest["next_date"],
+        "amount_outstanding": 0,
+        "amount_in_arrears": 0,
+        "last_paid_at": latest["created_at"],
+    }
+    return invoices, billing_state
+
+
+def seed(models, session_scope, args) -> dict:
+    """Insert the simulated users, tenancies and invoice histories in batches"""
+    tag = uuid4().hex[:8]
+    due_every = max(1, round(1 / args.due_ratio)) if args.due_ratio else 0
+    today = datetime.utcnow().date()
+
+    def user(kind: str, index: int, role: str) -> dict:
+        return {
+            "id": uuid4(),
+            "first_name": "Simulated",
+            "last_name": kind,
+            "email": f"sim-{tag}-{kind}-{index}@digirent.test",
+            "email_verified": True,
+            "role": role,
+        }
+
+    def insert(rows: dict):
+        with session_scope() as session:
+            for model in [
+                models.User,
+                models.Apartment,
+                models.ApartmentApplication,
+                models.Contract,
+                models.Invoice,
+                models.BillingState,
+            ]:
+                if rows.get(model):
+                    session.execute(model.__table__.insert(), rows[model])
+
+    started = time.perf_counter()
+    for start in range(0, args.users, SEED_BATCH_SIZE):
+        rows = {models.User: [], models.Invoice: [], models.BillingState: []}
+        for index in range(start, min(start + SEED_BATCH_SIZE, args.users)):
+            subscriber = user(
+                "subscriber", index, "tenant" if index % 2 else "landlord"
+            )
+            invoices, billing_state = invoice_history(
+                {"user_id": subscriber["id"], "type": "subscription"},
+                args.history,
+                due_every and index % due_every == 0,
+                10,
+            )
+            rows[models.User].append(subscriber)
+            rows[models.Invoice].extend(invoices)
+            rows[models.BillingState].append(billing_state)
+        insert(rows)
+    for start in range(0, args.tenancies, SEED_BATCH_SIZE):
+        rows = {
+            models.User: [],
+            models.Apartment: [],
+            models.ApartmentApplication: [],
+            models.Contract: [],
+            models.Invoice: [],
+            models.BillingState: [],
+        }
+        for index in range(start, min(start + SEED_BATCH_SIZE, args.tenancies)):
+            landlord = user("landlord", index, "landlord")
+            tenant = user("tenant", index, "tenant")
+            apartment = {
+                "id": uuid4(),
+                "name": f"Simulated apartment {index}",
+                "monthly_price": 950,
+                "utilities_price": 100,
+                "address": "Simulated street 1",
+                "country": "Netherlands",
+                "state": "Noord-Holland",
+                "city": "Amsterdam",
+                "description": "Simulated apartment",
+                "house_type": "duplex",
+                "furnish_type": "furnished",
+                "bedrooms": 2,
+                "bathrooms": 1,
+                "size": 60,
+                "available_from": today - timedelta(days=30 * args.history),
+                "available_to": today + timedelta(days=365),
+                "landlord_id": landlord["id"],
+                "tenant_id": tenant["id"],
+            }
+            application = {
+                "id": uuid4(),
+                "apartment_id": apartment["id"],
+                "tenant_id": tenant["id"],
+                "is_considered": True,
+                "is_rejected": False,
+                "status": "completed",
+            }
+            signed_on = datetime.utcnow() - timedelta(days=30 * args.history)
+            contract = {
+                "id": uuid4(),
+                "apartment_application_id": application["id"],
+                "landlord_has_signed": True,
+                "landlord_signed_on": signed_on,
+                "tenant_has_signed": True,
+                "tenant_signed_on": signed_on,
+                "landlord_has_provided_keys": True,
+                "landlord_provided_keys_on": signed_on,
+                "tenant_has_received_keys": True,
+                "tenant_received_keys_on": signed_on,
+            }
+            invoices, billing_state = invoice_history(
+                {"apartment_application_id": application["id"], "type": "rent"},
+                args.history,
+                due_every and index % due_every == 0,
+                1050,
+            )
+            rows[models.User].extend([landlord, tenant])
+            rows[models.Apartment].append(apartment)
+            rows[models.ApartmentApplication].append(application)
+            rows[models.Contract].append(contract)
+            rows[models.Invoice].extend(invoices)
+            rows[models.BillingState].append(billing_state)
+        insert(rows)
+    return {
+        "users": args.users,
+        "tenancies": args.tenancies,
+        "invoices": (args.users + args.tenancies) * args.history,
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+
+
+def measure(phase):
+    """Run phase() and return its result with wall time and peak memory"""
+    tracemalloc.start()
+    started = time.perf_counter()
+    try:
+        result = phase()
+    finally:
+        seconds = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return result, {"seconds": round(seconds, 3), "peak_memory_bytes": peak}
+
+
+def simulate(args) -> dict:
+    # the application reads its configuration on import
+    os.environ["DATABASE_URL"] = args.database_url
+    os.environ["PAYMENT_GATEWAY"] = "fake"
+    os.environ["FAKE_PAYMENT_GATEWAY_LATENCY_SECONDS"] = str(args.latency)
+    from sqlalchemy import event
+    from digirent.core.services.payment_gateway import get_payment_gateway
+    from digirent.database import models
+    from digirent.database.base import Base, SessionLocal, engine, session_scope
+    from digirent.database.enums import InvoiceType
+    from digirent.util import get_current_date
+    from digirent.worker.dispatch import dispatch_in_chunks
+    from digirent.worker.rent import create_rent_invoice, due_rent_applications
+    from digirent.worker.subscription import (
+        create_subscription_invoice,
+        due_subscriptions,
+    )
+
+    Base.metadata.create_all(engine)
+    results = {"seed": seed(models, session_scope, args)}
+    statements = StatementCounter()
+    event.listen(engine, "before_cursor_execute", statements)
+
+    def schedule():
+        session = SessionLocal()
+        try:
+            tasks = []
+            for task, kind, due, queue in [
+                (create_rent_invoice, InvoiceType.RENT, due_rent_applications, "rent"),
+                (
+                    create_subscription_invoice,
+                    InvoiceType.SUBSCRIPTION,
+                    due_subscriptions,
+                    "subscription",
+                ),
+            ]:
+                recording = RecordingTask(task)
+                dispatch_in_chunks(
+                    recording,
+                    kind,
+                    due(session, get_current_date()).yield_per(1000),
+                    queue=f"{queue}-queue",
+                    claims=MemoryClaims(),
+                )
+                tasks.append(recording)
+            return tasks
+        finally:
+            session.close()
+
+    statements.count = 0
+    tasks, results["schedule"] = measure(schedule)
+    results["schedule"]["statements"] = statements.count
+    calls = [(recording.task, call) for recording in tasks for call in recording.calls]
+    results["schedule"]["due"] = {
+        recording.task.name.split(".")[-1]: len(recording.calls) for recording in tasks
+    }
+
+    def run_task(item) -> str:
+        task, call = item
+        try:
+            return task(*call)
+        except Exception as err:
+            return f"error: {type(err).__name__}"
+
+    def create():
+        with ThreadPoolExecutor(args.concurrency) as executor:
+            return Counter(executor.map(run_task, calls))
+
+    statements.count = 0
+    outcomes, results["create"] = measure(create)
+    created = outcomes.get("created", 0)
+    seconds = results["create"]["seconds"]
+    gateway = get_payment_gateway()
+    results["create"].update(
+        {
+            "outcomes": dict(outcomes),
+            "invoices_per_second": round(created / seconds, 1) if seconds else None,
+            "statements_per_invoice": (
+                round(statements.count / created, 1) if created else None
+            ),
+            "gateway_calls": gateway.calls,
+            "gateway_max_in_flight": gateway.max_in_flight,
+        }
+    )
+    return results
+
+
+def report(results: dict):
+    seed, schedule, create = results["seed"], results["schedule"], results["create"]
+    print(
+        f"seeded {seed['users']} subscribers and {seed['tenancies']} tenancies"
+        f" with {seed['invoices']} invoices in {seed['seconds']}s"
+    )
+    print(
+        f"schedule: {schedule['due']} due in {schedule['seconds']}s,"
+        f" {schedule['statements']} statements,"
+        f" peak memory {schedule['peak_memory_bytes'] / 2 ** 20:.1f} MiB"
+    )
+    print(
+        f"  create: {create['outcomes']} in {create['seconds']}s"
+        f" ({create['invoices_per_second']} invoices/s),"
+        f" {create['statements_per_invoice']} statements per invoice,"
+        f" peak memory {create['peak_memory_bytes'] / 2 ** 20:.1f} MiB,"
+        f" gateway {create['gateway_calls']} calls"
+        f" with at most {create['gateway_max_in_flight']} in flight"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--database-url", required=True)
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--tenancies", type=int, default=1000)
+    parser.add_argument("--history", type=int, default=12)
+    parser.add_argument("--due-ratio", type=float, default=1)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+    results = simulate(args)
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        report(results)
+
+
+if __name__ == "__main__":
+    main()
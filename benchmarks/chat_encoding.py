@@ -0,0 +1,100 @@
+"""
+Benchmark outbound chat event encoding.
+
+Measures messages per second per core (process CPU time) for building and
+encoding MESSAGE events as JSON and MessagePack, one event per frame and
+coalesced into batched frames, and the cost of building events through the
+ChatEvent pydantic model versus plain dicts.
+
+Usage: python benchmarks/chat_encoding.py [--messages 100000] [--batch-size 50]
+"""
+import argparse
+import time
+from datetime import datetime
+from uuid import uuid4
+from digirent.api.chat import codec
+from digirent.api.chat.chat import ChatEvent, ChatEventType, chat_event
+from digirent.api.chat.codec import ChatEncoding
+
+
+def sample_data() -> dict:
+    return {
+        "id": str(uuid4()),
+        "from": str(uuid4()),
+        "to": str(uuid4()),
+        "message": "Hello, is the apartment still available next month?",
+        "created_at": datetime.utcnow().isoformat(),
+    }
+
+
+def measure(func, count: int) -> float:
+    """Run func and return processed messages per cpu second"""
+    start = time.process_time()
+    func()
+    elapsed = time.process_time() - start
+    return count / elapsed if elapsed else float("inf")
+
+
+def bench_build(messages: int, data: dict):
+    def with_model():
+        for _ in range(messages):
+            ChatEvent(event_type=ChatEventType.MESSAGE, data=data).dict(by_alias=True)
+
+    def with_dict():
+        for _ in range(messages):
+            chat_event(ChatEventType.MESSAGE, data)
+
+    return measure(with_model, messages), measure(with_dict, messages)
+
+
+def bench_encoding(encoding: ChatEncoding, messages: int, batch_size: int, data):
+    event = chat_event(ChatEventType.MESSAGE, data)
+    batch = [event] * batch_size
+    frames = max(messages // batch_size, 1)
+
+    def single():
+        for _ in range(messages):
+            codec.decode(encoding, codec.encode(encoding, event))
+
+    def batched():
+        for _ in range(frames):
+            codec.decode(encoding, codec.encode(encoding, batch))
+
+    return (
+        measure(single, messages),
+        measure(batched, frames * batch_size),
+        len(codec.encode(encoding, event)),
+        len(codec.encode(encoding, batch)) / batch_size,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--messages", type=int, default=100000)
+    parser.add_argument("--batch-size", type=int, default=50)
+    args = parser.parse_args()
+    data = sample_data()
+
+    model_rate, dict_rate = bench_build(args.messages, data)
+    print(f"event construction ({args.messages} messages)")
+    print(f"  ChatEvent(...).dict(): {model_rate:12,.0f} msg/s/core")
+    print(f"  chat_event():          {dict_rate:12,.0f} msg/s/core")
+    print()
+    print(
+        f"{'encoding':<10}{'single msg/s':>16}{'batched msg/s':>16}"
+        f"{'bytes/msg':>12}{'batched bytes/msg':>20}"
+    )
+    for encoding in codec.supported_encodings():
+        single, batched, size, batched_size = bench_encoding(
+            encoding, args.messages, args.batch_size, data
+        )
+        print(
+            f"{encoding.value:<10}{single:>16,.0f}{batched:>16,.0f}"
+            f"{size:>12}{batched_size:>20.1f}"
+        )
+    if ChatEncoding.MSGPACK not in codec.supported_encodings():
+        print("\nmsgpack is not installed, install the msgpack extra to compare")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,426 @@
+"""
+Load test the chat websocket.
+
+Seeds --users verified tenants and an admin (reused across runs), opens one
+websocket per user to /api/chat/ws/{token} and sends --rate messages per
+second in total between random pairs of users for --duration seconds.
+
+Reports connect latency, end to end delivery latency percentiles, delivered
+throughput, server memory per connection and database pool usage, sampled
+from /api/chat/stats while the test runs.
+
+By default the application is served in-process by uvicorn on a free port.
+In that mode the clients share the server's process, so memory per connection
+includes the client side of each socket. Pass --url to target a running
+deployment instead; it must share this environment's database and SECRET_KEY
+so seeded users and their tokens are valid there.
+
+Usage: python benchmarks/chat_load.py [--users 200] [--rate 200] [--duration 30]
+           [--url http://localhost:8000] [--encoding json] [--batch] [--json]
+           [--cleanup]
+"""
+import argparse
+import asyncio
+import json
+import random
+import socket
+import threading
+import time
+from typing import List, Optional, Tuple
+from uuid import UUID
+import httpx
+import uvicorn
+import websockets
+import digirent.util as util
+from digirent.api.chat import codec
+from digirent.api.chat.chat import ChatEventType, chat_event
+from digirent.api.chat.codec import ChatEncoding
+from digirent.database.base import session_scope
+from digirent.database.models import Admin, ChatMessage, ChatReadState, Tenant, User
+
+USER_EMAIL = "chat-load-{}@digirent.test"
+ADMIN_EMAIL = "chat-load-admin@digirent.test"
+
+
+def seed_users(count: int) -> Tuple[List[UUID], UUID]:
+    """Create missing load test users, returns tenant ids and the admin id"""
+    emails = [USER_EMAIL.format(index) for index in range(count)]
+    with session_scope() as session:
+        existing = {
+            str(email): user_id
+            for email, user_id in session.query(User.email, User.id).filter(
+                User.email.in_(emails + [ADMIN_EMAIL])
+            )
+        }
+        hashed_password = util.hash_password("chat-load")
+        new_users = [
+            Tenant(
+                first_name="Chat",
+                last_name=f"Load {index}",
+                email=email,
+                hashed_password=hashed_password,
+                email_verified=True,
+            )
+            for index, email in enumerate(emails)
+            if email not in existing
+        ]
+        if ADMIN_EMAIL not in existing:
+            new_users.append(
+                Admin(
+                    first_name="Chat",
+                    last_name="Load Admin",
+                    email=ADMIN_EMAIL,
+                    hashed_password=hashed_password,
+                    email_verified=True,
+                )
+            )
+        session.add_all(new_users)
+        session.flush()
+        existing.update({str(user.email): user.id for user in new_users})
+    return [existing[email] for email in emails], existing[ADMIN_EMAIL]
+
+
+def cleanup(user_ids: List[UUID], admin_id: UUID):
+    """Delete the seeded users with their chat messages and read states"""
+    user_ids = user_ids + [admin_id]
+    with session_scope() as session:
+        session.query(ChatReadState).filter(
+            ChatReadState.user_id.in_(user_ids)
+            | ChatReadState.other_user_id.in_(user_ids)
+        ).delete(synchronize_session=False)
+        session.query(ChatMessage).filter(
+            ChatMessage.from_user_id.in_(user_ids)
+            | ChatMessage.to_user_id.in_(user_ids)
+        ).delete(synchronize_session=False)
+        session.query(User).filter(User.id.in_(user_ids)).delete(
+            synchronize_session=False
+        )
+
+
+def access_token(user_id: UUID) -> str:
+    token = util.create_access_token(data={"sub": str(user_id)})
+    return token.decode() if isinstance(token, bytes) else token
+
+
+def start_server() -> Tuple[uvicorn.Server, threading.Thread, str]:
+    """Serve the application on a free local port in a background thread"""
+    from digirent.web_app import get_app
+
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    server = uvicorn.Server(
+        uvicorn.Config(get_app(), host="127.0.0.1", port=port, log_level="warning")
+    )
+    # signal handlers can only be installed from the main thread
+    server.install_signal_handlers = lambda: None
+    thread = threading.Thread(
+        target=lambda: asyncio.new_event_loop().run_until_complete(server.serve()),
+        daemon=True,
+    )
+    thread.start()
+    while not server.started:
+        if not thread.is_alive():
+            raise RuntimeError("In-process server failed to start")
+        time.sleep(0.05)
+    return server, thread, f"http://127.0.0.1:{port}"
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, round(pct / 100 * (len(values) - 1)))]
+
+
+def summarize(values: List[float]) -> dict:
+    """Latency percentiles in milliseconds"""
+    summary = {f"p{pct}": percentile(values, pct) for pct in (50, 95, 99)}
+    summary["max"] = max(values, default=None)
+    return {
+        key: round(value * 1000, 2) if value is not None else None
+        for key, value in summary.items()
+    }
+
+
+class Metrics:
+    def __init__(self):
+        self.connect_latencies: List[float] = []
+        self.delivery_latencies: List[float] = []
+        self.connect_errors = 0
+        self.send_errors = 0
+        self.sent = 0
+        self.closed_by_server = 0
+        self.stats: List[dict] = []
+
+
+class LoadClient:
+    """One chat user with an open websocket"""
+
+    def __init__(
+        self,
+        user_id: UUID,
+        url: str,
+        encoding: ChatEncoding,
+        metrics: Metrics,
+    ):
+        self.user_id = str(user_id)
+        self.url = url
+        self.encoding = encoding
+        self.metrics = metrics
+        self.websocket = None
+        self.connected = asyncio.Event()
+        self._reader: Optional[asyncio.Task] = None
+
+    async def connect(self, timeout: float):
+        start = time.perf_counter()
+        try:
+            self.websocket = await websockets.connect(self.url, max_size=None)
+            self._reader = asyncio.ensure_future(self._read())
+            await asyncio.wait_for(self.connected.wait(), timeout)
+        except Exception:
+            self.metrics.connect_errors += 1
+            await self.close()
+            return
+        self.metrics.connect_latencies.append(time.perf_counter() - start)
+
+    async def _read(self):
+        try:
+            async for frame in self.websocket:
+                payload = codec.decode(self.encoding, frame)
+                for event in payload if isinstance(payload, list) else [payload]:
+                    await self._handle(event)
+        except websockets.ConnectionClosed:
+            pass
+        if self.connected.is_set() and self.websocket.close_code != 1000:
+            self.metrics.closed_by_server += 1
+
+    async def _handle(self, event: dict):
+        event_type = event.get("eventType")
+        data = event.get("data") or {}
+        if event_type == ChatEventType.USER_CONNECTED:
+            self.connected.set()
+        elif event_type == ChatEventType.PING:
+            await self._send(chat_event(ChatEventType.PONG, {}))
+        elif event_type == ChatEventType.MESSAGE and data.get("to") == self.user_id:
+            sent_at = json.loads(data["message"])["sent_at"]
+            self.metrics.delivery_latencies.append(time.time() - sent_at)
+
+    async def _send(self, event: dict):
+        await self.websocket.send(codec.encode(self.encoding, event))
+
+    async def send_message(self, to_user_id: str):
+        message = json.dumps({"sent_at": time.time()})
+        try:
+            await self._send(
+                chat_event(
+                    ChatEventType.MESSAGE, {"to": to_user_id, "message": message}
+                )
+            )
+        except Exception:
+            self.metrics.send_errors += 1
+
+    async def close(self):
+        if self.websocket is not None:
+            await self.websocket.close()
+        if self._reader is not None:
+            await self._reader
+
+
+async def sample_stats(url: str, admin_token: str, metrics: Metrics, interval: float):
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    async with httpx.AsyncClient(base_url=url, headers=headers) as client:
+        while True:
+            try:
+                response = await client.get("/api/chat/stats")
+                response.raise_for_status()
+                metrics.stats.append(response.json())
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(interval)
+
+
+async def drive(clients: List[LoadClient], rate: float, duration: float, metrics):
+    """Send rate messages per second between random pairs of connected users"""
+    loop = asyncio.get_event_loop()
+    pending = set()
+    start = loop.time()
+    elapsed = 0.0
+    while elapsed < duration:
+        for _ in range(int(elapsed * rate) - metrics.sent):
+            sender, recipient = random.sample(clients, 2)
+            pending.add(asyncio.ensure_future(sender.send_message(recipient.user_id)))
+            metrics.sent += 1
+        pending = {task for task in pending if not task.done()}
+        await asyncio.sleep(0.005)
+        elapsed = loop.time() - start
+    if pending:
+        await asyncio.wait(pending)
+
+
+async def run_load(args, url: str, user_ids: List[UUID], admin_id: UUID) -> dict:
+    metrics = Metrics()
+    query = f"encoding={args.encoding.value}&batch={str(args.batch).lower()}"
+    ws_url = "ws" + url[len("http") :]
+    clients = [
+        LoadClient(
+            user_id,
+            f"{ws_url}/api/chat/ws/{access_token(user_id)}?{query}",
+            args.encoding,
+            metrics,
+        )
+        for user_id in user_ids
+    ]
+    sampler = asyncio.ensure_future(
+        sample_stats(url, access_token(admin_id), metrics, args.stats_interval)
+    )
+    await asyncio.sleep(0.5)
+    baseline = metrics.stats[-1] if metrics.stats else {}
+
+    semaphore = asyncio.Semaphore(args.connect_concurrency)
+
+    async def connect(client: LoadClient):
+        async with semaphore:
+            await client.connect(args.connect_timeout)
+
+    connect_start = time.perf_counter()
+    await asyncio.gather(*[connect(client) for client in clients])
+    connect_elapsed = time.perf_counter() - connect_start
+    connected = [client for client in clients if client.connected.is_set()]
+    await asyncio.sleep(args.stats_interval * 2)
+    after_connect = metrics.stats[-1] if metrics.stats else {}
+
+    load_start = time.perf_counter()
+    if len(connected) >= 2:
+        await drive(connected, args.rate, args.duration, metrics)
+    deadline = time.perf_counter() + args.drain
+    while (
+        len(metrics.delivery_latencies) < metrics.sent
+        and time.perf_counter() < deadline
+    ):
+        await asyncio.sleep(0.05)
+    load_elapsed = time.perf_counter() - load_start
+
+    await asyncio.gather(*[client.close() for client in clients])
+    sampler.cancel()
+
+    rss_before = baseline.get("memoryRssBytes")
+    rss_after = after_connect.get("memoryRssBytes")
+    delivered = len(metrics.delivery_latencies)
+    return {
+        "url": url,
+        "in_process": not args.url,
+        "encoding": args.encoding.value,
+        "batch": args.batch,
+        "users": len(clients),
+        "connected": len(connected),
+        "connect_errors": metrics.connect_errors,
+        "connect_seconds": round(connect_elapsed, 3),
+        "connect_latency_ms": summarize(metrics.connect_latencies),
+        "target_rate": args.rate,
+        "sent": metrics.sent,
+        "send_errors": metrics.send_errors,
+        "delivered": delivered,
+        "lost": metrics.sent - delivered,
+        "throughput_per_second": round(delivered / load_elapsed, 1),
+        "delivery_latency_ms": summarize(metrics.delivery_latencies),
+        "closed_by_server": metrics.closed_by_server,
+        "memory_per_connection_bytes": (
+            round((rss_after - rss_before) / len(connected))
+            if rss_before and rss_after and connected
+            else None
+        ),
+        "max_db_connections_checked_out": max(
+            (
+                stats["dbConnectionsCheckedOut"]
+                for stats in metrics.stats
+                if stats.get("dbConnectionsCheckedOut") is not None
+            ),
+            default=None,
+        ),
+        "max_queue_depth": max(
+            (stats["maxQueueDepth"] for stats in metrics.stats), default=None
+        ),
+        "evictions": (
+            metrics.stats[-1]["evictions"] - baseline.get("evictions", 0)
+            if metrics.stats
+            else None
+        ),
+    }
+
+
+def print_report(report: dict):
+    print(f"target:     {report['url']} (in-process: {report['in_process']})")
+    print(f"encoding:   {report['encoding']} (batch: {report['batch']})")
+    print(
+        f"connect:    {report['connected']}/{report['users']} users in "
+        f"{report['connect_seconds']}s, {report['connect_errors']} errors"
+    )
+    print(f"  latency ms  {report['connect_latency_ms']}")
+    print(
+        f"messages:   {report['sent']} sent at {report['target_rate']}/s, "
+        f"{report['delivered']} delivered, {report['lost']} lost, "
+        f"{report['send_errors']} send errors"
+    )
+    print(f"  throughput  {report['throughput_per_second']} msg/s")
+    print(f"  latency ms  {report['delivery_latency_ms']}")
+    print(
+        f"server:     {report['closed_by_server']} closed by server, "
+        f"{report['evictions']} evictions, max queue depth "
+        f"{report['max_queue_depth']}"
+    )
+    print(f"  memory per connection  {report['memory_per_connection_bytes']} bytes")
+    print(
+        f"  max db connections checked out  {report['max_db_connections_checked_out']}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--rate", type=float, default=200, help="messages/second")
+    parser.add_argument("--duration", type=float, default=30, help="seconds")
+    parser.add_argument("--url", help="target a running server instead")
+    parser.add_argument(
+        "--encoding",
+        type=ChatEncoding,
+        default=ChatEncoding.JSON,
+        choices=list(ChatEncoding),
+    )
+    parser.add_argument("--batch", action="store_true")
+    parser.add_argument("--connect-concurrency", type=int, default=50)
+    parser.add_argument("--connect-timeout", type=float, default=10)
+    parser.add_argument(
+        "--drain", type=float, default=5, help="seconds to wait for deliveries"
+    )
+    parser.add_argument("--stats-interval", type=float, default=1)
+    parser.add_argument("--json", action="store_true", help="print the report as json")
+    parser.add_argument(
+        "--cleanup", action="store_true", help="delete seeded users afterwards"
+    )
+    args = parser.parse_args()
+    if args.users < 2:
+        parser.error("--users must be at least 2")
+
+    user_ids, admin_id = seed_users(args.users)
+    server = None
+    if args.url:
+        url = args.url.rstrip("/")
+    else:
+        server, thread, url = start_server()
+    try:
+        report = asyncio.run(run_load(args, url, user_ids, admin_id))
+    finally:
+        if server is not None:
+            server.should_exit = True
+            thread.join(timeout=10)
+        if args.cleanup:
+            cleanup(user_ids, admin_id)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+
+if __name__ == "__main__":
+    main()
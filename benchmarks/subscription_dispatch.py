@@ -0,0 +1,249 @@
+"""
+Benchmark the subscription invoice scheduler.
+
+Seeds --users tenants and landlords (reused across runs) with one
+subscription invoice and billing state each, of which --due-ratio are due today and 1% of the
+users are suspended. Then runs generate_subscription_invoices' scan and
+dispatch without a broker: tasks are recorded instead of queued and billing
+keys are claimed in memory. Reports the wall time, users scanned per second
+and peak Python memory of the run. --legacy also runs the former scheduler,
+which loads every user and queries their latest invoice one by one, for
+comparison (expect it to take a while at 1M users).
+
+--create runs create_subscription_invoice in process for that many of the
+due users against the fake payment gateway, waiting
+FAKE_PAYMENT_GATEWAY_LATENCY_SECONDS per payment, and reports invoices per
+second.
+
+Usage: python benchmarks/subscription_dispatch.py [--users 100000]
+           [--due-ratio 0.1] [--legacy] [--create 0] [--json] [--cleanup]
+"""
+import argparse
+import json
+import os
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from typing import List
+from uuid import uuid4
+
+os.environ.setdefault("PAYMENT_GATEWAY", "fake")
+
+from digirent.database.base import SessionLocal, session_scope  # noqa: E402
+from digirent.database.enums import (  # noqa: E402
+    InvoiceStatus,
+    InvoiceType,
+    UserRole,
+)
+from digirent.database.models import BillingState, Invoice, User  # noqa: E402
+from digirent.util import get_current_date  # noqa: E402
+from digirent.worker.dispatch import dispatch_in_chunks  # noqa: E402
+from digirent.worker.subscription import (  # noqa: E402
+    create_subscription_invoice,
+    due_subscriptions,
+)
+
+LAST_NAME = "Subscription Bench"
+SEED_BATCH_SIZE = 10000
+
+
+class MemoryClaims:
+    def __init__(self):
+        self.keys = set()
+
+    def claim(self, key: str) -> bool:
+        if key in self.keys:
+            return False
+        self.keys.add(key)
+        return True
+
+    def release(self, *keys: str):
+        self.keys.difference_update(keys)
+
+
+class RecordingTask:
+    """Stands in for the celery task, keeps the dispatched calls"""
+
+    def __init__(self):
+        self.calls = []
+
+    def chunks(self, calls, chunk_size):
+        self.calls.extend(calls)
+        return self
+
+    def apply_async(self, queue=None):
+        pass
+
+
+def seed_users(count: int, due_ratio: float) -> int:
+    """Create missing benchmark users and their invoices, returns the new count"""
+    today = get_current_date()
+    with session_scope() as session:
+        existing = session.query(User).filter(User.last_name == LAST_NAME).count()
+    created_at = datetime.utcnow() - timedelta(days=30)
+    due_every = max(1, round(1 / due_ratio)) if due_ratio else 0
+    for start in range(existing, count, SEED_BATCH_SIZE):
+        users, invoices, billing_states = [], [], []
+        for index in range(start, min(start + SEED_BATCH_SIZE, count)):
+            user_id = uuid4()
+            users.append(
+                {
+                    "id": user_id,
+                    "first_name": "User",
+                    "last_name": LAST_NAME,
+                    "email": f"subscription-bench-{index}@digirent.test",
+                    "email_verified": True,
+                    "is_suspended": index % 100 == 50,
+                    "role": UserRole.TENANT if index % 2 else UserRole.LANDLORD,
+                }
+            )
+            due = due_every and index % due_every == 0
+            invoice = {
+                "id": uuid4(),
+                "user_id": user_id,
+                "type": InvoiceType.SUBSCRIPTION,
+                "status": InvoiceStatus.PAID,
+                "amount": 10,
+                "next_date": today if due else today + timedelta(days=15),
+                "created_at": created_at,
+            }
+            invoices.append(invoice)
+            billing_states.append(
+                {
+                    "id": uuid4(),
+                    "user_id": user_id,
+                    "latest_invoice_id": invoice["id"],
+                    "latest_invoice_status": invoice["status"],
+                    "next_due_date": invoice["next_date"],
+                    "amount_outstanding": 0,
+                    "amount_in_arrears": 0,
+                    "last_paid_at": created_at,
+                }
+            )
+        with session_scope() as session:
+            session.execute(User.__table__.insert(), users)
+            session.execute(Invoice.__table__.insert(), invoices)
+            session.execute(BillingState.__table__.insert(), billing_states)
+        print(f"Seeded {start + len(users)}/{count} users")
+    return max(count - existing, 0)
+
+
+def cleanup():
+    with session_scope() as session:
+        user_ids = session.query(User.id).filter(User.last_name == LAST_NAME)
+        session.query(BillingState).filter(BillingState.user_id.in_(user_ids)).delete(
+            synchronize_session=False
+        )
+        session.query(Invoice).filter(Invoice.user_id.in_(user_ids)).delete(
+            synchronize_session=False
+        )
+        session.query(User).filter(User.last_name == LAST_NAME).delete(
+            synchronize_session=False
+        )
+
+
+def legacy_due_subscriptions(session, current_date):
+    """The scheduler before due dates were read from billing states"""
+    non_admin_users: List[User] = (
+        session.query(User).filter(User.role != UserRole.ADMIN).all()
+    )
+    for user in non_admin_users:
+        latest_invoice: Invoice = (
+            session.query(Invoice)
+            .filter(Invoice.type == InvoiceType.SUBSCRIPTION)
+            .filter(Invoice.user_id == user.id)
+            .order_by(Invoice.created_at.desc())
+            .first()
+        )
+        if latest_invoice and latest_invoice.next_date <= current_date:
+            yield user.id, latest_invoice.next_date
+
+
+def measure(name: str, due_query, users: int) -> dict:
+    session = SessionLocal()
+    task = RecordingTask()
+    tracemalloc.start()
+    started = time.perf_counter()
+    try:
+        counts = dispatch_in_chunks(
+            task,
+            InvoiceType.SUBSCRIPTION,
+            due_query(session, get_current_date()),
+            queue="subscription-queue",
+            claims=MemoryClaims(),
+        )
+    finally:
+        seconds = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        session.close()
+    return {
+        "scheduler": name,
+        "seconds": round(seconds, 3),
+        "users_per_second": round(users / seconds) if seconds else None,
+        "peak_memory_bytes": peak,
+        **counts,
+        "calls": task.calls,
+    }
+
+
+def create_invoices(calls: list) -> dict:
+    started = time.perf_counter()
+    results = [create_subscription_invoice(*call) for call in calls]
+    seconds = time.perf_counter() - started
+    return {
+        "invoices": len(calls),
+        "seconds": round(seconds, 3),
+        "invoices_per_second": round(len(calls) / seconds) if seconds else None,
+        "results": {result: results.count(result) for result in set(results)},
+    }
+
+
+def report(results: dict):
+    for run in results["schedulers"]:
+        print(
+            f"{run['scheduler']:>9}: {run['due']} due of {results['users']} users"
+            f" in {run['seconds']}s ({run['users_per_second']} users/s),"
+            f" peak memory {run['peak_memory_bytes'] / 2 ** 20:.1f} MiB"
+        )
+    if "create" in results:
+        create = results["create"]
+        print(
+            f"   create: {create['invoices']} invoices in {create['seconds']}s"
+            f" ({create['invoices_per_second']} invoices/s) {create['results']}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--users", type=int, default=100000)
+    parser.add_argument("--due-ratio", type=float, default=0.1)
+    parser.add_argument("--legacy", action="store_true")
+    parser.add_argument("--create", type=int, default=0)
+    parser.add_argument("--json", action="store_true")
+    parser.add_argument("--cleanup", action="store_true")
+    args = parser.parse_args()
+
+    seed_users(args.users, args.due_ratio)
+    try:
+        with session_scope() as session:
+            users = session.query(User).filter(User.role != UserRole.ADMIN).count()
+        schedulers = [measure("streaming", due_subscriptions, users)]
+        if args.legacy:
+            schedulers.append(measure("legacy", legacy_due_subscriptions, users))
+        results = {"users": users, "schedulers": schedulers}
+        if args.create:
+            results["create"] = create_invoices(schedulers[0]["calls"][: args.create])
+        for run in schedulers:
+            del run["calls"]
+        if args.json:
+            print(json.dumps(results, indent=2))
+        else:
+            report(results)
+    finally:
+        if args.cleanup:
+            cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+from typing import Optional
+from sqlalchemy.orm import Query, joinedload
+from sqlalchemy.orm.session import Session
+from digirent.database.enums import ApartmentApplicationStatus
+from digirent.database.models import Apartment, ApartmentApplication, Tenant
+from ..pagination import keyset_page
+
+# the columns of ApartmentSummarySchema and TenantSummarySchema, the rest of
+# the apartment and tenant are left unloaded
+APARTMENT_SUMMARY_COLUMNS = [
+    Apartment.name,
+    Apartment.address,
+    Apartment.city,
+    Apartment.monthly_price,
+    Apartment.utilities_price,
+    Apartment.landlord_id,
+]
+TENANT_SUMMARY_COLUMNS = [Tenant.first_name, Tenant.last_name, Tenant.email]
+
+
+def application_query(
+    session: Session, status: Optional[ApartmentApplicationStatus] = None
+) -> Query:
+    """
+    Apartment applications with their contract and apartment and tenant
+    summaries joined into the same query, so a page is a single SELECT
+    however many applications it has.
+    """
+    query = session.query(ApartmentApplication).options(
+        joinedload(ApartmentApplication.contract),
+        joinedload(ApartmentApplication.apartment).load_only(
+            *APARTMENT_SUMMARY_COLUMNS
+        ),
+        joinedload(ApartmentApplication.tenant).load_only(*TENANT_SUMMARY_COLUMNS),
+    )
+    if status:
+        query = query.filter(ApartmentApplication.status == status)
+    return query
+
+
+def landlord_applications(query: Query, session: Session, landlord_id) -> Query:
+    """Narrow query to the applications for the landlord's apartments"""
+    return query.filter(
+        ApartmentApplication.apartment_id.in_(
+            session.query(Apartment.id)
+            .filter(Apartment.landlord_id == landlord_id)
+            .subquery()
+        )
+    )
+
+
+def application_page(query: Query, cursor: Optional[str], page_size: int) -> dict:
+    """A keyset_page of newest first applications after cursor"""
+    return keyset_page(
+        query,
+        ApartmentApplication.created_at,
+        ApartmentApplication.id,
+        cursor,
+        page_size,
+    )
@@ -1,98 +1,168 @@
-from datetime import datetime
-from typing import List
+import json
+from datetime import timezone
+from typing import List, Optional
 from uuid import UUID
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm.session import Session
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, Query
 from digirent.api import dependencies as deps
+from digirent.api.apartment_applications.listing import (
+    application_page,
+    application_query,
+)
 from digirent.api.apartment_applications.schema import (
+    ApartmentApplicationPaginationSchema,
+    ApartmentApplicationReviewOutcomeSchema,
     ApartmentApplicationSchema,
+    ApartmentApplicationsReviewSchema,
     SignrequestEventSchema,
+    SignrequestSignerSchema,
 )
 from digirent.app import Application
 from digirent.app.error import ApplicationError
-from digirent.database.enums import UserRole
+from digirent.core.services.email_templates import render_email
+from digirent.core.services.sign_request import invalidate_signrequest_reads
+from digirent.database.enums import ApartmentApplicationStatus, UserRole
+from digirent.database.outbox import add_emails
 from digirent.database.models import (
     # Admin,
+    SIGNREQUEST_CONTRACT_EVENT_TYPES,
     Apartment,
     ApartmentApplication,
     Landlord,
+    SignrequestWebhookEvent,
     Tenant,
     User,
 )
-from digirent.util import send_email
 
 router = APIRouter()
 
 
+def record_signrequest_webhook(session: Session, payload: SignrequestEventSchema):
+    """Add the event to the contract webhook inbox unless it is already there"""
+    timestamp = payload.timestamp
+    if timestamp.tzinfo:
+        timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    document = payload.document
+    event = SignrequestWebhookEvent(
+        event_uuid=payload.uuid,
+        event_hash=payload.event_hash,
+        event_type=payload.event_type,
+        event_timestamp=timestamp,
+        apartment_application_id=document.external_id,
+        signers=[
+            json.loads(signer.json(include=set(SignrequestSignerSchema.__fields__)))
+            for signer in document.signrequest.signers
+        ],
+    )
+    try:
+        with session.begin_nested():
+            session.add(event)
+    except IntegrityError as e:
+        recorded = (
+            session.query(SignrequestWebhookEvent.id)
+            .filter(SignrequestWebhookEvent.event_uuid == payload.uuid)
+            .first()
+        )
+        # a redelivery of an event that is already recorded, any other
+        # violation is an event that cannot be recorded
+        if not recorded:
+            print(f"Recording signrequest event {payload.uuid} failed: {e.orig}")
+            raise
+
+
 @router.post("/contract", status_code=200)
 def signrequest_contract_callback(
     payload: SignrequestEventSchema,
     session: Session = Depends(deps.get_database_session),
-    application: Application = Depends(deps.get_application)
-    # payload: dict = Body(...)
 ):
-    # event_uuid = payload.uuid
-    # event_status = payload.status
-    # event_timestamp = payload.timestamp
-    # event_hash = payload.event_hash
-    # event_document_id = document.uuid
-    # document_status = document.status
-
+    """
+    SignRequest contract webhook. Events are only recorded here, the contract
+    worker applies them to the application, so SignRequest is answered
+    without waiting on the payment a signed contract creates. Every event
+    drops the cached signrequest reads of its document, those that do not
+    change a contract are not recorded.
+    """
     # TODO verify hash
-    target_event_types = [
-        "declined",
-        "cancelled",
-        "expired",
-        "signed",
-        "signer_signed",
-        "signer_viewed_email",
-        "signer_viewed",
-    ]
-    event_type = payload.event_type
-    document = payload.document
-    document_signers = document.signrequest.signers
-    external_id = document.external_id
-    if event_type not in target_event_types:
+    invalidate_signrequest_reads(payload.document.external_id, payload.document.uuid)
+    if payload.event_type not in SIGNREQUEST_CONTRACT_EVENT_TYPES:
         return
-    apartment_application: ApartmentApplication = session.query(
-        ApartmentApplication
-    ).get(external_id)
-    if not apartment_application:
-        return
-    if event_type == "expired":
-        # TODO get expired on
-        application.expire_contract(session, apartment_application, datetime.now())
-    elif event_type == "cancelled":
-        # TODO get canceld on
-        application.cancel_contract(session, apartment_application, datetime.now())
-    tenant: Tenant = apartment_application.tenant
-    landlord: Landlord = apartment_application.apartment.landlord
-    for signer in document_signers:
-        if not signer.needs_to_sign:
-            continue
-        signed_on = signer.signed_on
-        signer_declined_on = signer.declined_on
-        signer_email = signer.email
-        if tenant.email == signer_email:
-            if signer.declined:
-                application.decline_contract(
-                    session, apartment_application, signer_declined_on, tenant
-                )
-            elif signer.signed:
-                application.tenant_signed_contract(
-                    session, apartment_application, signed_on
-                )
+    record_signrequest_webhook(session, payload)
+    session.commit()
 
-        if landlord.email == signer_email:
-            if signer.declined:
-                application.decline_contract(
-                    session, apartment_application, signer_declined_on, landlord
-                )
-            elif signer.signed:
-                application.landlord_signed_contract(
-                    session, apartment_application, signed_on
-                )
-    return
+
+def review_applications(
+    data: ApartmentApplicationsReviewSchema,
+    status: ApartmentApplicationStatus,
+    email_template: str,
+    landlord: Landlord,
+    session: Session,
+    app: Application,
+) -> List[dict]:
+    # keep the first of repeated ids
+    application_ids = list(dict.fromkeys(data.application_ids))
+    outcomes, reviewed = app.review_apartment_applications(
+        session, landlord, application_ids, status, commit=False
+    )
+    add_emails(
+        session,
+        [
+            render_email(
+                email_template,
+                application.tenant_email,
+                apartment_name=application.apartment_name,
+            )
+            for application in reviewed
+        ],
+    )
+    session.commit()
+    return [
+        {"id": application_id, "outcome": outcome}
+        for application_id, outcome in outcomes.items()
+    ]
+
+
+# declared before the routes with an id in the path, which would match them
+@router.post(
+    "/bulk/reject",
+    status_code=200,
+    response_model=List[ApartmentApplicationReviewOutcomeSchema],
+)
+def reject_applications(
+    data: ApartmentApplicationsReviewSchema,
+    landlord: Landlord = Depends(deps.get_current_active_landlord),
+    session: Session = Depends(deps.get_database_session),
+    app: Application = Depends(deps.get_application),
+):
+    return review_applications(
+        data,
+        ApartmentApplicationStatus.REJECTED,
+        "application_rejected",
+        landlord,
+        session,
+        app,
+    )
+
+
+@router.post(
+    "/bulk/consider",
+    status_code=200,
+    response_model=List[ApartmentApplicationReviewOutcomeSchema],
+)
+def consider_applications(
+    data: ApartmentApplicationsReviewSchema,
+    landlord: Landlord = Depends(deps.get_current_active_landlord),
+    session: Session = Depends(deps.get_database_session),
+    app: Application = Depends(deps.get_application),
+):
+    return review_applications(
+        data,
+        ApartmentApplicationStatus.CONSIDERED,
+        "application_considered",
+        landlord,
+        session,
+        app,
+    )
 
 
 @router.post(
@@ -120,7 +190,6 @@ def apply(
 )
 def reject_application(
     application_id: UUID,
-    background_tasks: BackgroundTasks,
     landlord: Landlord = Depends(deps.get_current_active_landlord),
     session: Session = Depends(deps.get_database_session),
     app: Application = Depends(deps.get_application),
@@ -135,12 +204,16 @@ def reject_application(
         )
         if not apartment_application:
             raise HTTPException(404, "application not found")
-        email_message = f"Your application for apartment {apartment_application.apartment.name} rejected."
-        background_tasks.add_task(
-            send_email,
-            to=apartment_application.tenant.email,
-            subject="Digirent Apartment Application Notification",
-            message=email_message,
+        # committed with the review
+        add_emails(
+            session,
+            [
+                render_email(
+                    "application_rejected",
+                    apartment_application.tenant.email,
+                    apartment_name=apartment_application.apartment.name,
+                )
+            ],
         )
         return app.reject_apartment_application(session, apartment_application)
     except ApplicationError as e:
@@ -154,7 +227,6 @@ def reject_application(
 )
 def consider_application(
     application_id: UUID,
-    background_tasks: BackgroundTasks,
     landlord: Landlord = Depends(deps.get_current_active_landlord),
     session: Session = Depends(deps.get_database_session),
     app: Application = Depends(deps.get_application),
@@ -169,12 +241,16 @@ def consider_application(
         )
         if not apartment_application:
             raise HTTPException(404, "application not found")
-        email_message = f"Your application for apartment {apartment_application.apartment.name} has been considered. You stand a chance of being awarded this apartment"
-        background_tasks.add_task(
-            send_email,
-            to=apartment_application.tenant.email,
-            subject="Digirent Apartment Application Notification",
-            message=email_message,
+        # committed with the review
+        add_emails(
+            session,
+            [
+                render_email(
+                    "application_considered",
+                    apartment_application.tenant.email,
+                    apartment_name=apartment_application.apartment.name,
+                )
+            ],
         )
         return app.consider_apartment_application(session, apartment_application)
     except ApplicationError as e:
@@ -188,7 +264,6 @@ def consider_application(
 )
 def process_application(
     application_id: UUID,
-    background_tasks: BackgroundTasks,
     landlord: Landlord = Depends(deps.get_current_active_landlord),
     session: Session = Depends(deps.get_database_session),
     app: Application = Depends(deps.get_application),
@@ -203,12 +278,16 @@ def process_application(
         )
         if not apartment_application:
             raise HTTPException(404, "application not found")
-        email_message = f"Your application for apartment {apartment_application.apartment.name} is processing. Please sign the contract"
-        background_tasks.add_task(
-            send_email,
-            to=apartment_application.tenant.email,
-            subject="Digirent Apartment Application Notification",
-            message=email_message,
+        # committed with the review
+        add_emails(
+            session,
+            [
+                render_email(
+                    "application_processing",
+                    apartment_application.tenant.email,
+                    apartment_name=apartment_application.apartment.name,
+                )
+            ],
         )
         return app.process_apartment_application(session, apartment_application)
     except ApplicationError as e:
@@ -261,7 +340,26 @@ def tenant_received_keys(
         )
         if not apartment_application:
             raise HTTPException(404, "application not found")
-        return app.tenant_receive_keys(session, apartment_application)
+        apartment_application, rejected_application_ids = app.tenant_receive_keys(
+            session, apartment_application, commit=False
+        )
+        if rejected_application_ids:
+            rejected = (
+                session.query(User.email, Apartment.name)
+                .join(ApartmentApplication, ApartmentApplication.tenant_id == User.id)
+                .join(Apartment, ApartmentApplication.apartment_id == Apartment.id)
+                .filter(ApartmentApplication.id.in_(rejected_application_ids))
+                .all()
+            )
+            add_emails(
+                session,
+                [
+                    render_email("application_rejected", email, apartment_name=name)
+                    for email, name in rejected
+                ],
+            )
+        session.commit()
+        return apartment_application
     except ApplicationError as e:
         raise HTTPException(400, str(e))
 
@@ -294,6 +392,36 @@ def fetch_applications_for_apartments(
         raise HTTPException(400, str(e))
 
 
+@router.get(
+    "/apartments/{apartment_id}",
+    response_model=ApartmentApplicationPaginationSchema,
+)
+def fetch_apartment_applications_page(
+    apartment_id: UUID,
+    status: Optional[ApartmentApplicationStatus] = None,
+    cursor: Optional[str] = None,
+    page_size: int = Query(20, ge=1, le=100),
+    user: User = Depends(deps.get_current_active_admin_or_landlord),
+    session: Session = Depends(deps.get_database_session),
+):
+    apartment_landlord = (
+        session.query(Apartment.landlord_id)
+        .filter(Apartment.id == apartment_id)
+        .one_or_none()
+    )
+    if not apartment_landlord or (
+        user.role == UserRole.LANDLORD and apartment_landlord.landlord_id != user.id
+    ):
+        raise HTTPException(404, "Apartment not found")
+    query = application_query(session, status).filter(
+        ApartmentApplication.apartment_id == apartment_id
+    )
+    try:
+        return application_page(query, cursor, page_size)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+
+
 @router.get("/", response_model=List[ApartmentApplicationSchema])
 def fetch_tenant_applications(
     tenant: Tenant = Depends(deps.get_current_active_tenant),
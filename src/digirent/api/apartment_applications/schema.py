@@ -1,8 +1,9 @@
 from typing import List, Optional
 from datetime import datetime
 from uuid import UUID
-from digirent.database.enums import ApartmentApplicationStatus
-from ..schema import BaseSchema, OrmSchema
+from pydantic import conlist
+from digirent.database.enums import ApartmentApplicationStatus, ContractStatus
+from ..schema import BaseSchema, IdSchema, OrmSchema
 
 
 class ApartmentApplicationBaseSchema(BaseSchema):
@@ -15,6 +16,57 @@ class ApartmentApplicationSchema(ApartmentApplicationBaseSchema, OrmSchema):
     pass
 
 
+class ApartmentSummarySchema(IdSchema):
+    name: str
+    address: str
+    city: str
+    total_price: float
+
+    class Config:
+        orm_mode = True
+
+
+class TenantSummarySchema(IdSchema):
+    first_name: str
+    last_name: str
+    email: str
+
+    class Config:
+        orm_mode = True
+
+
+class ContractSchema(OrmSchema):
+    status: ContractStatus
+    landlord_has_signed: bool
+    landlord_signed_on: Optional[datetime]
+    tenant_has_signed: bool
+    tenant_signed_on: Optional[datetime]
+    landlord_has_provided_keys: bool
+    tenant_has_received_keys: bool
+
+
+class ApartmentApplicationDetailSchema(ApartmentApplicationSchema):
+    apartment: ApartmentSummarySchema
+    tenant: TenantSummarySchema
+    contract: Optional[ContractSchema]
+
+
+class ApartmentApplicationPaginationSchema(BaseSchema):
+    page_size: int
+    next_cursor: Optional[str]
+    data: List[ApartmentApplicationDetailSchema]
+
+
+class ApartmentApplicationsReviewSchema(BaseSchema):
+    application_ids: conlist(UUID, min_items=1, max_items=500)
+
+
+class ApartmentApplicationReviewOutcomeSchema(BaseSchema):
+    id: UUID
+    # the application's new status, not_found or invalid_status
+    outcome: str
+
+
 class SignrequestSignerSchema(BaseSchema):
     needs_to_sign: bool
     signed_on: Optional[datetime]
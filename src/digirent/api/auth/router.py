@@ -1,13 +1,14 @@
 from typing import Optional
 from enum import Enum
 from authlib.integrations.base_client.errors import MismatchingStateError
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException
 from fastapi.param_functions import Body
 from fastapi.requests import Request
 from jwt import PyJWTError
 from digirent.app.error import ApplicationError
 from digirent.database.enums import UserRole
 from digirent.database.models import User
+from digirent.database.outbox import add_emails
 from .schema import RedirectSchema, TokenSchema
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm.session import Session
@@ -22,6 +23,7 @@ from .helper import (
 import digirent.api.dependencies as dependencies
 from digirent import util
 from digirent.core import config
+from digirent.core.services.email_templates import render_email
 
 
 PASSWORD_RESET_TOKEN_VALUE = "password_reset"
@@ -50,7 +52,6 @@ async def login(
 
 @router.post("/forgot-password")
 def forgot_password(
-    background: BackgroundTasks,
     email: str = Body(...),
     session: Session = Depends(dependencies.get_database_session),
 ):
@@ -60,13 +61,8 @@ def forgot_password(
             {"type": PASSWORD_RESET_TOKEN_VALUE, "email": email}
         )
         url = f"{config.CLIENT_HOST}/forgot-password?token={password_reset_token}"
-        email_str = f"Follow this link to reset password {url}"
-        background.add_task(
-            util.send_email,
-            to=email,
-            subject="Reset Digirent Password",
-            message=email_str,
-        )
+        add_emails(session, [render_email("password_reset", email, reset_url=url)])
+        session.commit()
 
 
 @router.post("/reset-password")
@@ -1,24 +1,39 @@
 from collections import OrderedDict
+from datetime import datetime, timezone
 import enum
+import os
 from uuid import UUID
 from fastapi.websockets import WebSocket
 from pydantic import BaseModel
-from typing import OrderedDict as ODict
+from pydantic.datetime_parse import parse_datetime
+from starlette import status
+from typing import List, Optional, OrderedDict as ODict, Union
 
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm.session import Session
-from digirent.database.base import with_db_session
-from digirent.database.models import User, ChatMessage
+from starlette.concurrency import run_in_threadpool
+from digirent.api.schema import UserIdentitySchema
+from digirent.core import config
+from digirent.database.base import pool_status, session_scope
+from digirent.database.models import ChatMessage, ChatReadState
+from .codec import ChatEncoding
+from .connection import ChatConnection
 
 
 class ChatEventType(str, enum.Enum):
     # send
     USER_CONNECTED = "USER_CONNECTED"
+    PING = "PING"
+    MISSED_MESSAGES = "MISSED_MESSAGES"
 
     # listen
     USER_DISCONNECTED = "USER_DISCONNECTED"
+    PONG = "PONG"
 
     # send and listen
     MESSAGE = "MESSAGE"
+    READ = "READ"
 
 
 class ChatEvent(BaseModel):
@@ -31,45 +46,314 @@ class ChatEvent(BaseModel):
         allow_population_by_field_name = True
 
 
+def chat_message_data(chat_message: ChatMessage) -> dict:
+    return {
+        "id": str(chat_message.id),
+        "from": str(chat_message.from_user_id),
+        "to": str(chat_message.to_user_id),
+        "message": chat_message.message,
+        "created_at": chat_message.created_at.isoformat(),
+    }
+
+
+def increment_unread_count(session: Session, user_id: UUID, other_user_id: UUID):
+    """Add one unread message to user's conversation with other_user"""
+    query = (
+        session.query(ChatReadState)
+        .filter(ChatReadState.user_id == user_id)
+        .filter(ChatReadState.other_user_id == other_user_id)
+    )
+    values = {ChatReadState.unread_count: ChatReadState.unread_count + 1}
+    if query.update(values, synchronize_session=False):
+        return
+    try:
+        with session.begin_nested():
+            session.add(
+                ChatReadState(
+                    user_id=user_id, other_user_id=other_user_id, unread_count=1
+                )
+            )
+    except IntegrityError:
+        # created concurrently by another message
+        query.update(values, synchronize_session=False)
+
+
+def save_chat_message(from_user_id: UUID, to_user_id: UUID, message: str) -> dict:
+    """Persist a chat message in its own short lived session"""
+    with session_scope() as session:
+        chat_message = ChatMessage(
+            from_user_id=from_user_id, to_user_id=to_user_id, message=message
+        )
+        session.add(chat_message)
+        increment_unread_count(session, to_user_id, from_user_id)
+        session.flush()
+        return chat_message_data(chat_message)
+
+
+def mark_conversation_read(
+    user_id: UUID, other_user_id: UUID, read_at: Optional[datetime] = None
+) -> dict:
+    """
+    Move user's read watermark for the conversation with other_user to read_at,
+    or to the latest message received from other_user, and update the unread
+    counter accordingly.
+    """
+    with session_scope() as session:
+        received = (
+            session.query(ChatMessage.created_at)
+            .filter(ChatMessage.to_user_id == user_id)
+            .filter(ChatMessage.from_user_id == other_user_id)
+        )
+        if read_at is None:
+            read_at = received.order_by(ChatMessage.created_at.desc()).limit(1).scalar()
+        state: Optional[ChatReadState] = (
+            session.query(ChatReadState)
+            .filter(ChatReadState.user_id == user_id)
+            .filter(ChatReadState.other_user_id == other_user_id)
+            .with_for_update()
+            .one_or_none()
+        )
+        if state is None:
+            state = ChatReadState(
+                user_id=user_id, other_user_id=other_user_id, unread_count=0
+            )
+            session.add(state)
+        if read_at and (state.last_read_at is None or read_at > state.last_read_at):
+            state.last_read_at = read_at
+            state.unread_count = (
+                received.filter(ChatMessage.created_at > read_at)
+                .with_entities(func.count(ChatMessage.id))
+                .scalar()
+            )
+        return {
+            "by": str(user_id),
+            "with": str(other_user_id),
+            "read_at": state.last_read_at.isoformat() if state.last_read_at else None,
+            "unread_count": state.unread_count,
+        }
+
+
+def fetch_missed_messages(user_id: UUID, last_seen: datetime, limit: int) -> List[dict]:
+    """
+    Messages received by user after last_seen across all conversations,
+    oldest first. Served by the (to_user_id, created_at) index.
+    """
+    with session_scope() as session:
+        query = (
+            session.query(
+                ChatMessage.id,
+                ChatMessage.from_user_id,
+                ChatMessage.to_user_id,
+                ChatMessage.message,
+                ChatMessage.created_at,
+            )
+            .filter(ChatMessage.to_user_id == user_id)
+            .filter(ChatMessage.created_at > last_seen)
+            .order_by(ChatMessage.created_at.asc(), ChatMessage.id.asc())
+            .limit(limit)
+        )
+        return [chat_message_data(row) for row in query.yield_per(500)]
+
+
+def parse_cursor(value: Union[str, datetime]) -> datetime:
+    """Parse a last_seen or read_at cursor into a naive utc datetime"""
+    last_seen = parse_datetime(value)
+    if last_seen.tzinfo:
+        last_seen = last_seen.astimezone(timezone.utc).replace(tzinfo=None)
+    return last_seen
+
+
+def process_memory_rss() -> Optional[int]:
+    """Resident set size of the current process in bytes, where /proc exists"""
+    try:
+        with open("/proc/self/statm") as statm:
+            resident_pages = int(statm.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+    return resident_pages * os.sysconf("SC_PAGE_SIZE")
+
+
+def chat_event(event_type: ChatEventType, data: dict) -> dict:
+    """
+    Build an outbound event payload. Equivalent to
+    ChatEvent(...).dict(by_alias=True) without constructing a model.
+    """
+    return {"eventType": event_type.value, "data": data}
+
+
 class ChatManager:
     """Manages user chat"""
 
-    def __init__(self):
-        self.chat_users: ODict[UUID, WebSocket] = OrderedDict()
-
-    @with_db_session
-    async def send_message_to_user(
-        self, user_id: UUID, sender_id: UUID, message: str, session: Session = None
+    def __init__(
+        self,
+        max_queue_size: int = config.CHAT_SEND_QUEUE_SIZE,
+        high_water_mark: int = config.CHAT_SEND_QUEUE_HIGH_WATER_MARK,
+        slow_consumer_timeout: float = config.CHAT_SLOW_CONSUMER_TIMEOUT_SECONDS,
+        heartbeat_interval: float = config.CHAT_HEARTBEAT_INTERVAL_SECONDS,
+        idle_timeout: float = config.CHAT_IDLE_TIMEOUT_SECONDS,
+        catch_up_batch_size: int = config.CHAT_CATCH_UP_BATCH_SIZE,
+        catch_up_limit: int = config.CHAT_CATCH_UP_LIMIT,
+        coalesce_window: float = config.CHAT_COALESCE_WINDOW_SECONDS,
+        max_batch_size: int = config.CHAT_MAX_BATCH_SIZE,
     ):
-        db_message = ChatMessage(
-            from_user_id=sender_id, to_user_id=user_id, message=message
+        self.chat_users: ODict[UUID, ChatConnection] = OrderedDict()
+        self.max_queue_size = max_queue_size
+        self.high_water_mark = high_water_mark
+        self.slow_consumer_timeout = slow_consumer_timeout
+        self.heartbeat_interval = heartbeat_interval
+        self.idle_timeout = idle_timeout
+        self.catch_up_batch_size = catch_up_batch_size
+        self.catch_up_limit = catch_up_limit
+        self.coalesce_window = coalesce_window
+        self.max_batch_size = max_batch_size
+        self.evictions = 0
+
+    @property
+    def stats(self) -> dict:
+        """Gauges describing the current state of connected chat users"""
+        queue_depths = [conn.queue_depth for conn in self.chat_users.values()]
+        return {
+            "connections": len(queue_depths),
+            "queue_depth": sum(queue_depths),
+            "max_queue_depth": max(queue_depths, default=0),
+            "consumers_over_high_water_mark": len(
+                [depth for depth in queue_depths if depth >= self.high_water_mark]
+            ),
+            "evictions": self.evictions,
+            "db_connections_checked_out": pool_status()["checked_out"],
+            "memory_rss_bytes": process_memory_rss(),
+        }
+
+    def get_connection(self, websocket: WebSocket) -> Optional[ChatConnection]:
+        user: UserIdentitySchema = websocket.state.user
+        connection = self.chat_users.get(user.id)
+        if connection and connection.websocket is websocket:
+            return connection
+
+    def touch(self, websocket: WebSocket):
+        """Record inbound activity on websocket"""
+        connection = self.get_connection(websocket)
+        if connection:
+            connection.touch()
+
+    def send_to_user(self, user_id: UUID, event: dict) -> bool:
+        """Queue event built with chat_event for user if user is connected"""
+        connection = self.chat_users.get(user_id)
+        if not connection:
+            return False
+        return connection.send(event)
+
+    async def connect(
+        self,
+        websocket: WebSocket,
+        encoding: ChatEncoding = ChatEncoding.JSON,
+        batch: bool = False,
+    ) -> ChatConnection:
+        user: UserIdentitySchema = websocket.state.user
+        connection = ChatConnection(
+            user.id,
+            websocket,
+            max_queue_size=self.max_queue_size,
+            high_water_mark=self.high_water_mark,
+            slow_consumer_timeout=self.slow_consumer_timeout,
+            heartbeat_interval=self.heartbeat_interval,
+            idle_timeout=self.idle_timeout,
+            encoding=encoding,
+            batch=batch,
+            coalesce_window=self.coalesce_window,
+            max_batch_size=self.max_batch_size,
         )
-        session.add(db_message)
-        session.commit()
-        from_chatuser = self.chat_users.get(sender_id)
-        to_chatuser = self.chat_users.get(user_id)
-        event = ChatEvent(
-            event_type=ChatEventType.MESSAGE,
-            data={"from": str(sender_id), "to": str(user_id), "message": message},
+        superseded = self.chat_users.get(user.id)
+        self.chat_users[user.id] = connection
+        if superseded:
+            await superseded.close()
+        connection.start(self.evict, lambda: chat_event(ChatEventType.PING, {}))
+        return connection
+
+    def disconnect(self, websocket: WebSocket):
+        connection = self.get_connection(websocket)
+        if connection:
+            del self.chat_users[connection.user_id]
+            connection.stop()
+
+    async def evict(self, connection: ChatConnection, reason: str):
+        """Drop a connection that is idle or can not keep up with its queue"""
+        if connection.closed:
+            return
+        print(f"evicting chat user {connection.user_id}: {reason}")
+        self.evictions += 1
+        if self.chat_users.get(connection.user_id) is connection:
+            del self.chat_users[connection.user_id]
+        await connection.close(code=status.WS_1008_POLICY_VIOLATION)
+
+    async def send_message_to_user(self, user_id: UUID, sender_id: UUID, message: str):
+        data = await run_in_threadpool(save_chat_message, sender_id, user_id, message)
+        event = chat_event(ChatEventType.MESSAGE, data)
+        self.send_to_user(sender_id, event)
+        self.send_to_user(user_id, event)
+
+    async def send_missed_messages(self, user_id: UUID, last_seen: datetime):
+        """
+        Push messages the user received after last_seen in ordered batches.
+        The connection is registered before the lookup, so a message arriving
+        meanwhile may be delivered twice; clients dedupe on message id.
+        """
+        messages = await run_in_threadpool(
+            fetch_missed_messages, user_id, last_seen, self.catch_up_limit + 1
+        )
+        truncated = len(messages) > self.catch_up_limit
+        messages = messages[: self.catch_up_limit]
+        batches = [
+            messages[start : start + self.catch_up_batch_size]
+            for start in range(0, len(messages), self.catch_up_batch_size)
+        ] or [[]]
+        for index, batch in enumerate(batches):
+            self.send_to_user(
+                user_id,
+                chat_event(
+                    ChatEventType.MISSED_MESSAGES,
+                    {
+                        "messages": batch,
+                        "final": index == len(batches) - 1,
+                        "truncated": truncated,
+                    },
+                ),
+            )
+
+    async def mark_read(
+        self, user_id: UUID, other_user_id: UUID, read_at: Optional[datetime] = None
+    ):
+        """Update the read watermark and send a READ receipt to both users"""
+        data = await run_in_threadpool(
+            mark_conversation_read, user_id, other_user_id, read_at
         )
-        if from_chatuser:
-            await from_chatuser.send_json(event.dict(by_alias=True))
-        if to_chatuser:
-            await to_chatuser.send_json(event.dict(by_alias=True))
+        event = chat_event(ChatEventType.READ, data)
+        self.send_to_user(user_id, event)
+        self.send_to_user(other_user_id, event)
 
     async def handle_event(self, event: ChatEvent, websocket: WebSocket):
         event_type: ChatEventType = event.event_type
         data: dict = event.data
-        user: User = websocket.state.user
+        user: UserIdentitySchema = websocket.state.user
         if event_type == ChatEventType.USER_CONNECTED:
             # User has successfully connected
-            self.chat_users[user.id] = websocket
-            await websocket.send_json(
-                ChatEvent(
-                    event_type=ChatEventType.USER_CONNECTED,
-                    data={"user_id": str(user.id)},
-                ).dict(by_alias=True)
+            if not self.get_connection(websocket):
+                await self.connect(
+                    websocket,
+                    ChatEncoding(data.get("encoding") or ChatEncoding.JSON),
+                    bool(data.get("batch")),
+                )
+            self.send_to_user(
+                user.id,
+                chat_event(ChatEventType.USER_CONNECTED, {"user_id": str(user.id)}),
             )
+            if data.get("last_seen"):
+                await self.send_missed_messages(
+                    user.id, parse_cursor(data["last_seen"])
+                )
+        elif event_type == ChatEventType.PONG:
+            # activity is recorded for every received message
+            pass
         elif event_type == ChatEventType.MESSAGE:
             # user has sent message
             to: UUID = UUID(data["to"])
@@ -78,6 +362,15 @@ class ChatManager:
                 return
             message: str = data["message"]
             await self.send_message_to_user(to, from_user, message)
+        elif event_type == ChatEventType.READ:
+            # user has read messages received from another user
+            other_user: UUID = UUID(data["with"])
+            if other_user == user.id:
+                return
+            read_at = data.get("read_at")
+            await self.mark_read(
+                user.id, other_user, parse_cursor(read_at) if read_at else None
+            )
         elif event_type == ChatEventType.USER_DISCONNECTED:
             print(f"going to drop user {user.id}")
-            del self.chat_users[user.id]
+            self.disconnect(websocket)
@@ -0,0 +1,32 @@
+import enum
+import json
+from typing import Any, Union
+
+try:
+    import msgpack
+except ImportError:  # msgpack is an optional extra
+    msgpack = None
+
+
+class ChatEncoding(str, enum.Enum):
+    JSON = "json"
+    MSGPACK = "msgpack"
+
+
+def supported_encodings() -> list:
+    if msgpack is None:
+        return [ChatEncoding.JSON]
+    return [ChatEncoding.JSON, ChatEncoding.MSGPACK]
+
+
+def encode(encoding: ChatEncoding, payload: Any) -> Union[str, bytes]:
+    """Encode an outbound event, or a list of events, into a single frame"""
+    if encoding == ChatEncoding.MSGPACK:
+        return msgpack.packb(payload, use_bin_type=True)
+    return json.dumps(payload, separators=(",", ":"))
+
+
+def decode(encoding: ChatEncoding, frame: Union[str, bytes]) -> Any:
+    if encoding == ChatEncoding.MSGPACK:
+        return msgpack.unpackb(frame, raw=False)
+    return json.loads(frame)
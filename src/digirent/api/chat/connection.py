@@ -0,0 +1,159 @@
+import asyncio
+from typing import Awaitable, Callable, Optional, Union
+from uuid import UUID
+from fastapi.websockets import WebSocket
+from starlette import status
+from .codec import ChatEncoding, encode
+
+
+class ChatConnection:
+    """
+    A connected chat user's websocket.
+
+    Outbound events are put on a bounded queue that is drained by a dedicated
+    writer task, so a slow or half-dead client never blocks the coroutine that
+    produced the event. A heartbeat task pings the client and evicts it when it
+    has been idle for too long or its queue stays over the high water mark.
+
+    Frames are encoded with the encoding negotiated on connect. With batching
+    enabled the writer waits for the coalescing window after the first queued
+    event and sends everything queued by then as a single list frame.
+    """
+
+    def __init__(
+        self,
+        user_id: UUID,
+        websocket: WebSocket,
+        max_queue_size: int,
+        high_water_mark: int,
+        slow_consumer_timeout: float,
+        heartbeat_interval: float,
+        idle_timeout: float,
+        encoding: ChatEncoding = ChatEncoding.JSON,
+        batch: bool = False,
+        coalesce_window: float = 0,
+        max_batch_size: int = 1,
+    ):
+        self.user_id = user_id
+        self.websocket = websocket
+        self.high_water_mark = high_water_mark
+        self.slow_consumer_timeout = slow_consumer_timeout
+        self.heartbeat_interval = heartbeat_interval
+        self.idle_timeout = idle_timeout
+        self.encoding = encoding
+        self.batch = batch
+        self.coalesce_window = coalesce_window
+        self.max_batch_size = max_batch_size
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue_size)
+        self.last_activity: float = self.now()
+        self.over_high_water_since: Optional[float] = None
+        self.closed = False
+        self._on_evict: Optional[Callable[["ChatConnection", str], Awaitable]] = None
+        self._writer_task: Optional[asyncio.Task] = None
+        self._heartbeat_task: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def now() -> float:
+        return asyncio.get_event_loop().time()
+
+    @property
+    def queue_depth(self) -> int:
+        return self.queue.qsize()
+
+    def start(
+        self,
+        on_evict: Callable[["ChatConnection", str], Awaitable],
+        ping: Callable[[], dict],
+    ):
+        """Start the writer and heartbeat tasks of this connection"""
+        self._on_evict = on_evict
+        self._writer_task = asyncio.ensure_future(self._writer())
+        self._heartbeat_task = asyncio.ensure_future(self._heartbeat(ping))
+
+    def touch(self):
+        """Record inbound activity from the client"""
+        self.last_activity = self.now()
+
+    def send(self, payload: dict) -> bool:
+        """
+        Queue payload for delivery without waiting on the client.
+        Returns False if the connection is closed or has been evicted.
+        """
+        if self.closed:
+            return False
+        try:
+            self.queue.put_nowait(payload)
+        except asyncio.QueueFull:
+            self.evict("send queue full")
+            return False
+        self._check_high_water_mark()
+        return not self.closed
+
+    def evict(self, reason: str):
+        """Schedule eviction of this connection"""
+        if self.closed or self._on_evict is None:
+            return
+        asyncio.ensure_future(self._on_evict(self, reason))
+
+    def _check_high_water_mark(self):
+        if self.queue_depth < self.high_water_mark:
+            self.over_high_water_since = None
+            return
+        now = self.now()
+        if self.over_high_water_since is None:
+            self.over_high_water_since = now
+        elif now - self.over_high_water_since >= self.slow_consumer_timeout:
+            self.evict("slow consumer")
+
+    async def _next_frame(self) -> Union[str, bytes]:
+        payload = await self.queue.get()
+        if not self.batch:
+            return encode(self.encoding, payload)
+        if self.coalesce_window:
+            await asyncio.sleep(self.coalesce_window)
+        payloads = [payload]
+        while len(payloads) < self.max_batch_size and not self.queue.empty():
+            payloads.append(self.queue.get_nowait())
+        return encode(self.encoding, payloads)
+
+    async def _writer(self):
+        while True:
+            frame = await self._next_frame()
+            try:
+                if isinstance(frame, bytes):
+                    await self.websocket.send_bytes(frame)
+                else:
+                    await self.websocket.send_text(frame)
+            except Exception:
+                self.evict("send failed")
+                return
+            if self.queue_depth < self.high_water_mark:
+                self.over_high_water_since = None
+
+    async def _heartbeat(self, ping: Callable[[], dict]):
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            if self.now() - self.last_activity >= self.idle_timeout:
+                self.evict("idle timeout")
+                return
+            self._check_high_water_mark()
+            self.send(ping())
+
+    def stop(self):
+        """Stop background tasks without touching the websocket"""
+        self.closed = True
+        current_task = asyncio.current_task()
+        for task in (self._writer_task, self._heartbeat_task):
+            if task is not None and task is not current_task:
+                task.cancel()
+
+    async def close(self, code: int = status.WS_1000_NORMAL_CLOSURE):
+        """Stop background tasks and close the websocket"""
+        if self.closed:
+            return
+        self.stop()
+        try:
+            await asyncio.wait_for(self.websocket.close(code=code), timeout=5)
+        except Exception:
+            # socket is already gone or the client is not reading
+            pass
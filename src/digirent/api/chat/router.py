@@ -1,35 +1,57 @@
 import json
+from datetime import datetime
 from uuid import UUID
-from fastapi import APIRouter, WebSocket, Depends
+from fastapi import APIRouter, Request, WebSocket, Depends
 from typing import Optional, Any
 from fastapi.exceptions import HTTPException
 from sqlalchemy import or_, func, and_
 from sqlalchemy.orm.session import Session
 from starlette import status
 from starlette.types import Message
+from digirent.api.chat import codec
 from digirent.api.chat.chat import ChatEvent, ChatEventType, ChatManager
+from digirent.api.chat.codec import ChatEncoding
 from digirent.api.chat.schema import (
     ChatMessagePaginationSchema,
+    ChatStatsSchema,
+    ChatUnreadCountsSchema,
     ChatUserPaginationSchema,
 )
 import digirent.api.dependencies as deps
+from digirent.api.schema import UserIdentitySchema
 from digirent.api.dependencies import (
     get_current_admin_user,
     get_current_active_user,
     get_database_session,
 )
-from digirent.database.models import ChatMessage, User
+from digirent.database.models import Admin, ChatMessage, ChatReadState, User
 
 router = APIRouter()
 
 
 class ChatManagerEndpoint:
-    def __init__(self, chat_manager: ChatManager):
+    def __init__(
+        self,
+        chat_manager: ChatManager,
+        encoding: str = ChatEncoding.JSON,
+        batch: bool = False,
+    ):
         self.chat_manager: ChatManager = chat_manager
-        self.encoding = "json"
+        self.encoding = encoding
+        self.batch = batch
 
     async def decode(self, websocket: WebSocket, message: Message) -> Any:
-        if self.encoding == "bytes":
+        if self.encoding == ChatEncoding.MSGPACK:
+            if message.get("bytes") is None:
+                await websocket.close(code=status.WS_1003_UNSUPPORTED_DATA)
+                raise RuntimeError("Expected msgpack websocket messages, but got text")
+            try:
+                return codec.decode(ChatEncoding.MSGPACK, message["bytes"])
+            except ValueError:
+                await websocket.close(code=status.WS_1003_UNSUPPORTED_DATA)
+                raise RuntimeError("Malformed msgpack data received.")
+
+        elif self.encoding == "bytes":
             if "bytes" not in message:
                 await websocket.close(code=status.WS_1003_UNSUPPORTED_DATA)
                 raise RuntimeError("Expected bytes websocket messages, but got text")
@@ -58,13 +80,24 @@ class ChatManagerEndpoint:
         ), f"Unsupported 'encoding' attribute {self.encoding}"
         return message["text"] if message.get("text") else message["bytes"]
 
-    async def on_connect(self, websocket: WebSocket):
+    async def on_connect(
+        self, websocket: WebSocket, last_seen: Optional[datetime] = None
+    ):
         await websocket.accept()
         await self.chat_manager.handle_event(
-            ChatEvent(event_type=ChatEventType.USER_CONNECTED, data={}), websocket
+            ChatEvent(
+                event_type=ChatEventType.USER_CONNECTED,
+                data={
+                    "last_seen": last_seen,
+                    "encoding": self.encoding,
+                    "batch": self.batch,
+                },
+            ),
+            websocket,
         )
 
     async def on_receive(self, websocket: WebSocket, data: dict):
+        self.chat_manager.touch(websocket)
         try:
             event = ChatEvent(**data)
             await self.chat_manager.handle_event(event, websocket)
@@ -82,17 +115,30 @@ class ChatManagerEndpoint:
 
 @router.websocket("/ws/{token}")
 async def chat(
-    websocket: WebSocket, user: User = Depends(deps.get_active_user_from_websocket)
+    websocket: WebSocket,
+    last_seen: Optional[datetime] = None,
+    encoding: ChatEncoding = ChatEncoding.JSON,
+    batch: bool = False,
+    user: UserIdentitySchema = Depends(deps.get_active_user_from_websocket),
 ):
+    """
+    Chat websocket. Pass last_seen (the created_at of the latest message the
+    client has) to receive every message missed since then on connect.
+    encoding selects json text frames or msgpack binary frames, and batch
+    makes the server coalesce outbound events into list frames.
+    """
     if user is None:
         await websocket.close()
         return
+    if encoding not in codec.supported_encodings():
+        await websocket.close(code=status.WS_1003_UNSUPPORTED_DATA)
+        return
     chat_manager: Optional[ChatManager] = websocket.get("chat_manager")
     if chat_manager is None:
         raise RuntimeError("Chat manager is unavailable")
-    manager_endpoint = ChatManagerEndpoint(chat_manager)
+    manager_endpoint = ChatManagerEndpoint(chat_manager, encoding, batch)
     websocket.state.user = user
-    await manager_endpoint.on_connect(websocket)
+    await manager_endpoint.on_connect(websocket, last_seen)
     try:
         while True:
             message: Message = await websocket.receive()
@@ -107,6 +153,43 @@ async def chat(
         await manager_endpoint.on_disconnect(websocket)
 
 
+@router.get("/stats", response_model=ChatStatsSchema)
+def fetch_chat_stats(
+    request: Request,
+    admin: Admin = Depends(get_current_admin_user),
+):
+    """Gauges for connected chat users, their send queues and evictions"""
+    chat_manager: Optional[ChatManager] = request.get("chat_manager")
+    if chat_manager is None:
+        raise HTTPException(503, "Chat manager is unavailable")
+    return chat_manager.stats
+
+
+@router.get("/unread", response_model=ChatUnreadCountsSchema)
+def fetch_unread_counts(
+    user: User = Depends(get_current_active_user),
+    session: Session = Depends(get_database_session),
+):
+    """
+    Unread message counts per conversation of the authenticated user,
+    read from the incrementally maintained counters
+    """
+    unread_counts = (
+        session.query(
+            ChatReadState.other_user_id.label("user_id"),
+            ChatReadState.unread_count,
+            ChatReadState.last_read_at,
+        )
+        .filter(ChatReadState.user_id == user.id)
+        .filter(ChatReadState.unread_count > 0)
+        .all()
+    )
+    return {
+        "total": sum(unread.unread_count for unread in unread_counts),
+        "data": unread_counts,
+    }
+
+
 @router.get("/users", response_model=ChatUserPaginationSchema)
 def fetch_users_chat_list(
     page: int = 1,
@@ -35,3 +35,27 @@ class ChatUserSchema(BaseSchema):
 
 class ChatUserPaginationSchema(BasePaginationSchema):
     data: List[ChatUserSchema]
+
+
+class ChatStatsSchema(BaseSchema):
+    connections: int
+    queue_depth: int
+    max_queue_depth: int
+    consumers_over_high_water_mark: int
+    evictions: int
+    db_connections_checked_out: Optional[int]
+    memory_rss_bytes: Optional[int]
+
+
+class ChatUnreadCountSchema(BaseSchema):
+    user_id: UUID
+    unread_count: int
+    last_read_at: Optional[datetime]
+
+    class Config:
+        orm_mode = True
+
+
+class ChatUnreadCountsSchema(BaseSchema):
+    total: int
+    data: List[ChatUnreadCountSchema]
@@ -7,7 +7,12 @@ from digirent.app import Application
 from digirent.app.container import ApplicationContainer
 from sqlalchemy.orm.session import Session
 from digirent.app.error import ApplicationError
+from digirent.api.schema import UserIdentitySchema
 from digirent.core import config
+from digirent.core.services.payment_gateway import (
+    PaymentGateway,
+    get_payment_gateway as get_default_payment_gateway,
+)
 from digirent.database.models import Admin, Landlord, Tenant, User, UserRole
 from digirent.database.base import SessionLocal
 from itsdangerous.url_safe import URLSafeSerializer
@@ -29,6 +34,10 @@ def get_application() -> Application:
     return ApplicationContainer.app()
 
 
+def get_payment_gateway() -> PaymentGateway:
+    return get_default_payment_gateway()
+
+
 async def get_current_user(
     token: bytes = Depends(oauth2_scheme),
     session: Session = Depends(get_database_session),
@@ -211,24 +220,27 @@ def get_optional_current_user_from_state(
 async def get_user_from_websocket(
     token: str,
     application: Application = Depends(get_application),
-    session: Session = Depends(get_database_session),
-) -> Optional[User]:
+) -> Optional[UserIdentitySchema]:
+    """
+    Authenticate a websocket token and return a detached identity.
+    The session is closed as soon as the user is loaded, so a long lived
+    websocket does not hold on to a pooled database connection.
+    """
+    session: Session = SessionLocal()
     try:
         user = application.authenticate_token(session, token)
-        if user.role == UserRole.ADMIN:
-            user = session.query(Admin).get(user.id)
-        elif user.role == UserRole.TENANT:
-            user = session.query(Tenant).get(user.id)
-        elif user.role == UserRole.LANDLORD:
-            user = session.query(Landlord).get(user.id)
+        if not user:
+            return
+        return UserIdentitySchema.from_orm(user)
     except Exception:
         return
-    return user
+    finally:
+        session.close()
 
 
 async def get_active_user_from_websocket(
-    user: Optional[User] = Depends(get_user_from_websocket),
-) -> Optional[User]:
+    user: Optional[UserIdentitySchema] = Depends(get_user_from_websocket),
+) -> Optional[UserIdentitySchema]:
     if user and not user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
     return user
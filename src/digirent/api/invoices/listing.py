@@ -0,0 +1,48 @@
+from datetime import date, timedelta
+from typing import Optional
+from sqlalchemy.orm import Query
+from sqlalchemy.orm.session import Session
+from digirent.database.enums import InvoiceStatus, InvoiceType
+from digirent.database.models import Invoice
+from ..pagination import keyset_page
+
+# the columns of InvoiceSchema, loaded as plain rows instead of Invoice objects
+INVOICE_COLUMNS = [
+    Invoice.id,
+    Invoice.created_at,
+    Invoice.updated_at,
+    Invoice.status,
+    Invoice.type,
+    Invoice.amount,
+    Invoice.description,
+    Invoice.payment_id,
+    Invoice.payment_action_date,
+    Invoice.next_date,
+    Invoice.user_id,
+    Invoice.apartment_application_id,
+]
+
+
+def invoice_query(
+    session: Session,
+    status: Optional[InvoiceStatus] = None,
+    type: Optional[InvoiceType] = None,
+    created_from: Optional[date] = None,
+    created_to: Optional[date] = None,
+) -> Query:
+    """Invoices projected to INVOICE_COLUMNS, created_to is inclusive"""
+    query = session.query(*INVOICE_COLUMNS)
+    if status:
+        query = query.filter(Invoice.status == status)
+    if type:
+        query = query.filter(Invoice.type == type)
+    if created_from:
+        query = query.filter(Invoice.created_at >= created_from)
+    if created_to:
+        query = query.filter(Invoice.created_at < created_to + timedelta(days=1))
+    return query
+
+
+def invoice_page(query: Query, cursor: Optional[str], page_size: int) -> dict:
+    """A keyset_page of newest first invoices after cursor"""
+    return keyset_page(query, Invoice.created_at, Invoice.id, cursor, page_size)
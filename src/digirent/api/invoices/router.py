@@ -1,64 +1,79 @@
-from typing import List, Optional
+from datetime import date
+from typing import Optional
 from uuid import UUID
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Query
 from sqlalchemy.orm.session import Session
-from mollie.api.client import Client
-from mollie.api.error import Error
-from digirent.core import config
+from starlette.concurrency import run_in_threadpool
 from digirent.api import dependencies as deps
+from digirent.core.services.payment_gateway import PaymentGateway, PaymentGatewayError
+from digirent.database.billing import apply_invoice_statuses
 from digirent.database.enums import InvoiceStatus
 from digirent.database.models import Admin, Invoice
-from .schema import InvoiceType, InvoiceSchema
+from .listing import invoice_page, invoice_query
+from .schema import InvoiceType, InvoicePaginationSchema, InvoiceSchema
 
 router = APIRouter()
 
-mollie_client = Client()
-mollie_client.set_api_key(config.MOLLIE_API_KEY)
 
-
-@router.get("/", response_model=List[InvoiceSchema])
+@router.get("/", response_model=InvoicePaginationSchema)
 def fetch_all_invoices(
     apartment_application_id: Optional[UUID] = None,
     user_id: Optional[UUID] = None,
     type: Optional[InvoiceType] = None,
+    status: Optional[InvoiceStatus] = None,
+    created_from: Optional[date] = None,
+    created_to: Optional[date] = None,
+    cursor: Optional[str] = None,
+    page_size: int = Query(20, ge=1, le=100),
     admin: Admin = Depends(deps.get_current_admin_user),
     session: Session = Depends(deps.get_database_session),
 ):
-    query = session.query(Invoice)
-    if type:
-        query = query.filter(Invoice.type == type)
+    query = invoice_query(session, status, type, created_from, created_to)
     if apartment_application_id:
         query = query.filter(
             Invoice.apartment_application_id == apartment_application_id
         )
-    elif user_id:
+    if user_id:
         query = query.filter(Invoice.user_id == user_id)
-    return query.all()
+    try:
+        return invoice_page(query, cursor, page_size)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
 
 
 @router.post("/{invoice_id}/verify", response_model=InvoiceSchema)
-def verify_invoice(
+async def verify_invoice(
     invoice_id: UUID,
     admin: Admin = Depends(deps.get_current_admin_user),
     session: Session = Depends(deps.get_database_session),
+    payment_gateway: PaymentGateway = Depends(deps.get_payment_gateway),
 ):
-    invoice: Invoice = session.query(Invoice).get(invoice_id)
+    invoice: Invoice = await run_in_threadpool(session.query(Invoice).get, invoice_id)
     if not invoice:
         raise HTTPException(404, "Invoice not found")
+    if not invoice.payment_id:
+        raise HTTPException(400, "Invoice has no payment yet")
     try:
-        payment = mollie_client.payments.get(invoice.payment_id)
-        if payment.is_paid():
-            invoice.status = InvoiceStatus.PAID
-            session.commit()
-        elif payment.is_pending():
-            pass
-        elif not payment.is_open():
-            invoice.status = InvoiceStatus.FAILED
-            session.commit()
-    except Error as err:
+        payment = await payment_gateway.aget_payment(invoice.payment_id)
+    except PaymentGatewayError as err:
         # TODO log error
         print("\n\n\n\n\n")
         print(err)
         print("\n\n\n\n\n")
         raise HTTPException(400, str(err))
-    return invoice
+    if payment.is_paid():
+        status = InvoiceStatus.PAID
+    elif payment.is_pending() or payment.is_open():
+        return invoice
+    else:
+        status = InvoiceStatus.FAILED
+
+    def apply_status() -> Invoice:
+        apply_invoice_statuses(session, {invoice.id: status})
+        session.commit()
+        # reloaded here, so the response is not read from the database on
+        # the event loop
+        session.refresh(invoice)
+        return invoice
+
+    return await run_in_threadpool(apply_status)
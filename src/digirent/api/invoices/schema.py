@@ -1,5 +1,5 @@
 from datetime import date
-from typing import Optional
+from typing import List, Optional
 from uuid import UUID
 from digirent.api.schema import BaseSchema, OrmSchema
 from digirent.database.enums import InvoiceStatus, InvoiceType
@@ -9,7 +9,7 @@ class InvoiceBaseSchema(BaseSchema):
     status: InvoiceStatus
     amount: float
     description: str
-    payment_id: str
+    payment_id: Optional[str]
     payment_action_date: Optional[date]
     next_date: date
     type: InvoiceType
@@ -18,3 +18,9 @@ class InvoiceBaseSchema(BaseSchema):
 class InvoiceSchema(OrmSchema, InvoiceBaseSchema):
     user_id: Optional[UUID]
     apartment_application_id: Optional[UUID]
+
+
+class InvoicePaginationSchema(BaseSchema):
+    page_size: int
+    next_cursor: Optional[str]
+    data: List[InvoiceSchema]
@@ -1,13 +1,28 @@
-from typing import List
-from fastapi import APIRouter, Depends
+from datetime import date
+from typing import List, Optional
+from uuid import UUID
+from fastapi import APIRouter, Depends, Query
 from fastapi.exceptions import HTTPException
 from sqlalchemy.orm.session import Session
 from digirent.app import Application
 from digirent.app.error import ApplicationError
-from digirent.database.enums import UserRole
-from digirent.database.models import Apartment, ApartmentApplication, Tenant, User
+from digirent.database.enums import (
+    ApartmentApplicationStatus,
+    InvoiceStatus,
+    InvoiceType,
+    UserRole,
+)
+from digirent.database.models import (
+    Apartment,
+    ApartmentApplication,
+    BillingState,
+    Invoice,
+    Tenant,
+    User,
+)
 from .schema import (
     BankDetailSchema,
+    BillingSchema,
     LookingForSchema,
     PasswordUpdateSchema,
     ProfileSchema,
@@ -15,6 +30,13 @@ from .schema import (
 )
 import digirent.api.dependencies as dependencies
 from digirent.api.apartment_applications import schema as apartment_applications_schema
+from digirent.api.apartment_applications.listing import (
+    application_page,
+    application_query,
+    landlord_applications,
+)
+from digirent.api.invoices.listing import invoice_page, invoice_query
+from digirent.api.invoices.schema import InvoicePaginationSchema
 
 
 router = APIRouter()
@@ -113,3 +135,105 @@ def fetch_my_apartment_applications(
         )
     else:
         raise HTTPException(403, "Forbidden")
+
+
+@router.get(
+    "/applications",
+    response_model=apartment_applications_schema.ApartmentApplicationPaginationSchema,
+)
+def fetch_my_apartment_applications_page(
+    apartment_id: Optional[UUID] = None,
+    status: Optional[ApartmentApplicationStatus] = None,
+    cursor: Optional[str] = None,
+    page_size: int = Query(20, ge=1, le=100),
+    user: User = Depends(dependencies.get_current_active_user),
+    session: Session = Depends(dependencies.get_database_session),
+):
+    """
+    The tenant's applications or the applications for the landlord's
+    apartments, newest first, with their contract, apartment and tenant
+    """
+    query = application_query(session, status)
+    if user.role == UserRole.TENANT:
+        query = query.filter(ApartmentApplication.tenant_id == user.id)
+    elif user.role == UserRole.LANDLORD:
+        query = landlord_applications(query, session, user.id)
+    else:
+        raise HTTPException(403, "Forbidden")
+    if apartment_id:
+        query = query.filter(ApartmentApplication.apartment_id == apartment_id)
+    try:
+        return application_page(query, cursor, page_size)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+
+
+@router.get("/billing", response_model=BillingSchema)
+def fetch_my_billing(
+    user: User = Depends(dependencies.get_current_active_user),
+    session: Session = Depends(dependencies.get_database_session),
+):
+    """
+    Billing summary of the user's subscription and of the tenancies they pay
+    rent for as tenant or receive rent for as landlord
+    """
+    if user.role == UserRole.TENANT:
+        tenancy = ApartmentApplication.tenant_id == user.id
+    elif user.role == UserRole.LANDLORD:
+        tenancy = Apartment.landlord_id == user.id
+    else:
+        raise HTTPException(403, "Forbidden")
+    states: List[BillingState] = (
+        session.query(BillingState)
+        .outerjoin(
+            ApartmentApplication,
+            ApartmentApplication.id == BillingState.apartment_application_id,
+        )
+        .outerjoin(Apartment, Apartment.id == ApartmentApplication.apartment_id)
+        .filter((BillingState.user_id == user.id) | tenancy)
+        .order_by(BillingState.next_due_date)
+        .all()
+    )
+    return {
+        "subscription": next(
+            (state for state in states if state.user_id == user.id), None
+        ),
+        "tenancies": [state for state in states if state.apartment_application_id],
+    }
+
+
+@router.get("/invoices", response_model=InvoicePaginationSchema)
+def fetch_my_invoices(
+    type: Optional[InvoiceType] = None,
+    status: Optional[InvoiceStatus] = None,
+    created_from: Optional[date] = None,
+    created_to: Optional[date] = None,
+    cursor: Optional[str] = None,
+    page_size: int = Query(20, ge=1, le=100),
+    user: User = Depends(dependencies.get_current_active_user),
+    session: Session = Depends(dependencies.get_database_session),
+):
+    """
+    The user's subscription invoices and the rent invoices of the tenancies
+    they pay as tenant or receive as landlord, newest first
+    """
+    if user.role == UserRole.TENANT:
+        tenancies = session.query(ApartmentApplication.id).filter(
+            ApartmentApplication.tenant_id == user.id
+        )
+    elif user.role == UserRole.LANDLORD:
+        tenancies = (
+            session.query(ApartmentApplication.id)
+            .join(Apartment, Apartment.id == ApartmentApplication.apartment_id)
+            .filter(Apartment.landlord_id == user.id)
+        )
+    else:
+        raise HTTPException(403, "Forbidden")
+    query = invoice_query(session, status, type, created_from, created_to).filter(
+        (Invoice.user_id == user.id)
+        | Invoice.apartment_application_id.in_(tenancies.subquery())
+    )
+    try:
+        return invoice_page(query, cursor, page_size)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
@@ -1,6 +1,7 @@
-from datetime import date
-from typing import Optional
-from digirent.database.enums import HouseType
+from datetime import date, datetime
+from typing import List, Optional
+from uuid import UUID
+from digirent.database.enums import HouseType, InvoiceStatus
 from digirent.database.models import Gender, UserRole
 from ..schema import BaseSchema, OrmSchema
 
@@ -49,3 +50,20 @@ class BankDetailSchema(BaseSchema):
 class PasswordUpdateSchema(BaseSchema):
     old_password: str
     new_password: str
+
+
+class BillingStateSchema(OrmSchema):
+    user_id: Optional[UUID]
+    apartment_application_id: Optional[UUID]
+    latest_invoice_id: UUID
+    latest_invoice_status: InvoiceStatus
+    next_due_date: date
+    amount_outstanding: float
+    amount_in_arrears: float
+    in_arrears: bool
+    last_paid_at: Optional[datetime]
+
+
+class BillingSchema(BaseSchema):
+    subscription: Optional[BillingStateSchema]
+    tenancies: List[BillingStateSchema]
@@ -0,0 +1,49 @@
+import base64
+from datetime import datetime
+from typing import Optional, Tuple
+from uuid import UUID
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Query
+
+
+def encode_cursor(created_at: datetime, entity_id: UUID) -> str:
+    value = f"{created_at.isoformat()}|{entity_id}"
+    return base64.urlsafe_b64encode(value.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, UUID]:
+    """Raises ValueError for cursors not made by encode_cursor"""
+    try:
+        created_at, entity_id = (
+            base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        )
+        return datetime.fromisoformat(created_at), UUID(entity_id)
+    except (TypeError, ValueError) as err:
+        raise ValueError("Invalid cursor") from err
+
+
+def keyset_page(
+    query: Query, created_at, entity_id, cursor: Optional[str], page_size: int
+) -> dict:
+    """
+    A page of newest first rows after cursor, ordered by the created_at and
+    entity_id columns. Pages are fetched by (created_at, id) keyset, so deep
+    pages cost as little as the first one and rows created while paging never
+    shift a page.
+    """
+    if cursor:
+        cursor_created_at, cursor_id = decode_cursor(cursor)
+        query = query.filter(
+            or_(
+                created_at < cursor_created_at,
+                and_(created_at == cursor_created_at, entity_id < cursor_id),
+            )
+        )
+    rows = (
+        query.order_by(created_at.desc(), entity_id.desc()).limit(page_size + 1).all()
+    )
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id)
+    return {"page_size": page_size, "next_cursor": next_cursor, "data": rows}
@@ -1,62 +1,42 @@
-from fastapi import APIRouter, Body, HTTPException, Depends
+from fastapi import APIRouter, Depends, Form
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm.session import Session
-from mollie.api.client import Client
-from mollie.api.error import Error
-from digirent.core import config
 from digirent.api import dependencies as deps
-from digirent.database.enums import InvoiceStatus, InvoiceType
-from digirent.database.models import Invoice
+from digirent.database.models import PaymentWebhookEvent
 
 router = APIRouter()
 
-mollie_client = Client()
-mollie_client.set_api_key(config.MOLLIE_API_KEY)
 
-
-@router.route("/webhook", methods=["GET", "POST", "PUT"])
-def payments_webhook_callback(
-    payload: Body(...), session: Session = Depends(deps.get_database_session)
-):
+def record_payment_webhook(session: Session, payment_id: str):
+    """Add payment_id to the webhook inbox or re-arm its existing row"""
+    query = session.query(PaymentWebhookEvent).filter(
+        PaymentWebhookEvent.payment_id == payment_id
+    )
+    values = {
+        PaymentWebhookEvent.version: PaymentWebhookEvent.version + 1,
+        PaymentWebhookEvent.attempts: 0,
+        PaymentWebhookEvent.last_error: None,
+        PaymentWebhookEvent.processed_at: None,
+    }
+    if query.update(values, synchronize_session=False):
+        return
     try:
-        if "id" not in payload:
-            raise HTTPException(404, "Unknown payment id")
-
-        payment_id = payload["id"]
-        payment = mollie_client.payments.get(payment_id)
-        # TODO Better key fields
-        invoice_type = payment.metadata["type"]
-        invoice_id = payment.metadata["invoice_id"]
+        with session.begin_nested():
+            session.add(PaymentWebhookEvent(payment_id=payment_id))
+    except IntegrityError:
+        # recorded concurrently by a retry of the same notification
+        query.update(values, synchronize_session=False)
 
-        try:
-            invoice_type = InvoiceType(invoice_type)
-        except ValueError:
-            # TODO log error here
-            print("\n\n\n\n\n")
-            print(f"Invalid invoice type {invoice_type}")
-            print("\n\n\n\n\n")
-            return
 
-        invoice: Invoice = session.query(Invoice).get(invoice_id)
-
-        if not invoice:
-            # TODO log error here
-            print("\n\n\n\n\n")
-            print(f"Invoice with id {invoice_id} not found")
-            print("\n\n\n\n\n")
-            return
-
-        if payment.is_paid():
-            invoice.status = InvoiceStatus.PAID
-            session.commit()
-        elif payment.is_pending():
-            pass
-        elif not payment.is_open():
-            invoice.status = InvoiceStatus.FAILED
-            session.commit()
-        return
-    except Error as err:
-        # TODO log error
-        print("\n\n\n\n\n")
-        print(err)
-        print("\n\n\n\n\n")
-        raise HTTPException(400, str(err))
+@router.post("/webhook")
+def payments_webhook_callback(
+    id: str = Form(..., max_length=64),
+    session: Session = Depends(deps.get_database_session),
+):
+    """
+    Mollie payment status webhook. The payment id is only recorded here,
+    the payments worker fetches its status and updates the invoice, so Mollie
+    is answered without waiting on its own api.
+    """
+    record_payment_webhook(session, id)
+    session.commit()
@@ -3,6 +3,7 @@ from typing import Optional
 from uuid import UUID
 from pydantic import BaseModel
 from datetime import datetime
+from digirent.database.enums import UserRole
 
 
 class BaseSchema(BaseModel):
@@ -28,3 +29,16 @@ class BasePaginationSchema(BaseSchema):
     page: int
     page_size: int
     count: int
+
+
+class UserIdentitySchema(BaseSchema):
+    """Detached identity of an authenticated user, safe to keep around
+    after the database session that loaded the user is closed"""
+
+    id: UUID
+    role: UserRole
+    is_active: bool
+
+    class Config:
+        orm_mode = True
+        allow_mutation = False
@@ -100,7 +100,7 @@ def verify_signrequest_document(
             return
 
     try:
-        document: Document = get_document(document_id)
+        document: Document = get_document(document_id, cached=False)
         apartment_application_id = document.external_id
         signrequest = document.signrequest
         signers = signrequest.signers
@@ -1,55 +1,47 @@
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
+from typing import List, Union
+from fastapi import APIRouter, Depends, HTTPException
 from jwt import PyJWTError
 from digirent.app.error import ApplicationError
-from pathlib import Path
 from sqlalchemy.orm.session import Session
 from digirent.app import Application
 import digirent.api.dependencies as dependencies
 from digirent.database.models import Admin, Landlord, Tenant, User
+from digirent.database.outbox import add_emails
 from .schema import UserCreateSchema, UserSchema
 from digirent import util
 from digirent.core import config
+from digirent.core.services.email_templates import render_email
 
 
 router = APIRouter()
 
 EMAIL_VERIFICATION_TOKEN_VALUE = "email_verification"
 
-verification_email_path = Path(__file__).parents[4] / "templates/verification.html"
 
-
-def generate_verification_url(user: User) -> str:
+def generate_verification_url(user: Union[User, UserCreateSchema]) -> str:
     token = util.create_token(
         {"type": EMAIL_VERIFICATION_TOKEN_VALUE, "email": user.email}
     )
     return f"{config.CLIENT_HOST}/verify?token={token.decode('utf-8')}"
 
 
-def generate_email_verification_text(user: User) -> str:
-    url = generate_verification_url(user)
-    return f"""
-        Hello, {user.first_name},
-        Thank you for signing up on Digi rent.
-        Please follow this url to verify your account {url}
+def verification_email(user: Union[User, UserCreateSchema]) -> dict:
     """
-
-
-def generate_email_verification_html(user: User) -> str:
-    url = generate_verification_url(user)
-    with open(verification_email_path) as f:
-        content = f.read()
-        content = content.replace(
-            "{{user_name}}", f"{user.first_name} {user.last_name}"
-        )
-        content = content.replace("{{verification_url}}", url)
-        return content
+    The verification email of a user, or of one being registered, whose
+    bodies share one token
+    """
+    return render_email(
+        "verification",
+        user.email,
+        first_name=user.first_name,
+        user_name=f"{user.first_name} {user.last_name}",
+        verification_url=generate_verification_url(user),
+    )
 
 
 @router.post("/tenant", response_model=UserSchema)
 async def register_tenant(
     data: UserCreateSchema,
-    background_tasks: BackgroundTasks,
     application: Application = Depends(dependencies.get_application),
     session: Session = Depends(dependencies.get_database_session),
 ):
@@ -66,15 +58,9 @@ async def register_tenant(
         )
         if existing_user_with_phonenumber:
             raise HTTPException(409, "User with phone number aready exists")
-        result = application.create_tenant(session, **data.dict())
-        background_tasks.add_task(
-            util.send_email,
-            to=result.email,
-            subject="Verify Acccount",
-            message=generate_email_verification_text(result),
-            html=generate_email_verification_html(result),
-        )
-        return result
+        # committed with the user
+        add_emails(session, [verification_email(data)])
+        return application.create_tenant(session, **data.dict())
     except ApplicationError as e:
         raise HTTPException(401, str(e))
 
@@ -82,7 +68,6 @@ async def register_tenant(
 @router.post("/landlord", response_model=UserSchema)
 async def register_landlord(
     data: UserCreateSchema,
-    background_tasks: BackgroundTasks,
     application: Application = Depends(dependencies.get_application),
     session: Session = Depends(dependencies.get_database_session),
 ):
@@ -99,15 +84,9 @@ async def register_landlord(
         )
         if existing_user_with_phonenumber:
             raise HTTPException(409, "User with phone number aready exists")
-        result = application.create_landlord(session, **data.dict())
-        background_tasks.add_task(
-            util.send_email,
-            to=result.email,
-            subject="Verify Acccount",
-            message=generate_email_verification_text(result),
-            html=generate_email_verification_html(result),
-        )
-        return result
+        # committed with the user
+        add_emails(session, [verification_email(data)])
+        return application.create_landlord(session, **data.dict())
     except ApplicationError as e:
         raise HTTPException(401, str(e))
 
@@ -140,19 +119,13 @@ def fetch_all_tenants(
 
 @router.post("/verify/resend")
 def resend_verification_email(
-    background_tasks: BackgroundTasks,
     user: User = Depends(dependencies.get_current_user),
     session: Session = Depends(dependencies.get_database_session),
 ):
     if user.email_verified:
         raise HTTPException(400, "User email already verified")
-    background_tasks.add_task(
-        util.send_email,
-        to=user.email,
-        subject="Verify Acccount",
-        message=generate_email_verification_text(user),
-        html=generate_email_verification_html(user),
-    )
+    add_emails(session, [verification_email(user)])
+    session.commit()
     return {"status": "Success", "message": "Email sent successfully"}
 
 
@@ -1,5 +1,5 @@
 from pathlib import Path
-from typing import IO, List, Optional
+from typing import IO, Dict, List, Optional, Tuple
 from uuid import UUID, uuid4
 from datetime import date, datetime
 from jwt import PyJWTError
@@ -17,15 +17,20 @@ from digirent.database.enums import (
     HouseType,
     InvoiceStatus,
     InvoiceType,
+    OutboxEffect,
     SocialAccountType,
 )
+from digirent.database.billing import record_invoice
+from digirent.database.outbox import add_outbox_message
 from .base import ApplicationBase
 from .error import ApplicationError
 from digirent.database.models import (
+    APPLICATION_STATUS_TRANSITIONS,
     Amenity,
     Apartment,
     ApartmentApplication,
     BankDetail,
+    BillingState,
     BookingRequest,
     Contract,
     Invoice,
@@ -36,12 +41,6 @@ from digirent.database.models import (
     User,
     UserRole,
 )
-from digirent.core.services.sign_request import send_contract_sign_request
-from mollie.api.client import Client
-
-
-mollie_client = Client()
-mollie_client.set_api_key(config.MOLLIE_API_KEY)
 
 
 class Application(ApplicationBase):
@@ -523,16 +522,17 @@ class Application(ApplicationBase):
     ) -> ApartmentApplication:
 
         awarded_or_completed_application = (
-            session.query(ApartmentApplication)
-            .join(Contract)
+            session.query(ApartmentApplication.id)
             .filter(ApartmentApplication.apartment_id == apartment.id)
             .filter(
-                or_(
-                    ApartmentApplication.status == ApartmentApplicationStatus.AWARDED,
-                    ApartmentApplication.status == ApartmentApplicationStatus.COMPLETED,
+                ApartmentApplication.status.in_(
+                    [
+                        ApartmentApplicationStatus.AWARDED,
+                        ApartmentApplicationStatus.COMPLETED,
+                    ]
                 )
             )
-            .one_or_none()
+            .first()
         )
         if awarded_or_completed_application:
             raise ApplicationError("Apartment has already been awarded or completed")
@@ -552,6 +552,17 @@ class Application(ApplicationBase):
             session, tenant=tenant, apartment=apartment
         )
 
+    def __transition_application(
+        self,
+        apartment_application: ApartmentApplication,
+        status: ApartmentApplicationStatus,
+    ):
+        """Move the application along the APPLICATION_STATUS_TRANSITIONS"""
+        try:
+            apartment_application.transition_to(status)
+        except ValueError as e:
+            raise ApplicationError(str(e))
+
     def reject_apartment_application(
         self,
         session: Session,
@@ -561,9 +572,11 @@ class Application(ApplicationBase):
             raise ApplicationError(
                 "Apartment application can not be reject at this stage"
             )
-        return self.apartment_application_service.update(
-            session, apartment_application, is_rejected=True
+        self.__transition_application(
+            apartment_application, ApartmentApplicationStatus.REJECTED
         )
+        session.commit()
+        return apartment_application
 
     def consider_apartment_application(
         self,
@@ -574,9 +587,99 @@ class Application(ApplicationBase):
             raise ApplicationError(
                 "Apartment application can not be considered at this stage"
             )
-        return self.apartment_application_service.update(
-            session, apartment_application, is_considered=True
+        self.__transition_application(
+            apartment_application, ApartmentApplicationStatus.CONSIDERED
+        )
+        session.commit()
+        return apartment_application
+
+    def transition_apartment_applications(
+        self,
+        session: Session,
+        status: ApartmentApplicationStatus,
+        *criteria,
+        from_statuses: List[ApartmentApplicationStatus] = None,
+        commit=True,
+    ) -> List[UUID]:
+        """
+        Move the applications matching criteria to status with a single
+        UPDATE, without loading them. Only applications in from_statuses move,
+        by default those APPLICATION_STATUS_TRANSITIONS lets move to status.
+        Returns the ids of the moved applications.
+        """
+        if from_statuses is None:
+            from_statuses = [
+                current
+                for current, statuses in APPLICATION_STATUS_TRANSITIONS.items()
+                if status in statuses
+            ]
+        return self.apartment_application_service.bulk_update(
+            session,
+            *criteria,
+            ApartmentApplication.status.in_(from_statuses),
+            commit=commit,
+            **ApartmentApplication.transition_values(status),
+        )
+
+    def review_apartment_applications(
+        self,
+        session: Session,
+        landlord: Landlord,
+        application_ids: List[UUID],
+        status: ApartmentApplicationStatus,
+        commit: bool = True,
+    ) -> Tuple[Dict[UUID, str], list]:
+        """
+        Reject or consider many of the landlord's new applications at once:
+        ownership is checked in one query and the applications are moved
+        with transition_apartment_applications. Returns the outcome of every
+        id, the new status, "not_found" or "invalid_status", and the moved
+        applications with their tenant's email and apartment name to notify
+        the tenants. Without commit the caller commits, with the notifications.
+        """
+        assert status in [
+            ApartmentApplicationStatus.REJECTED,
+            ApartmentApplicationStatus.CONSIDERED,
+        ]
+        applications = (
+            session.query(
+                ApartmentApplication.id,
+                ApartmentApplication.status,
+                User.email.label("tenant_email"),
+                Apartment.name.label("apartment_name"),
+            )
+            .join(Apartment, ApartmentApplication.apartment_id == Apartment.id)
+            .join(User, ApartmentApplication.tenant_id == User.id)
+            .filter(ApartmentApplication.id.in_(application_ids))
+            .filter(Apartment.landlord_id == landlord.id)
+            .all()
         )
+        found = {application.id: application for application in applications}
+        # the rows are locked by the UPDATE, so only the ids it moved count as
+        # reviewed even if an application changed since it was read
+        moved = set()
+        if found:
+            moved = set(
+                self.transition_apartment_applications(
+                    session,
+                    status,
+                    ApartmentApplication.id.in_(list(found)),
+                    from_statuses=[ApartmentApplicationStatus.NEW],
+                    commit=commit,
+                )
+            )
+        outcomes = {}
+        for application_id in application_ids:
+            if application_id not in found:
+                outcomes[application_id] = "not_found"
+            elif application_id not in moved:
+                outcomes[application_id] = "invalid_status"
+            else:
+                outcomes[application_id] = status.value
+        reviewed = [
+            application for application in applications if application.id in moved
+        ]
+        return outcomes, reviewed
 
     def process_apartment_application(
         self,
@@ -586,39 +689,45 @@ class Application(ApplicationBase):
         if apartment_application.status != ApartmentApplicationStatus.CONSIDERED:
             raise ApplicationError("Apartment has not been considered")
         currently_processed_application = (
-            session.query(ApartmentApplication)
-            .join(Contract)
+            session.query(ApartmentApplication.id)
             .filter(
                 ApartmentApplication.apartment_id == apartment_application.apartment_id
             )
             .filter(
-                or_(
-                    ApartmentApplication.status
-                    == ApartmentApplicationStatus.PROCESSING,
-                    ApartmentApplication.status == ApartmentApplicationStatus.AWARDED,
+                ApartmentApplication.status.in_(
+                    [
+                        ApartmentApplicationStatus.PROCESSING,
+                        ApartmentApplicationStatus.AWARDED,
+                    ]
                 )
             )
-            .one_or_none()
+            .first()
         )
         if currently_processed_application:
             raise ApplicationError("Another application is currently being processed")
         contract = Contract(apartment_application_id=apartment_application.id)
         session.add(contract)
+        self.__transition_application(
+            apartment_application, ApartmentApplicationStatus.PROCESSING
+        )
+        add_outbox_message(
+            session,
+            OutboxEffect.CONTRACT_SIGN_REQUEST,
+            {
+                "apartment_application_id": str(apartment_application.id),
+                "landlord_email": apartment_application.apartment.landlord.email,
+                "tenant_email": apartment_application.tenant.email,
+            },
+        )
         session.commit()
-        if config.APP_ENV != "test":
-            send_contract_sign_request(
-                apartment_application.id,
-                apartment_application.apartment.landlord.email,
-                apartment_application.tenant.email,
-            )
         return apartment_application
 
     def __confirm_and_create_invoice(self, session: Session, apartment_application):
-        has_invoice = bool(
-            session.query(Invoice)
-            .filter(Invoice.type == InvoiceType.RENT)
-            .filter(Invoice.apartment_application_id == apartment_application.id)
-            .count()
+        has_invoice = (
+            session.query(BillingState.id)
+            .filter(BillingState.apartment_application_id == apartment_application.id)
+            .first()
+            is not None
         )
         if (
             not has_invoice
@@ -646,25 +755,35 @@ class Application(ApplicationBase):
             )
             session.add(invoice)
             session.flush()
+            record_invoice(session, invoice)
             mollie_amount = util.float_to_mollie_amount(invoice.amount)
-            print("\n\n\n\n")
-            print(f"Amount to charge is {mollie_amount}")
-            print("\n\n\n\n")
-            payment = mollie_client.payments.create(
+            # the payment is created after the commit, the worker sets the
+            # invoice's payment_id
+            add_outbox_message(
+                session,
+                OutboxEffect.RENT_PAYMENT,
                 {
-                    "amount": {"currency": "EUR", "value": mollie_amount},
-                    "description": invoice.description,
-                    "redirectUrl": redirect_url,
-                    "webhookUrl": webhook_url,
-                    "metadata": {
-                        "type": invoice.type,
-                        "invoice_id": str(invoice.id),
-                        "created_date": str(start_date),
-                        "next_date": str(next_date),
+                    "invoice_id": str(invoice.id),
+                    "payment": {
+                        "amount": {"currency": "EUR", "value": mollie_amount},
+                        "description": invoice.description,
+                        "redirectUrl": redirect_url,
+                        "webhookUrl": webhook_url,
+                        "metadata": {
+                            "type": invoice.type.value,
+                            "invoice_id": str(invoice.id),
+                            "created_date": str(start_date),
+                            "next_date": str(next_date),
+                        },
                     },
-                }
+                },
+            )
+
+    def __award_when_signed(self, apartment_application: ApartmentApplication):
+        if apartment_application.contract.status == ContractStatus.SIGNED:
+            self.__transition_application(
+                apartment_application, ApartmentApplicationStatus.AWARDED
             )
-            invoice.payment_id = payment.id
 
     def tenant_signed_contract(
         self,
@@ -676,6 +795,7 @@ class Application(ApplicationBase):
             raise ApplicationError("Cannot sign contract at this stage")
         apartment_application.contract.tenant_has_signed = True
         apartment_application.contract.tenant_signed_on = signed_on
+        self.__award_when_signed(apartment_application)
         self.__confirm_and_create_invoice(session, apartment_application)
         session.commit()
         return apartment_application
@@ -690,6 +810,7 @@ class Application(ApplicationBase):
             raise ApplicationError("Cannot sign contract at this stage")
         apartment_application.contract.landlord_has_signed = True
         apartment_application.contract.landlord_signed_on = signed_on
+        self.__award_when_signed(apartment_application)
         self.__confirm_and_create_invoice(session, apartment_application)
         session.commit()
         return apartment_application
@@ -711,6 +832,9 @@ class Application(ApplicationBase):
         else:
             contract.landlord_declined = True
             contract.landlord_declined_on = declined_on
+        self.__transition_application(
+            apartment_application, ApartmentApplicationStatus.FAILED
+        )
         session.commit()
         return apartment_application
 
@@ -725,6 +849,9 @@ class Application(ApplicationBase):
         contract: Contract = apartment_application.contract
         contract.expired_on = expired_on
         contract.expired = True
+        self.__transition_application(
+            apartment_application, ApartmentApplicationStatus.FAILED
+        )
         session.commit()
         return apartment_application
 
@@ -739,6 +866,9 @@ class Application(ApplicationBase):
         contract: Contract = apartment_application.contract
         contract.canceled = True
         contract.canceled_on = canceled_on
+        self.__transition_application(
+            apartment_application, ApartmentApplicationStatus.FAILED
+        )
         session.commit()
         return apartment_application
 
@@ -747,14 +877,15 @@ class Application(ApplicationBase):
     ):
         if apartment_application.contract.status != ContractStatus.SIGNED:
             raise ApplicationError("Contract is not signed")
-        rent_invoice: Invoice = (
-            session.query(Invoice)
-            .filter(Invoice.type == InvoiceType.RENT)
-            .filter(Invoice.apartment_application_id == apartment_application.id)
-            .order_by(Invoice.created_at.desc())
-            .first()
+        billing_state: BillingState = (
+            session.query(BillingState)
+            .filter(BillingState.apartment_application_id == apartment_application.id)
+            .one_or_none()
         )
-        if not rent_invoice or rent_invoice.status != InvoiceStatus.PAID:
+        if (
+            not billing_state
+            or billing_state.latest_invoice_status != InvoiceStatus.PAID
+        ):
             raise ApplicationError("Payment has not been made")
         contract: Contract = apartment_application.contract
         contract.landlord_has_provided_keys = True
@@ -762,26 +893,36 @@ class Application(ApplicationBase):
         return apartment_application
 
     def tenant_receive_keys(
-        self, session: Session, apartment_application: ApartmentApplication
-    ):
+        self,
+        session: Session,
+        apartment_application: ApartmentApplication,
+        commit: bool = True,
+    ) -> Tuple[ApartmentApplication, List[UUID]]:
+        """
+        Complete the application and reject the other open applications for
+        its apartment. Returns the application and the ids of the rejected
+        applications, whose tenants are to be notified. Without commit the
+        caller commits, with the notifications.
+        """
         if apartment_application.contract.status != ContractStatus.SIGNED:
             raise ApplicationError("Contract is not signed")
         if not apartment_application.contract.landlord_has_provided_keys:
             raise ApplicationError("Landlord has not provided keys")
-        other_applications = (
-            session.query(ApartmentApplication)
-            .filter(
-                ApartmentApplication.apartment_id == apartment_application.apartment_id
-            )
-            .filter(ApartmentApplication.id != apartment_application.id)
-            .all()
+        rejected_application_ids = self.transition_apartment_applications(
+            session,
+            ApartmentApplicationStatus.REJECTED,
+            ApartmentApplication.apartment_id == apartment_application.apartment_id,
+            ApartmentApplication.id != apartment_application.id,
+            commit=False,
         )
-        for apartment_app in other_applications:
-            apartment_app.is_rejected = True
         contract: Contract = apartment_application.contract
         contract.tenant_has_received_keys = True
-        session.commit()
-        return apartment_application
+        self.__transition_application(
+            apartment_application, ApartmentApplicationStatus.COMPLETED
+        )
+        if commit:
+            session.commit()
+        return apartment_application, rejected_application_ids
 
     def invite_tenant_to_apply(
         self,
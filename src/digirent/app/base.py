@@ -1,4 +1,5 @@
 from digirent.core.services.file_service import FileService
+from digirent.core.services.payment_gateway import PaymentGateway
 from digirent.database.services.user import UserService
 from digirent.database.services.apartment import ApartmentService
 from digirent.database.models import (
@@ -24,6 +25,7 @@ class ApplicationBase:
         apartment_application_service: DBService[ApartmentApplication],
         booking_request_service: DBService[BookingRequest],
         file_service: FileService,
+        payment_gateway: PaymentGateway,
     ) -> None:
         self.user_service: UserService = user_service
         self.admin_service = admin_service
@@ -34,3 +36,4 @@ class ApplicationBase:
         self.booking_request_service = booking_request_service
         self.file_service = file_service
         self.apartment_application_service = apartment_application_service
+        self.payment_gateway = payment_gateway
@@ -1,6 +1,7 @@
 import dependency_injector.containers as containers
 import dependency_injector.providers as providers
 from digirent.core.services.file_service import FileService
+from digirent.core.services.payment_gateway import get_payment_gateway
 from digirent.database.models import (
     Admin,
     Amenity,
@@ -27,6 +28,7 @@ class ServiceContainer(containers.DeclarativeContainer):
     )
     booking_request_service = providers.Singleton(DBService, model_class=BookingRequest)
     file_service = providers.Singleton(FileService)
+    payment_gateway = providers.Callable(get_payment_gateway)
 
 
 class ApplicationContainer(containers.DeclarativeContainer):
@@ -41,4 +43,5 @@ class ApplicationContainer(containers.DeclarativeContainer):
         apartment_application_service=ServiceContainer.apartment_application_service,
         booking_request_service=ServiceContainer.booking_request_service,
         file_service=ServiceContainer.file_service,
+        payment_gateway=ServiceContainer.payment_gateway,
     )
@@ -25,6 +25,24 @@ ALLOWED_HOSTS: CommaSeparatedStrings = config(
 
 DATABASE_URL: str = config("DATABASE_URL", cast=str)
 
+# connection pool of the api process
+DATABASE_POOL_SIZE: int = config("DATABASE_POOL_SIZE", cast=int, default=5)
+
+DATABASE_MAX_OVERFLOW: int = config("DATABASE_MAX_OVERFLOW", cast=int, default=10)
+
+# connection pool of every celery worker process, which runs one task at a time
+WORKER_DATABASE_POOL_SIZE: int = config(
+    "WORKER_DATABASE_POOL_SIZE", cast=int, default=2
+)
+
+WORKER_DATABASE_MAX_OVERFLOW: int = config(
+    "WORKER_DATABASE_MAX_OVERFLOW", cast=int, default=2
+)
+
+DATABASE_POOL_RECYCLE_SECONDS: int = config(
+    "DATABASE_POOL_RECYCLE_SECONDS", cast=int, default=1800
+)
+
 SECRET_KEY: str = config("SECRET_KEY", cast=str)
 
 JWT_ALGORITHM: str = config("JWT_ALGORITHM", cast=str, default="HS256")
@@ -100,3 +118,200 @@ CLIENT_GOOGLE_AUTH_URL: str = config("CLIENT_GOOGLE_AUTH_URL", cast=str)
 CLIENT_FACEBOOK_AUTH_URL: str = config("CLIENT_FACEBOOK_AUTH_URL", cast=str)
 
 SALT: str = config("SALT", cast=str)
+
+CHAT_SEND_QUEUE_SIZE: int = config("CHAT_SEND_QUEUE_SIZE", cast=int, default=256)
+
+CHAT_SEND_QUEUE_HIGH_WATER_MARK: int = config(
+    "CHAT_SEND_QUEUE_HIGH_WATER_MARK", cast=int, default=128
+)
+
+CHAT_SLOW_CONSUMER_TIMEOUT_SECONDS: float = config(
+    "CHAT_SLOW_CONSUMER_TIMEOUT_SECONDS", cast=float, default=10
+)
+
+CHAT_HEARTBEAT_INTERVAL_SECONDS: float = config(
+    "CHAT_HEARTBEAT_INTERVAL_SECONDS", cast=float, default=20
+)
+
+CHAT_IDLE_TIMEOUT_SECONDS: float = config(
+    "CHAT_IDLE_TIMEOUT_SECONDS", cast=float, default=60
+)
+
+CHAT_CATCH_UP_BATCH_SIZE: int = config(
+    "CHAT_CATCH_UP_BATCH_SIZE", cast=int, default=100
+)
+
+CHAT_CATCH_UP_LIMIT: int = config("CHAT_CATCH_UP_LIMIT", cast=int, default=1000)
+
+CHAT_COALESCE_WINDOW_SECONDS: float = config(
+    "CHAT_COALESCE_WINDOW_SECONDS", cast=float, default=0.01
+)
+
+CHAT_MAX_BATCH_SIZE: int = config("CHAT_MAX_BATCH_SIZE", cast=int, default=50)
+
+REDIS_URL: str = config("REDIS_URL", cast=str, default=CELERY_BROKER_URL)
+
+INVOICE_TASK_CHUNK_SIZE: int = config("INVOICE_TASK_CHUNK_SIZE", cast=int, default=50)
+
+INVOICE_DISPATCH_BATCH_SIZE: int = config(
+    "INVOICE_DISPATCH_BATCH_SIZE", cast=int, default=1000
+)
+
+INVOICE_DISPATCH_CLAIM_TTL_SECONDS: int = config(
+    "INVOICE_DISPATCH_CLAIM_TTL_SECONDS", cast=int, default=3600
+)
+
+SUBSCRIPTION_DISPATCH_FETCH_SIZE: int = config(
+    "SUBSCRIPTION_DISPATCH_FETCH_SIZE", cast=int, default=1000
+)
+
+PAYMENT_GATEWAY: str = config(
+    "PAYMENT_GATEWAY", cast=str, default="fake" if IS_TEST else "mollie"
+)
+
+MOLLIE_API_URL: str = config(
+    "MOLLIE_API_URL", cast=str, default="https://api.mollie.com/v2"
+)
+
+PAYMENT_GATEWAY_TIMEOUT_SECONDS: float = config(
+    "PAYMENT_GATEWAY_TIMEOUT_SECONDS", cast=float, default=10
+)
+
+PAYMENT_GATEWAY_MAX_CONNECTIONS: int = config(
+    "PAYMENT_GATEWAY_MAX_CONNECTIONS", cast=int, default=20
+)
+
+PAYMENT_GATEWAY_MAX_RETRIES: int = config(
+    "PAYMENT_GATEWAY_MAX_RETRIES", cast=int, default=3
+)
+
+PAYMENT_GATEWAY_RETRY_BACKOFF_SECONDS: float = config(
+    "PAYMENT_GATEWAY_RETRY_BACKOFF_SECONDS", cast=float, default=0.25
+)
+
+PAYMENT_GATEWAY_CONCURRENCY: int = config(
+    "PAYMENT_GATEWAY_CONCURRENCY", cast=int, default=10
+)
+
+FAKE_PAYMENT_GATEWAY_LATENCY_SECONDS: float = config(
+    "FAKE_PAYMENT_GATEWAY_LATENCY_SECONDS", cast=float, default=0
+)
+
+PAYMENT_WEBHOOK_POLL_SECONDS: float = config(
+    "PAYMENT_WEBHOOK_POLL_SECONDS", cast=float, default=5
+)
+
+PAYMENT_WEBHOOK_BATCH_SIZE: int = config(
+    "PAYMENT_WEBHOOK_BATCH_SIZE", cast=int, default=100
+)
+
+PAYMENT_WEBHOOK_MAX_ATTEMPTS: int = config(
+    "PAYMENT_WEBHOOK_MAX_ATTEMPTS", cast=int, default=5
+)
+
+PAYMENT_RECONCILIATION_INTERVAL_SECONDS: float = config(
+    "PAYMENT_RECONCILIATION_INTERVAL_SECONDS", cast=float, default=3600
+)
+
+PAYMENT_RECONCILIATION_MIN_AGE_MINUTES: int = config(
+    "PAYMENT_RECONCILIATION_MIN_AGE_MINUTES", cast=int, default=60
+)
+
+PAYMENT_RECONCILIATION_BATCH_SIZE: int = config(
+    "PAYMENT_RECONCILIATION_BATCH_SIZE", cast=int, default=200
+)
+
+SIGNREQUEST_WEBHOOK_POLL_SECONDS: float = config(
+    "SIGNREQUEST_WEBHOOK_POLL_SECONDS", cast=float, default=5
+)
+
+SIGNREQUEST_WEBHOOK_BATCH_SIZE: int = config(
+    "SIGNREQUEST_WEBHOOK_BATCH_SIZE", cast=int, default=100
+)
+
+SIGNREQUEST_WEBHOOK_MAX_ATTEMPTS: int = config(
+    "SIGNREQUEST_WEBHOOK_MAX_ATTEMPTS", cast=int, default=5
+)
+
+# longest a run of the signrequest webhooks task keeps others from starting
+SIGNREQUEST_WEBHOOK_RUN_TTL_SECONDS: int = config(
+    "SIGNREQUEST_WEBHOOK_RUN_TTL_SECONDS", cast=int, default=300
+)
+
+# a run of the signrequest webhooks task starts no new application after this,
+# keep it well under SIGNREQUEST_WEBHOOK_RUN_TTL_SECONDS
+SIGNREQUEST_WEBHOOK_RUN_SECONDS: float = config(
+    "SIGNREQUEST_WEBHOOK_RUN_SECONDS", cast=float, default=120
+)
+
+SIGNREQUEST_TIMEOUT_SECONDS: float = config(
+    "SIGNREQUEST_TIMEOUT_SECONDS", cast=float, default=10
+)
+
+SIGNREQUEST_MAX_CONNECTIONS: int = config(
+    "SIGNREQUEST_MAX_CONNECTIONS", cast=int, default=10
+)
+
+# how long the admin reads of signrequest events and documents are cached
+SIGNREQUEST_CACHE_TTL_SECONDS: float = config(
+    "SIGNREQUEST_CACHE_TTL_SECONDS", cast=float, default=60
+)
+
+SIGNREQUEST_CACHE_MAX_ENTRIES: int = config(
+    "SIGNREQUEST_CACHE_MAX_ENTRIES", cast=int, default=1000
+)
+
+MAIL_USE_TLS: bool = config("MAIL_USE_TLS", cast=bool, default=False)
+
+# sendgrid, smtp, file (EMAIL_FILE_PATH), console or memory
+EMAIL_TRANSPORT: str = config(
+    "EMAIL_TRANSPORT", cast=str, default="memory" if IS_TEST else "sendgrid"
+)
+
+EMAIL_FILE_PATH: str = config("EMAIL_FILE_PATH", cast=str, default=None)
+
+EMAIL_TIMEOUT_SECONDS: float = config("EMAIL_TIMEOUT_SECONDS", cast=float, default=10)
+
+EMAIL_MAX_CONNECTIONS: int = config("EMAIL_MAX_CONNECTIONS", cast=int, default=4)
+
+# per email worker process, 0 for no limit
+EMAIL_RATE_LIMIT_PER_SECOND: float = config(
+    "EMAIL_RATE_LIMIT_PER_SECOND", cast=float, default=10
+)
+
+# recompile email templates whose file changed, for editing them in dev
+TEMPLATES_AUTORELOAD: bool = config(
+    "TEMPLATES_AUTORELOAD", cast=bool, default=APP_ENV == "dev"
+)
+
+OUTBOX_POLL_SECONDS: float = config("OUTBOX_POLL_SECONDS", cast=float, default=2)
+
+OUTBOX_BATCH_SIZE: int = config("OUTBOX_BATCH_SIZE", cast=int, default=100)
+
+OUTBOX_MAX_ATTEMPTS: int = config("OUTBOX_MAX_ATTEMPTS", cast=int, default=8)
+
+OUTBOX_RETRY_BACKOFF_SECONDS: float = config(
+    "OUTBOX_RETRY_BACKOFF_SECONDS", cast=float, default=30
+)
+
+# longest a run of the outbox task keeps others from starting
+OUTBOX_RUN_TTL_SECONDS: int = config("OUTBOX_RUN_TTL_SECONDS", cast=int, default=300)
+
+# a run of the outbox task starts no new batch after this, keep it well under
+# OUTBOX_RUN_TTL_SECONDS
+OUTBOX_RUN_SECONDS: float = config("OUTBOX_RUN_SECONDS", cast=float, default=120)
+
+# how long a batch is kept from other runs while it is performed, longer than
+# a batch takes, the effects of a run that died are retried after it
+OUTBOX_LEASE_SECONDS: float = config("OUTBOX_LEASE_SECONDS", cast=float, default=600)
+
+# how many effects of each kind an outbox run performs at once
+OUTBOX_EMAIL_CONCURRENCY: int = config("OUTBOX_EMAIL_CONCURRENCY", cast=int, default=4)
+
+OUTBOX_CONTRACT_CONCURRENCY: int = config(
+    "OUTBOX_CONTRACT_CONCURRENCY", cast=int, default=2
+)
+
+OUTBOX_PAYMENT_CONCURRENCY: int = config(
+    "OUTBOX_PAYMENT_CONCURRENCY", cast=int, default=4
+)
@@ -0,0 +1,109 @@
+"""
+Email templates. Every file in templates/ is compiled once, when the api
+starts, and emails are rendered from a single context into their name.txt
+body and name.html body when there is one. Templates use {{name}}
+placeholders, the {{{name}}} tags SendGrid fills in are left as they are.
+"""
+import html
+import os
+import re
+import threading
+from functools import lru_cache
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+from digirent.core import config
+
+TEMPLATES_PATH = Path(__file__).parents[4] / "templates"
+
+PLACEHOLDER = re.compile(r"(?<!{){{\s*(\w+)\s*}}(?!})")
+
+EMAIL_SUBJECTS = {
+    "verification": "Verify Acccount",
+    "password_reset": "Reset Digirent Password",
+    "application_rejected": "Digirent Apartment Application Notification",
+    "application_considered": "Digirent Apartment Application Notification",
+    "application_processing": "Digirent Apartment Application Notification",
+}
+
+
+class Template:
+    """
+    A template split once into its text and the placeholder names between
+    it, so rendering only joins the parts. Values are passed through escape.
+    """
+
+    def __init__(self, source: str, escape: Callable[[str], str] = str):
+        self.parts: List[str] = PLACEHOLDER.split(source)
+        self.names: List[str] = self.parts[1::2]
+        self.escape = escape
+
+    def render(self, context: dict) -> str:
+        missing = set(self.names) - set(context)
+        if missing:
+            raise KeyError(f"Missing template values {sorted(missing)}")
+        parts = self.parts.copy()
+        parts[1::2] = [self.escape(str(context[name])) for name in self.names]
+        return "".join(parts)
+
+
+class TemplateLoader:
+    """
+    The compiled templates of path, by file name. With autoreload a
+    template whose file changed is compiled again before it is rendered.
+    """
+
+    def __init__(
+        self,
+        path: Path = TEMPLATES_PATH,
+        autoreload: bool = config.TEMPLATES_AUTORELOAD,
+    ):
+        self.path = path
+        self.autoreload = autoreload
+        self._lock = threading.Lock()
+        self._templates: Dict[str, Tuple[float, Template]] = {}
+        for file in path.iterdir():
+            if file.is_file():
+                self._load(file.name)
+
+    def _load(self, name: str) -> Template:
+        file = self.path / name
+        mtime = os.path.getmtime(file)
+        escape = html.escape if file.suffix == ".html" else str
+        template = Template(file.read_text(encoding="utf-8"), escape)
+        with self._lock:
+            self._templates[name] = (mtime, template)
+        return template
+
+    def get(self, name: str) -> Optional[Template]:
+        entry = self._templates.get(name)
+        if not self.autoreload:
+            return entry[1] if entry else None
+        file = self.path / name
+        if not file.is_file():
+            return None
+        if entry and entry[0] == os.path.getmtime(file):
+            return entry[1]
+        return self._load(name)
+
+
+@lru_cache()
+def get_template_loader() -> TemplateLoader:
+    return TemplateLoader()
+
+
+def render_email(name: str, to: str, **context) -> dict:
+    """
+    The fields of the mail.Email name to to, with both bodies rendered from
+    context
+    """
+    loader = get_template_loader()
+    text = loader.get(f"{name}.txt")
+    if text is None:
+        raise KeyError(f"No email template {name}.txt")
+    html_template = loader.get(f"{name}.html")
+    return {
+        "to": to,
+        "subject": EMAIL_SUBJECTS[name],
+        "message": text.render(context),
+        "html": html_template.render(context) if html_template else None,
+    }
@@ -0,0 +1,62 @@
+"""
+A local stand-in for the Mollie payments api, backed by FakePaymentGateway,
+for running the payment workers and reconciliation end to end without a
+Mollie account:
+
+    uvicorn digirent.core.services.fake_mollie:app --port 8001
+    MOLLIE_API_URL=http://localhost:8001/v2 PAYMENT_GATEWAY=mollie ...
+
+PATCH /v2/payments/{id} with {"status": "paid"} moves a payment along the
+way a customer completing the checkout would.
+"""
+from typing import Optional
+from fastapi import FastAPI, Header
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from digirent.core.services.payment_gateway import (
+    FakePaymentGateway,
+    PaymentGatewayError,
+)
+
+
+class PaymentStatusUpdate(BaseModel):
+    status: str
+
+
+def error_response(err: PaymentGatewayError) -> JSONResponse:
+    return JSONResponse(
+        {"status": err.status_code, "detail": str(err)}, status_code=err.status_code
+    )
+
+
+def create_fake_mollie_app(latency: float = 0, status: str = "open") -> FastAPI:
+    gateway = FakePaymentGateway(latency=latency, status=status)
+    fake_mollie = FastAPI(title="Fake Mollie")
+    fake_mollie.state.gateway = gateway
+
+    @fake_mollie.post("/v2/payments", status_code=201)
+    async def create_payment(data: dict, idempotency_key: Optional[str] = Header(None)):
+        payment = await gateway.acreate_payment(data, idempotency_key)
+        return gateway.payments[payment.id]
+
+    @fake_mollie.get("/v2/payments/{payment_id}")
+    async def get_payment(payment_id: str):
+        try:
+            payment = await gateway.aget_payment(payment_id)
+        except PaymentGatewayError as err:
+            return error_response(err)
+        return gateway.payments[payment.id]
+
+    @fake_mollie.patch("/v2/payments/{payment_id}")
+    async def update_payment_status(payment_id: str, data: PaymentStatusUpdate):
+        if payment_id not in gateway.payments:
+            return error_response(
+                PaymentGatewayError(f"No payment exists with token {payment_id}", 404)
+            )
+        gateway.set_status(payment_id, data.status)
+        return gateway.payments[payment_id]
+
+    return fake_mollie
+
+
+app = create_fake_mollie_app()
@@ -0,0 +1,340 @@
+"""
+Outbound email. Emails are added to the outbox and sent by the outbox worker
+with deliver, through the transport selected by EMAIL_TRANSPORT, at most
+EMAIL_RATE_LIMIT_PER_SECOND a second per worker process.
+"""
+import json
+from abc import ABC, abstractmethod
+import smtplib
+import sys
+import threading
+import time
+from email.message import EmailMessage
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional, Tuple
+import httpx
+from pydantic import BaseModel
+from sendgrid.helpers.mail import Mail
+from digirent.core import config
+
+EMAIL_FROM = "noreply@digirent.com"
+
+
+class EmailTransportError(Exception):
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class Email(BaseModel):
+    to: str
+    subject: str
+    message: str
+    html: Optional[str]
+
+
+def batch_by_recipient(emails: List[Email]) -> List[Tuple[Email, List[int]]]:
+    """
+    Merge the plain text emails to the same recipient with the same subject
+    into one, so a recipient of many notifications at once gets a single
+    email. Emails with html are left as they are. Returns every email to send
+    with the indexes of the emails it was merged from.
+    """
+    batched: List[Tuple[Email, List[int]]] = []
+    merged: Dict[tuple, Tuple[Email, List[int]]] = {}
+    for index, email in enumerate(emails):
+        if email.html:
+            batched.append((email, [index]))
+            continue
+        key = (email.to.lower(), email.subject)
+        if key in merged:
+            merged[key][0].message += f"\n\n{email.message}"
+            merged[key][1].append(index)
+            continue
+        merged[key] = (email.copy(), [index])
+        batched.append(merged[key])
+    return batched
+
+
+class RateLimiter:
+    """
+    Token bucket letting rate calls a second through on average, in bursts
+    of up to burst calls. A rate of 0 lets every call through.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        burst: int = 1,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self.sleep = sleep
+        self._tokens = float(burst)
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if not self.rate:
+            return
+        with self._lock:
+            now = self.clock()
+            self._tokens = min(
+                self.burst, self._tokens + (now - self._updated) * self.rate
+            )
+            self._updated = now
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0
+        if wait:
+            self.sleep(wait)
+
+
+class EmailTransport(ABC):
+    name = "transport"
+
+    @abstractmethod
+    def send(self, email: Email):
+        """Send email or raise EmailTransportError"""
+
+    def close(self):
+        pass
+
+
+class SendgridTransport(EmailTransport):
+    """SendGrid's mail send api over pooled keep-alive connections"""
+
+    name = "sendgrid"
+
+    def __init__(
+        self,
+        api_key: str = config.SENDGRID_API_KEY,
+        base_url: str = "https://api.sendgrid.com/v3/",
+        timeout: float = config.EMAIL_TIMEOUT_SECONDS,
+        max_connections: int = config.EMAIL_MAX_CONNECTIONS,
+    ):
+        self._client_options = {
+            "base_url": base_url,
+            "headers": {"Authorization": f"Bearer {api_key}"},
+            "timeout": httpx.Timeout(timeout),
+            "limits": httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+            ),
+        }
+        self._client: Optional[httpx.Client] = None
+
+    @property
+    def client(self) -> httpx.Client:
+        if self._client is None:
+            self._client = httpx.Client(**self._client_options)
+        return self._client
+
+    def send(self, email: Email):
+        mail = Mail(
+            from_email=EMAIL_FROM,
+            to_emails=email.to,
+            subject=email.subject,
+            plain_text_content=email.message,
+            html_content=email.html,
+        )
+        try:
+            response = self.client.post("mail/send", json=mail.get())
+        except httpx.HTTPError as e:
+            raise EmailTransportError(f"SendGrid request failed: {e}")
+        if response.status_code >= 400:
+            raise EmailTransportError(
+                f"SendGrid responded {response.status_code}: {response.text[:200]}",
+                response.status_code,
+            )
+
+    def close(self):
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+
+
+class SmtpTransport(EmailTransport):
+    """
+    SMTP over at most max_connections persistent connections, opened when
+    first needed and kept for the following emails. An email sent on a
+    connection the server has since closed is sent again on a new one.
+    """
+
+    name = "smtp"
+
+    def __init__(
+        self,
+        host: str = config.MAIL_SERVER,
+        port: int = config.MAIL_PORT,
+        username: Optional[str] = config.MAIL_USERNAME,
+        password: Optional[str] = config.MAIL_PASSWORD,
+        use_tls: bool = config.MAIL_USE_TLS,
+        timeout: float = config.EMAIL_TIMEOUT_SECONDS,
+        max_connections: int = config.EMAIL_MAX_CONNECTIONS,
+    ):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(max_connections)
+        self._idle: List[smtplib.SMTP] = []
+        self._lock = threading.Lock()
+
+    def _connect(self) -> smtplib.SMTP:
+        connection = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        if self.use_tls:
+            connection.starttls()
+        if self.username:
+            connection.login(self.username, self.password)
+        return connection
+
+    @staticmethod
+    def _message(email: Email) -> EmailMessage:
+        message = EmailMessage()
+        message["From"] = EMAIL_FROM
+        message["To"] = email.to
+        message["Subject"] = email.subject
+        message.set_content(email.message)
+        if email.html:
+            message.add_alternative(email.html, subtype="html")
+        return message
+
+    @staticmethod
+    def _discard(connection: smtplib.SMTP):
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def send(self, email: Email):
+        message = self._message(email)
+        with self._slots:
+            with self._lock:
+                connection = self._idle.pop() if self._idle else None
+            try:
+                if connection is not None:
+                    try:
+                        connection.send_message(message)
+                    except smtplib.SMTPServerDisconnected:
+                        self._discard(connection)
+                        connection = None
+                if connection is None:
+                    connection = self._connect()
+                    connection.send_message(message)
+            except smtplib.SMTPResponseException as e:
+                # the server refused the email, the connection is still good
+                if connection is not None:
+                    with self._lock:
+                        self._idle.append(connection)
+                raise EmailTransportError(f"SMTP responded {e.smtp_code}", e.smtp_code)
+            except (smtplib.SMTPException, OSError) as e:
+                if connection is not None:
+                    self._discard(connection)
+                raise EmailTransportError(f"SMTP failed: {e}")
+            with self._lock:
+                self._idle.append(connection)
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for connection in idle:
+            try:
+                connection.quit()
+            except Exception:
+                self._discard(connection)
+
+
+class FileTransport(EmailTransport):
+    """Appends emails as JSON lines to path, or prints them without one"""
+
+    name = "file"
+
+    def __init__(self, path: Optional[str] = config.EMAIL_FILE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def send(self, email: Email):
+        line = json.dumps(email.dict())
+        with self._lock:
+            if not self.path:
+                print(line, file=sys.stdout, flush=True)
+                return
+            try:
+                with open(self.path, "a") as file:
+                    file.write(line + "\n")
+            except OSError as e:
+                raise EmailTransportError(f"Writing {self.path} failed: {e}")
+
+
+class MemoryTransport(EmailTransport):
+    """Keeps the emails it is given in outbox, for tests"""
+
+    name = "memory"
+
+    def __init__(self):
+        self.outbox: List[Email] = []
+
+    def send(self, email: Email):
+        self.outbox.append(email)
+
+
+# per transport: sent, failed, total and slowest send seconds of this process
+delivery_metrics: Dict[str, dict] = {}
+
+
+def record_delivery(transport: str, seconds: float, failed: bool):
+    metrics = delivery_metrics.setdefault(
+        transport, {"sent": 0, "failed": 0, "seconds": 0.0, "max_seconds": 0.0}
+    )
+    metrics["failed" if failed else "sent"] += 1
+    metrics["seconds"] += seconds
+    metrics["max_seconds"] = max(metrics["max_seconds"], seconds)
+
+
+@lru_cache()
+def get_email_transport() -> EmailTransport:
+    """The process wide email transport selected by EMAIL_TRANSPORT"""
+    transports = {
+        "sendgrid": SendgridTransport,
+        "smtp": SmtpTransport,
+        "file": FileTransport,
+        "console": lambda: FileTransport(path=None),
+        "memory": MemoryTransport,
+    }
+    return transports[config.EMAIL_TRANSPORT]()
+
+
+@lru_cache()
+def get_rate_limiter() -> RateLimiter:
+    return RateLimiter(config.EMAIL_RATE_LIMIT_PER_SECOND)
+
+
+def deliver(
+    emails: List[Email],
+    transport: EmailTransport = None,
+    rate_limiter: RateLimiter = None,
+) -> List[Email]:
+    """
+    Send emails one after another within the rate limit, timing every send
+    into delivery_metrics. Returns the emails that failed to send.
+    """
+    transport = transport or get_email_transport()
+    rate_limiter = rate_limiter or get_rate_limiter()
+    failed = []
+    for email in emails:
+        rate_limiter.acquire()
+        started = time.perf_counter()
+        try:
+            transport.send(email)
+            sent = True
+        except EmailTransportError as e:
+            print(f"Sending email to {email.to} with {transport.name} failed: {e}")
+            failed.append(email)
+            sent = False
+        record_delivery(transport.name, time.perf_counter() - started, not sent)
+    return failed
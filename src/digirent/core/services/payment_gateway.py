@@ -0,0 +1,329 @@
+import asyncio
+import copy
+from abc import ABC, abstractmethod
+import random
+import threading
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Awaitable, Callable, Dict, List, Optional, Union
+from uuid import uuid4
+import httpx
+from pydantic import BaseModel
+from digirent.core import config
+
+
+class PaymentGatewayError(Exception):
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class Payment(BaseModel):
+    id: str
+    status: str
+    metadata: Optional[dict]
+    checkout_url: Optional[str]
+
+    @classmethod
+    def from_response(cls, data: dict) -> "Payment":
+        checkout = (data.get("_links") or {}).get("checkout") or {}
+        return cls(
+            id=data["id"],
+            status=data["status"],
+            metadata=data.get("metadata"),
+            checkout_url=checkout.get("href"),
+        )
+
+    def is_open(self) -> bool:
+        return self.status == "open"
+
+    def is_pending(self) -> bool:
+        return self.status == "pending"
+
+    def is_paid(self) -> bool:
+        return self.status == "paid"
+
+
+class PaymentGateway(ABC):
+    """
+    Creates and fetches payments. Payment data follows the Mollie payments
+    api. Every method has a blocking variant for request handlers running in
+    the threadpool and workers, and an async variant for the event loop.
+    """
+
+    @abstractmethod
+    def create_payment(self, data: dict, idempotency_key: str = None) -> Payment:
+        pass
+
+    @abstractmethod
+    def get_payment(self, payment_id: str) -> Payment:
+        pass
+
+    @abstractmethod
+    async def acreate_payment(self, data: dict, idempotency_key: str = None) -> Payment:
+        pass
+
+    @abstractmethod
+    async def aget_payment(self, payment_id: str) -> Payment:
+        pass
+
+    async def aclose(self):
+        pass
+
+    async def aget_payments(
+        self,
+        payment_ids: List[str],
+        concurrency: int = config.PAYMENT_GATEWAY_CONCURRENCY,
+    ) -> List[Union[Payment, PaymentGatewayError]]:
+        """
+        Fetch payments with at most concurrency requests in flight.
+        Results are in the order of payment_ids, failures are returned as
+        PaymentGatewayError instead of being raised.
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def get(payment_id: str):
+            async with semaphore:
+                try:
+                    return await self.aget_payment(payment_id)
+                except PaymentGatewayError as err:
+                    return err
+
+        return await asyncio.gather(*[get(payment_id) for payment_id in payment_ids])
+
+    def _run_gateway(self) -> "PaymentGateway":
+        """The gateway a blocking _run uses, closed when the run ends"""
+        return self
+
+    def _run(self, call: Callable[["PaymentGateway"], Awaitable]):
+        """
+        Run call(gateway) to completion from blocking code such as a worker,
+        on a private loop so the caller's current event loop is left alone
+        """
+        gateway = self._run_gateway()
+
+        async def run():
+            try:
+                return await call(gateway)
+            finally:
+                await gateway.aclose()
+
+        loop = asyncio.new_event_loop()
+        try:
+            return loop.run_until_complete(run())
+        finally:
+            loop.close()
+
+    def get_payments(
+        self,
+        payment_ids: List[str],
+        concurrency: int = config.PAYMENT_GATEWAY_CONCURRENCY,
+    ) -> List[Union[Payment, PaymentGatewayError]]:
+        """Blocking aget_payments for worker batches"""
+        return self._run(
+            lambda gateway: gateway.aget_payments(payment_ids, concurrency)
+        )
+
+
+class MolliePaymentGateway(PaymentGateway):
+    """
+    Mollie payments over pooled keep-alive connections, with timeouts and
+    retries with full jitter on transport errors, 429 and 5xx responses.
+    Payments are created with an Idempotency-Key so retries never create a
+    second payment.
+    """
+
+    retry_status_codes = {429, 500, 502, 503, 504}
+
+    def __init__(
+        self,
+        api_key: str = config.MOLLIE_API_KEY,
+        base_url: str = config.MOLLIE_API_URL,
+        timeout: float = config.PAYMENT_GATEWAY_TIMEOUT_SECONDS,
+        max_connections: int = config.PAYMENT_GATEWAY_MAX_CONNECTIONS,
+        max_retries: int = config.PAYMENT_GATEWAY_MAX_RETRIES,
+        retry_backoff: float = config.PAYMENT_GATEWAY_RETRY_BACKOFF_SECONDS,
+    ):
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self._client_options = {
+            # trailing slash so relative paths are appended to the version path
+            "base_url": base_url.rstrip("/") + "/",
+            "headers": {"Authorization": f"Bearer {api_key}"},
+            "timeout": httpx.Timeout(timeout),
+            "limits": httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+            ),
+        }
+        self._client: Optional[httpx.Client] = None
+        self._async_client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def client(self) -> httpx.Client:
+        if self._client is None:
+            self._client = httpx.Client(**self._client_options)
+        return self._client
+
+    @property
+    def async_client(self) -> httpx.AsyncClient:
+        if self._async_client is None:
+            self._async_client = httpx.AsyncClient(**self._client_options)
+        return self._async_client
+
+    def _backoff(self, attempt: int) -> float:
+        return random.uniform(0, self.retry_backoff * 2**attempt)
+
+    def _should_retry(self, attempt: int, response: httpx.Response = None) -> bool:
+        if attempt >= self.max_retries:
+            return False
+        return response is None or response.status_code in self.retry_status_codes
+
+    @staticmethod
+    def _parse(response: httpx.Response) -> Payment:
+        if response.is_error:
+            try:
+                message = response.json().get("detail") or response.reason_phrase
+            except ValueError:
+                message = response.reason_phrase
+            raise PaymentGatewayError(message, response.status_code)
+        return Payment.from_response(response.json())
+
+    def _request(self, method: str, url: str, **kwargs) -> Payment:
+        attempt = 0
+        while True:
+            try:
+                response = self.client.request(method, url, **kwargs)
+            except httpx.TransportError as err:
+                if not self._should_retry(attempt):
+                    raise PaymentGatewayError(str(err)) from err
+            else:
+                if not self._should_retry(attempt, response):
+                    return self._parse(response)
+            time.sleep(self._backoff(attempt))
+            attempt += 1
+
+    async def _arequest(self, method: str, url: str, **kwargs) -> Payment:
+        attempt = 0
+        while True:
+            try:
+                response = await self.async_client.request(method, url, **kwargs)
+            except httpx.TransportError as err:
+                if not self._should_retry(attempt):
+                    raise PaymentGatewayError(str(err)) from err
+            else:
+                if not self._should_retry(attempt, response):
+                    return self._parse(response)
+            await asyncio.sleep(self._backoff(attempt))
+            attempt += 1
+
+    def create_payment(self, data: dict, idempotency_key: str = None) -> Payment:
+        headers = {"Idempotency-Key": idempotency_key or str(uuid4())}
+        return self._request("POST", "payments", json=data, headers=headers)
+
+    def get_payment(self, payment_id: str) -> Payment:
+        return self._request("GET", f"payments/{payment_id}")
+
+    async def acreate_payment(self, data: dict, idempotency_key: str = None) -> Payment:
+        headers = {"Idempotency-Key": idempotency_key or str(uuid4())}
+        return await self._arequest("POST", "payments", json=data, headers=headers)
+
+    async def aget_payment(self, payment_id: str) -> Payment:
+        return await self._arequest("GET", f"payments/{payment_id}")
+
+    async def aclose(self):
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
+
+    def _run_gateway(self) -> "MolliePaymentGateway":
+        # clients of its own, the shared async client is bound to the event
+        # loop of the api process and the run's loop is closed after it
+        gateway = copy.copy(self)
+        gateway._client = None
+        gateway._async_client = None
+        return gateway
+
+
+class FakePaymentGateway(PaymentGateway):
+    """
+    In-memory gateway for tests, local development and benchmarks.
+    Every call waits latency seconds, payments are created with status and
+    can be moved along with set_status. calls and max_in_flight count the
+    calls made and the most that were in flight at once.
+    """
+
+    def __init__(self, latency: float = 0, status: str = "open"):
+        self.latency = latency
+        self.status = status
+        self.payments: Dict[str, dict] = {}
+        self._idempotency_keys: Dict[str, str] = {}
+        self.calls = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _track(self):
+        with self._lock:
+            self.calls += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+    def _create(self, data: dict, idempotency_key: Optional[str]) -> Payment:
+        if idempotency_key in self._idempotency_keys:
+            return self._get(self._idempotency_keys[idempotency_key])
+        payment_id = f"tr_{uuid4().hex[:10]}"
+        self.payments[payment_id] = {
+            **data,
+            "id": payment_id,
+            "status": self.status,
+            "_links": {
+                "checkout": {"href": f"https://fake.payments/checkout/{payment_id}"}
+            },
+        }
+        if idempotency_key:
+            self._idempotency_keys[idempotency_key] = payment_id
+        return self._get(payment_id)
+
+    def _get(self, payment_id: str) -> Payment:
+        if payment_id not in self.payments:
+            raise PaymentGatewayError(f"No payment exists with token {payment_id}", 404)
+        return Payment.from_response(self.payments[payment_id])
+
+    def set_status(self, payment_id: str, status: str):
+        self.payments[payment_id]["status"] = status
+
+    def create_payment(self, data: dict, idempotency_key: str = None) -> Payment:
+        with self._track():
+            time.sleep(self.latency)
+            return self._create(data, idempotency_key)
+
+    def get_payment(self, payment_id: str) -> Payment:
+        with self._track():
+            time.sleep(self.latency)
+            return self._get(payment_id)
+
+    async def acreate_payment(self, data: dict, idempotency_key: str = None) -> Payment:
+        with self._track():
+            await asyncio.sleep(self.latency)
+            return self._create(data, idempotency_key)
+
+    async def aget_payment(self, payment_id: str) -> Payment:
+        with self._track():
+            await asyncio.sleep(self.latency)
+            return self._get(payment_id)
+
+
+@lru_cache()
+def get_payment_gateway() -> PaymentGateway:
+    """The process wide payment gateway selected by PAYMENT_GATEWAY"""
+    if config.PAYMENT_GATEWAY == "fake":
+        return FakePaymentGateway(latency=config.FAKE_PAYMENT_GATEWAY_LATENCY_SECONDS)
+    return MolliePaymentGateway()
@@ -1,14 +1,96 @@
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from functools import lru_cache
+from typing import Any, Callable, Dict, Hashable, Tuple, Union
 import signrequest_client
 from uuid import UUID
+from digirent.core import config
 from digirent.core.config import SIGNREQUEST_API_KEY, SIGNREQUEST_TEMPLATE_URL
 
 
 default_configuration = signrequest_client.Configuration()
 default_configuration.api_key["Authorization"] = SIGNREQUEST_API_KEY
 default_configuration.api_key_prefix["Authorization"] = "Token"
+default_configuration.connection_pool_maxsize = config.SIGNREQUEST_MAX_CONNECTIONS
 signrequest_client.Configuration.set_default(default_configuration)
 
-quick_create_api = signrequest_client.SignrequestQuickCreateApi()
+
+@lru_cache()
+def get_api_client() -> signrequest_client.ApiClient:
+    """The api client of every signrequest call, which pools its connections"""
+    return signrequest_client.ApiClient(default_configuration)
+
+
+class ReadCache:
+    """
+    Keeps the results of reads for ttl seconds, at most max_entries of them.
+    Keys are tuples whose second item is the document or external id the
+    read is about, which invalidate drops them by. Concurrent misses of a key
+    wait for the one read in flight instead of each reading, failures are
+    raised to all of them and not cached.
+    """
+
+    def __init__(
+        self,
+        ttl: float = config.SIGNREQUEST_CACHE_TTL_SECONDS,
+        max_entries: int = config.SIGNREQUEST_CACHE_MAX_ENTRIES,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple, Tuple[float, Any]]" = OrderedDict()
+        self._in_flight: Dict[Tuple, Future] = {}
+        # bumped by invalidate, reads that started before are not cached
+        self._generation = 0
+
+    def get(self, key: Tuple[Hashable, ...], read: Callable[[], Any]):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > self.clock():
+                return entry[1]
+            future = self._in_flight.get(key)
+            reading = future is None
+            if reading:
+                future = self._in_flight[key] = Future()
+                generation = self._generation
+        if not reading:
+            return future.result()
+        try:
+            value = read()
+        except Exception as e:
+            with self._lock:
+                del self._in_flight[key]
+            future.set_exception(e)
+            raise
+        with self._lock:
+            del self._in_flight[key]
+            if generation == self._generation:
+                self._entries[key] = (self.clock() + self.ttl, value)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        future.set_result(value)
+        return value
+
+    def invalidate(self, *ids: Union[str, UUID]):
+        """Drop the reads about any of ids"""
+        ids = {str(entity_id) for entity_id in ids}
+        with self._lock:
+            self._generation += 1
+            for key in [key for key in self._entries if key[1] in ids]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+
+read_cache = ReadCache()
 
 
 def send_contract_sign_request(
@@ -32,45 +114,95 @@ def send_contract_sign_request(
         subject=email_subject,
         message=email_message,
     )
-    return quick_create_api.signrequest_quick_create_create(data)
+    quick_create_api = signrequest_client.SignrequestQuickCreateApi(get_api_client())
+    return quick_create_api.signrequest_quick_create_create(
+        data, _request_timeout=config.SIGNREQUEST_TIMEOUT_SECONDS
+    )
 
 
-def get_list_of_events(document_external_id: UUID, page: int = 1, page_size: int = 20):
-    api_instance = signrequest_client.EventsApi()
-    return api_instance.events_list(
-        # document__uuid='document__uuid_example',
-        document__external_id=str(document_external_id),
-        # document__signrequest__who='document__signrequest__who_example',
-        # document__signrequest__from_email='document__signrequest__from_email_example',
-        # document__status='document__status_example',
-        # document__user__email='document__user__email_example',
-        # document__user__first_name='document__user__first_name_example',
-        # document__user__last_name='document__user__last_name_example',
-        # delivered='delivered_example',
-        # delivered_on='delivered_on_example',
-        # timestamp='timestamp_example',
-        # status='status_example',
-        # event_type='event_type_example',
-        page=page,
-        limit=page_size,
+# the statuses of documents that are no longer out for signing: cancelled,
+# declined, expired and failed to convert or send
+CLOSED_DOCUMENT_STATUSES = {"ca", "de", "xp", "ec", "es"}
+
+
+def has_open_contract_document(document_external_id: UUID) -> bool:
+    """Whether a document for the external id is out for signing"""
+    documents = get_list_of_documents(document_external_id, page_size=100, cached=False)
+    return any(
+        document.status not in CLOSED_DOCUMENT_STATUSES
+        for document in documents.results or []
     )
 
 
+def get_list_of_events(document_external_id: UUID, page: int = 1, page_size: int = 20):
+    def read():
+        api_instance = signrequest_client.EventsApi(get_api_client())
+        return api_instance.events_list(
+            # document__uuid='document__uuid_example',
+            document__external_id=str(document_external_id),
+            # document__signrequest__who='document__signrequest__who_example',
+            # document__signrequest__from_email='document__signrequest__from_email_example',
+            # document__status='document__status_example',
+            # document__user__email='document__user__email_example',
+            # document__user__first_name='document__user__first_name_example',
+            # document__user__last_name='document__user__last_name_example',
+            # delivered='delivered_example',
+            # delivered_on='delivered_on_example',
+            # timestamp='timestamp_example',
+            # status='status_example',
+            # event_type='event_type_example',
+            page=page,
+            limit=page_size,
+            _request_timeout=config.SIGNREQUEST_TIMEOUT_SECONDS,
+        )
+
+    return read_cache.get(("events", str(document_external_id), page, page_size), read)
+
+
 def get_event(event_id: str):
-    api_instance = signrequest_client.EventsApi()
-    return api_instance.events_read(event_id)
+    def read():
+        api_instance = signrequest_client.EventsApi(get_api_client())
+        return api_instance.events_read(
+            event_id, _request_timeout=config.SIGNREQUEST_TIMEOUT_SECONDS
+        )
+
+    return read_cache.get(("event", event_id), read)
 
 
 def get_list_of_documents(
-    document_external_id: UUID, page: int = 1, page_size: int = 20
+    document_external_id: UUID,
+    page: int = 1,
+    page_size: int = 20,
+    cached: bool = True,
 ):
-    api_instance = signrequest_client.EventsApi()
-    api_instance = signrequest_client.DocumentsApi()
-    return api_instance.documents_list(
-        page=page, limit=page_size, external_id=str(document_external_id)
+    def read():
+        api_instance = signrequest_client.DocumentsApi(get_api_client())
+        return api_instance.documents_list(
+            page=page,
+            limit=page_size,
+            external_id=str(document_external_id),
+            _request_timeout=config.SIGNREQUEST_TIMEOUT_SECONDS,
+        )
+
+    if not cached:
+        return read()
+    return read_cache.get(
+        ("documents", str(document_external_id), page, page_size), read
     )
 
 
-def get_document(document_id: str):
-    api_instance = signrequest_client.DocumentsApi()
-    return api_instance.documents_read(document_id)
+def get_document(document_id: str, cached: bool = True):
+    def read():
+        api_instance = signrequest_client.DocumentsApi(get_api_client())
+        return api_instance.documents_read(
+            document_id, _request_timeout=config.SIGNREQUEST_TIMEOUT_SECONDS
+        )
+
+    if not cached:
+        return read()
+    return read_cache.get(("document", document_id), read)
+
+
+def invalidate_signrequest_reads(document_external_id: UUID, document_id: UUID):
+    """Drop the cached reads of a document that has a new event"""
+    read_cache.invalidate(document_external_id, document_id)
@@ -1,10 +1,18 @@
+import os
 from functools import wraps
 from contextlib import contextmanager
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, exc
+from sqlalchemy.engine import Engine
 from sqlalchemy.event import listen
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, scoped_session
-from digirent.core.config import DATABASE_URL, SQLALCHEMY_LOG
+from digirent.core.config import (
+    DATABASE_MAX_OVERFLOW,
+    DATABASE_POOL_RECYCLE_SECONDS,
+    DATABASE_POOL_SIZE,
+    DATABASE_URL,
+    SQLALCHEMY_LOG,
+)
 
 
 def load_spatialite(dbapi_conn, connection_record):
@@ -14,18 +22,88 @@ def load_spatialite(dbapi_conn, connection_record):
     dbapi_conn.execute("SELECT InitSpatialMetaData();")
 
 
-if "sqlite" in DATABASE_URL:
-    engine = create_engine(
-        DATABASE_URL, connect_args={"check_same_thread": False}, echo=SQLALCHEMY_LOG
-    )
-    listen(engine, "connect", load_spatialite)
-else:
-    engine = create_engine(DATABASE_URL, echo=SQLALCHEMY_LOG)
+def add_pid_guard(engine: Engine):
+    """
+    Never hand out a pooled connection opened by another process.
+    A forked process inherits the pool of its parent, whose connections share
+    their socket with the parent: they are dropped without being closed, so
+    the parent's sessions are left alone, and the pool opens a new one.
+    """
+
+    def connect(dbapi_conn, connection_record):
+        connection_record.info["pid"] = os.getpid()
+
+    def checkout(dbapi_conn, connection_record, connection_proxy):
+        pid = os.getpid()
+        if connection_record.info["pid"] != pid:
+            connection_record.connection = connection_proxy.connection = None
+            raise exc.DisconnectionError(
+                f"Connection record belongs to pid {connection_record.info['pid']},"
+                f" attempting to check out in pid {pid}"
+            )
+
+    listen(engine, "connect", connect)
+    listen(engine, "checkout", checkout)
+
+
+def create_database_engine(
+    pool_size: int = DATABASE_POOL_SIZE, max_overflow: int = DATABASE_MAX_OVERFLOW
+) -> Engine:
+    if "sqlite" in DATABASE_URL:
+        engine = create_engine(
+            DATABASE_URL,
+            connect_args={"check_same_thread": False},
+            echo=SQLALCHEMY_LOG,
+        )
+        listen(engine, "connect", load_spatialite)
+    else:
+        engine = create_engine(
+            DATABASE_URL,
+            echo=SQLALCHEMY_LOG,
+            pool_size=pool_size,
+            max_overflow=max_overflow,
+            pool_recycle=DATABASE_POOL_RECYCLE_SECONDS,
+            pool_pre_ping=True,
+        )
+    add_pid_guard(engine)
+    return engine
+
+
+engine = create_database_engine()
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# engines replaced by configure_engine, kept so their inherited connections
+# are never garbage collected, which would close them for the parent too
+__replaced_engines = []
+
+
+def configure_engine(pool_size: int, max_overflow: int) -> Engine:
+    """
+    Replace the engine with a new one with its own pool of the given size.
+    Called in every worker process right after it is forked, so no socket is
+    shared with the parent or a sibling.
+    """
+    global engine
+    __replaced_engines.append(engine)
+    engine = create_database_engine(pool_size, max_overflow)
+    SessionLocal.configure(bind=engine)
+    return engine
+
+
 Base = declarative_base()
 
+
+def pool_status() -> dict:
+    """Usage of the engine's connection pool"""
+    pool = engine.pool
+    return {
+        "size": pool.size() if hasattr(pool, "size") else None,
+        "checked_out": pool.checkedout() if hasattr(pool, "checkedout") else None,
+        "overflow": pool.overflow() if hasattr(pool, "overflow") else None,
+    }
+
+
 __session = scoped_session(SessionLocal)
 
 
@@ -0,0 +1,175 @@
+"""
+Maintains BillingState, the billing summary of every invoice owner: the
+apartment application for rent invoices, the user for subscription invoices.
+Invoices are recorded when they are created and change status through
+apply_invoice_statuses, both inside the caller's transaction, so the summary
+never disagrees with the invoices it was built from.
+"""
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from uuid import UUID
+from sqlalchemy import DateTime, Numeric, bindparam, cast, func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm.session import Session
+from .enums import InvoiceStatus
+from .models import BillingState, Invoice
+
+
+def billing_owner(
+    user_id: Optional[UUID], apartment_application_id: Optional[UUID]
+) -> Tuple[str, UUID]:
+    """The BillingState column and id owning an invoice"""
+    if apartment_application_id:
+        return "apartment_application_id", apartment_application_id
+    return "user_id", user_id
+
+
+def money(amount):
+    """Round sums of float amounts so repeated updates do not drift"""
+    return func.round(cast(amount, Numeric), 2)
+
+
+def record_invoice(session: Session, invoice: Invoice):
+    """Make a flushed new invoice the latest of its owner's billing state"""
+    key, owner_id = billing_owner(invoice.user_id, invoice.apartment_application_id)
+    status = invoice.status or InvoiceStatus.PENDING
+    unpaid = invoice.amount if status != InvoiceStatus.PAID else 0
+    in_arrears = invoice.amount if status == InvoiceStatus.FAILED else 0
+    query = session.query(BillingState).filter(getattr(BillingState, key) == owner_id)
+    values = {
+        BillingState.latest_invoice_id: invoice.id,
+        BillingState.latest_invoice_status: status,
+        BillingState.next_due_date: invoice.next_date,
+        BillingState.amount_outstanding: money(
+            BillingState.amount_outstanding + unpaid
+        ),
+        BillingState.amount_in_arrears: money(
+            BillingState.amount_in_arrears + in_arrears
+        ),
+    }
+    if query.update(values, synchronize_session=False):
+        return
+    try:
+        with session.begin_nested():
+            session.add(
+                BillingState(
+                    **{key: owner_id},
+                    latest_invoice_id=invoice.id,
+                    latest_invoice_status=status,
+                    next_due_date=invoice.next_date,
+                    amount_outstanding=unpaid,
+                    amount_in_arrears=in_arrears,
+                )
+            )
+    except IntegrityError:
+        # created concurrently by another invoice of the same owner
+        query.update(values, synchronize_session=False)
+
+
+def can_transition(current: InvoiceStatus, status: InvoiceStatus) -> bool:
+    """Invoices are paid from any status and fail only while pending"""
+    if status == InvoiceStatus.PAID:
+        return current != InvoiceStatus.PAID
+    if status == InvoiceStatus.FAILED:
+        return current == InvoiceStatus.PENDING
+    return False
+
+
+def record_invoice_transitions(
+    session: Session, changes: List[Tuple[object, InvoiceStatus]]
+):
+    """
+    Apply (invoice row, new status) changes to the billing states, one
+    statement per kind of owner. The rows carry the status before the change.
+    """
+    now = datetime.utcnow()
+    deltas: Dict[Tuple[str, UUID], dict] = {}
+    for invoice, status in changes:
+        owner = billing_owner(invoice.user_id, invoice.apartment_application_id)
+        delta = deltas.setdefault(
+            owner,
+            {"owner_id": owner[1], "unpaid": 0, "in_arrears": 0, "paid_at": None},
+        )
+        if status == InvoiceStatus.PAID:
+            delta["unpaid"] -= invoice.amount
+            delta["paid_at"] = now
+            if invoice.status == InvoiceStatus.FAILED:
+                delta["in_arrears"] -= invoice.amount
+        elif status == InvoiceStatus.FAILED:
+            delta["in_arrears"] += invoice.amount
+
+    table = BillingState.__table__
+    for key in ["user_id", "apartment_application_id"]:
+        params = [delta for (owner_key, _), delta in deltas.items() if owner_key == key]
+        if not params:
+            continue
+        session.execute(
+            table.update()
+            .where(table.c[key] == bindparam("owner_id"))
+            .values(
+                amount_outstanding=money(
+                    table.c.amount_outstanding + bindparam("unpaid")
+                ),
+                amount_in_arrears=money(
+                    table.c.amount_in_arrears + bindparam("in_arrears")
+                ),
+                last_paid_at=func.coalesce(
+                    bindparam("paid_at", type_=DateTime), table.c.last_paid_at
+                ),
+            ),
+            params,
+        )
+    session.execute(
+        table.update()
+        .where(table.c.latest_invoice_id == bindparam("invoice_id"))
+        .values(
+            latest_invoice_status=bindparam(
+                "status", type_=table.c.latest_invoice_status.type
+            )
+        ),
+        [{"invoice_id": invoice.id, "status": status} for invoice, status in changes],
+    )
+
+
+def apply_invoice_statuses(
+    session: Session, statuses: Dict[UUID, InvoiceStatus]
+) -> Dict[str, int]:
+    """
+    Move invoices to the given statuses where the transition is allowed,
+    one UPDATE per status, and update their billing states. The invoices are
+    locked first so concurrent runs never count a change twice.
+    """
+    counts = {"paid": 0, "failed": 0}
+    if not statuses:
+        return counts
+    invoices = (
+        session.query(
+            Invoice.id,
+            Invoice.status,
+            Invoice.amount,
+            Invoice.user_id,
+            Invoice.apartment_application_id,
+        )
+        .filter(Invoice.id.in_(list(statuses)))
+        .with_for_update()
+        .all()
+    )
+    changes = [
+        (invoice, statuses[invoice.id])
+        for invoice in invoices
+        if can_transition(invoice.status, statuses[invoice.id])
+    ]
+    if not changes:
+        return counts
+    for status, count_key in [
+        (InvoiceStatus.PAID, "paid"),
+        (InvoiceStatus.FAILED, "failed"),
+    ]:
+        invoice_ids = [invoice.id for invoice, new in changes if new == status]
+        if invoice_ids:
+            session.query(Invoice).filter(Invoice.id.in_(invoice_ids)).update(
+                {Invoice.status: status}, synchronize_session=False
+            )
+        counts[count_key] = len(invoice_ids)
+    record_invoice_transitions(session, changes)
+    return counts
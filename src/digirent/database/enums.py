@@ -62,3 +62,9 @@ class InvoiceStatus(str, Enum):
     PAID = "paid"
     PENDING = "pending"
     FAILED = "failed"
+
+
+class OutboxEffect(str, Enum):
+    EMAIL = "email"
+    CONTRACT_SIGN_REQUEST = "contract_sign_request"
+    RENT_PAYMENT = "rent_payment"
@@ -1,4 +1,5 @@
-from typing import List
+from datetime import datetime
+from typing import Dict, List, Set
 from sqlalchemy import (
     Table,
     Column,
@@ -8,11 +9,12 @@ from sqlalchemy import (
     DateTime,
     Integer,
     ForeignKey,
+    Index,
+    JSON,
     Boolean,
     Date,
     UniqueConstraint,
     case,
-    and_,
     or_,
 )
 from geoalchemy2 import Geometry
@@ -31,6 +33,7 @@ from .enums import (
     FurnishType,
     InvoiceStatus,
     InvoiceType,
+    OutboxEffect,
     SocialAccountType,
     UserRole,
     Gender,
@@ -235,6 +238,33 @@ class Amenity(Base, EntityMixin, TimestampMixin):
     title = Column(String, nullable=False, unique=True)
 
 
+# the statuses an apartment application can move to from each status: the
+# landlord considers or rejects a new application, a considered one is
+# processed into a contract which is signed, or declined, canceled or expired,
+# and the keys handover completes it. Awarding an application rejects the
+# other applications for its apartment that are still open.
+APPLICATION_STATUS_TRANSITIONS: Dict[
+    ApartmentApplicationStatus, Set[ApartmentApplicationStatus]
+] = {
+    ApartmentApplicationStatus.NEW: {
+        ApartmentApplicationStatus.CONSIDERED,
+        ApartmentApplicationStatus.REJECTED,
+    },
+    ApartmentApplicationStatus.CONSIDERED: {
+        ApartmentApplicationStatus.PROCESSING,
+        ApartmentApplicationStatus.REJECTED,
+    },
+    ApartmentApplicationStatus.PROCESSING: {
+        ApartmentApplicationStatus.AWARDED,
+        ApartmentApplicationStatus.FAILED,
+    },
+    ApartmentApplicationStatus.AWARDED: {ApartmentApplicationStatus.COMPLETED},
+    ApartmentApplicationStatus.FAILED: {ApartmentApplicationStatus.REJECTED},
+    ApartmentApplicationStatus.REJECTED: set(),
+    ApartmentApplicationStatus.COMPLETED: set(),
+}
+
+
 class ApartmentApplication(Base, EntityMixin, TimestampMixin):
     __tablename__ = "apartment_applications"
     apartment_id = Column(
@@ -243,6 +273,13 @@ class ApartmentApplication(Base, EntityMixin, TimestampMixin):
     tenant_id = Column(UUIDType(binary=False), ForeignKey("users.id"), nullable=False)
     is_rejected = Column(Boolean, nullable=False, default=False)
     is_considered = Column(Boolean, nullable=False, default=False)
+    # maintained by transition_to, is_rejected and is_considered are kept in
+    # step with it
+    status = Column(
+        ChoiceType(ApartmentApplicationStatus, impl=String()),
+        nullable=False,
+        default=ApartmentApplicationStatus.NEW,
+    )
     apartment = relationship("Apartment", backref="applications")
     tenant = relationship("Tenant", backref="applications")
     booking_request = relationship(
@@ -251,68 +288,46 @@ class ApartmentApplication(Base, EntityMixin, TimestampMixin):
 
     contract = relationship("Contract", uselist=False, backref="apartment_application")
 
-    @hybrid_property
-    def status(self) -> ApartmentApplicationStatus:
-        if not any([self.is_considered, self.is_rejected]):
-            return ApartmentApplicationStatus.NEW
-        if self.is_rejected:
-            return ApartmentApplicationStatus.REJECTED
-        if not self.contract:
-            return ApartmentApplicationStatus.CONSIDERED
-        if self.contract.status in [
-            ContractStatus.DECLINED,
-            ContractStatus.CANCELED,
-            ContractStatus.EXPIRED,
-        ]:
-            return ApartmentApplicationStatus.FAILED
-        if self.contract.status == ContractStatus.NEW:
-            return ApartmentApplicationStatus.PROCESSING
-        if self.contract.status == ContractStatus.SIGNED:
-            return ApartmentApplicationStatus.AWARDED
-            # TODO is it awarded when contract is signed
-        if self.contract.status == ContractStatus.COMPLETED:
-            return ApartmentApplicationStatus.COMPLETED
-
-    @status.expression
-    def status(self):
-        return case(
-            [
-                (
-                    and_(
-                        self.is_considered == False, self.is_rejected == False  # noqa
-                    ),
-                    ApartmentApplicationStatus.NEW.value,
-                ),
-                (
-                    self.is_rejected == True,
-                    ApartmentApplicationStatus.REJECTED.value,
-                ),
-                (
-                    self.contract == None,
-                    ApartmentApplicationStatus.CONSIDERED.value,
-                ),
-                (
-                    or_(
-                        Contract.status == ContractStatus.DECLINED,
-                        Contract.status == ContractStatus.CANCELED,
-                        Contract.status == ContractStatus.EXPIRED,
-                    ),
-                    ApartmentApplicationStatus.FAILED.value,
-                ),
-                (
-                    Contract.status == ContractStatus.NEW,
-                    ApartmentApplicationStatus.PROCESSING.value,
-                ),
-                (
-                    Contract.status == ContractStatus.SIGNED,
-                    ApartmentApplicationStatus.AWARDED.value,
-                ),
-                (
-                    Contract.status == ContractStatus.COMPLETED,
-                    ApartmentApplicationStatus.COMPLETED.value,
-                ),
-            ]
-        )
+    def can_transition_to(self, status: ApartmentApplicationStatus) -> bool:
+        current = self.status or ApartmentApplicationStatus.NEW
+        return status in APPLICATION_STATUS_TRANSITIONS[current]
+
+    def transition_to(self, status: ApartmentApplicationStatus):
+        if not self.can_transition_to(status):
+            raise ValueError(
+                f"Apartment application can not move from {self.status} to {status}"
+            )
+        for key, value in self.transition_values(status).items():
+            setattr(self, key, value)
+
+    @staticmethod
+    def transition_values(status: ApartmentApplicationStatus) -> dict:
+        """The column values of an application moved to status"""
+        values = {"status": status}
+        if status == ApartmentApplicationStatus.REJECTED:
+            values["is_rejected"] = True
+        elif status == ApartmentApplicationStatus.CONSIDERED:
+            values["is_considered"] = True
+        return values
+
+    __table_args__ = (
+        Index(
+            "ix_apartment_applications_apartment_id_status", "apartment_id", "status"
+        ),
+        # newest first listings of an apartment's and a tenant's applications
+        Index(
+            "ix_apartment_applications_apartment_id_created_at_id",
+            "apartment_id",
+            "created_at",
+            "id",
+        ),
+        Index(
+            "ix_apartment_applications_tenant_id_created_at_id",
+            "tenant_id",
+            "created_at",
+            "id",
+        ),
+    )
 
 
 class Contract(Base, EntityMixin, TimestampMixin):
@@ -445,10 +460,42 @@ class Invoice(Base, EntityMixin, TimestampMixin):
     payment_id = Column(String, nullable=True)
     payment_action_date = Column(Date, nullable=True)
     next_date = Column(Date, nullable=False)
+    # one invoice per entity and billing period for scheduled invoices
+    idempotency_key = Column(String, nullable=True)
 
     apartment_application = relationship(ApartmentApplication, backref="invoices")
     user = relationship(User, backref="invoices")
 
+    __table_args__ = (
+        UniqueConstraint("idempotency_key", name="uq_invoices_idempotency_key"),
+    )
+
+
+# serve the newest first invoice listings of an owner, the status and type
+# columns let filters on them be checked from the index
+Index(
+    "ix_invoices_user_id_created_at_id",
+    Invoice.user_id,
+    Invoice.created_at,
+    Invoice.id,
+    Invoice.status,
+    Invoice.type,
+)
+Index(
+    "ix_invoices_apartment_application_id_created_at_id",
+    Invoice.apartment_application_id,
+    Invoice.created_at,
+    Invoice.id,
+    Invoice.status,
+    Invoice.type,
+)
+Index("ix_invoices_created_at_id", Invoice.created_at, Invoice.id)
+
+# serves the keyset scan over pending invoices of payment reconciliation
+Index(
+    "ix_invoices_status_created_at_id", Invoice.status, Invoice.created_at, Invoice.id
+)
+
 
 class ChatMessage(Base, EntityMixin, TimestampMixin):
     __tablename__ = "chat_messages"
@@ -464,6 +511,160 @@ class ChatMessage(Base, EntityMixin, TimestampMixin):
     )
     message = Column(String, nullable=False)
 
+    __table_args__ = (
+        Index("ix_chat_messages_to_user_id_created_at", "to_user_id", "created_at"),
+    )
+
+
+class ChatReadState(Base, EntityMixin, TimestampMixin):
+    """
+    Read watermark and unread counter of user's conversation with other_user.
+    unread_count is maintained incrementally as messages are sent and read.
+    """
+
+    __tablename__ = "chat_read_states"
+    user_id = Column(
+        UUIDType(binary=False),
+        ForeignKey("users.id"),
+        nullable=False,
+    )
+    other_user_id = Column(
+        UUIDType(binary=False),
+        ForeignKey("users.id"),
+        nullable=False,
+    )
+    last_read_at = Column(DateTime, nullable=True)
+    unread_count = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        UniqueConstraint("user_id", "other_user_id", name="uix_chat_read_state_users"),
+    )
+
+
+class PaymentWebhookEvent(Base, EntityMixin, TimestampMixin):
+    """
+    Inbox of payment ids received on the payments webhook, one row per
+    payment. Repeated notifications bump version and re-arm the row, so
+    retries of a pending notification are deduplicated.
+    """
+
+    __tablename__ = "payment_webhook_events"
+    payment_id = Column(String, nullable=False)
+    version = Column(Integer, nullable=False, default=1)
+    attempts = Column(Integer, nullable=False, default=0)
+    last_error = Column(String, nullable=True)
+    processed_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        UniqueConstraint("payment_id", name="uix_payment_webhook_events_payment_id"),
+        Index("ix_payment_webhook_events_processed_at", "processed_at"),
+    )
+
+
+# the SignRequest events that change a contract, the contract webhook drops
+# the others, such as the signer_viewed events
+SIGNREQUEST_CONTRACT_EVENT_TYPES = [
+    "declined",
+    "cancelled",
+    "expired",
+    "signed",
+    "signer_signed",
+]
+
+
+class SignrequestWebhookEvent(Base, EntityMixin, TimestampMixin):
+    """
+    Inbox of the SignRequest contract events of apartment applications, one
+    row per event uuid so redelivered events are stored once. signers holds
+    the document's signers as they were when the event was sent.
+    """
+
+    __tablename__ = "signrequest_webhook_events"
+    event_uuid = Column(UUIDType(binary=False), nullable=False)
+    event_hash = Column(String, nullable=False)
+    event_type = Column(String, nullable=False)
+    event_timestamp = Column(DateTime, nullable=False)
+    apartment_application_id = Column(UUIDType(binary=False), nullable=False)
+    signers = Column(JSON, nullable=False)
+    attempts = Column(Integer, nullable=False, default=0)
+    last_error = Column(String, nullable=True)
+    processed_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        UniqueConstraint(
+            "event_uuid", name="uix_signrequest_webhook_events_event_uuid"
+        ),
+        Index("ix_signrequest_webhook_events_processed_at", "processed_at"),
+        Index(
+            "ix_signrequest_webhook_events_application_timestamp",
+            "apartment_application_id",
+            "event_timestamp",
+        ),
+    )
+
+
+class OutboxMessage(Base, EntityMixin, TimestampMixin):
+    """
+    An external side effect of a state change, added in the transaction of
+    the change and performed after it commits by the outbox worker. A failed
+    effect is tried again from available_at. processed_at is set once it is
+    performed or given up on, when last_error says why.
+    """
+
+    __tablename__ = "outbox"
+    effect = Column(ChoiceType(OutboxEffect, impl=String()), nullable=False)
+    payload = Column(JSON, nullable=False)
+    attempts = Column(Integer, nullable=False, default=0)
+    last_error = Column(String, nullable=True)
+    available_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    processed_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index("ix_outbox_processed_at_available_at", "processed_at", "available_at"),
+    )
+
+
+class BillingState(Base, EntityMixin, TimestampMixin):
+    """
+    Billing summary of a user's subscription or of an apartment application's
+    rent, one row per owner. Maintained in the transaction that creates an
+    invoice or changes its status, see digirent.database.billing.
+    """
+
+    __tablename__ = "billing_states"
+    user_id = Column(UUIDType(binary=False), ForeignKey("users.id"), nullable=True)
+    apartment_application_id = Column(
+        UUIDType(binary=False),
+        ForeignKey("apartment_applications.id"),
+        nullable=True,
+    )
+    latest_invoice_id = Column(
+        UUIDType(binary=False), ForeignKey("invoices.id"), nullable=False
+    )
+    latest_invoice_status = Column(
+        ChoiceType(InvoiceStatus, impl=String()), nullable=False
+    )
+    next_due_date = Column(Date, nullable=False)
+    # unpaid invoices, of which the failed ones are in arrears
+    amount_outstanding = Column(Float, nullable=False, default=0)
+    amount_in_arrears = Column(Float, nullable=False, default=0)
+    last_paid_at = Column(DateTime, nullable=True)
+
+    latest_invoice = relationship(Invoice)
+
+    __table_args__ = (
+        UniqueConstraint("user_id", name="uix_billing_states_user_id"),
+        UniqueConstraint(
+            "apartment_application_id",
+            name="uix_billing_states_apartment_application_id",
+        ),
+        Index("ix_billing_states_next_due_date", "next_due_date"),
+    )
+
+    @property
+    def in_arrears(self) -> bool:
+        return self.amount_in_arrears > 0
+
 
 blog_post_tag_association_table = Table(
     "blog_posts_tags_association",
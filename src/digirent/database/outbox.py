@@ -0,0 +1,28 @@
+"""
+The outbox of the external side effects of state changes: emails, contract
+sign requests and rent payments. Effects are added to the caller's session,
+so they are committed with the change they follow from or discarded with
+it, and performed after the commit by the outbox worker, see
+digirent.worker.outbox.
+"""
+from datetime import datetime
+from typing import List
+from sqlalchemy.orm.session import Session
+from .enums import OutboxEffect
+from .models import OutboxMessage
+
+
+def add_outbox_message(
+    session: Session, effect: OutboxEffect, payload: dict
+) -> OutboxMessage:
+    """Add an effect with its JSON payload to the session"""
+    message = OutboxMessage(
+        effect=effect, payload=payload, attempts=0, available_at=datetime.utcnow()
+    )
+    session.add(message)
+    return message
+
+
+def add_emails(session: Session, emails: List[dict]) -> List[OutboxMessage]:
+    """Add emails, each given as the fields of a mail.Email"""
+    return [add_outbox_message(session, OutboxEffect.EMAIL, email) for email in emails]
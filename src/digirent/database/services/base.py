@@ -39,3 +39,26 @@ class DBService(Generic[T]):
 
     def all(self, session: Session) -> List[T]:
         return session.query(self.model_calss).all()
+
+    def bulk_update(
+        self, session: Session, *criteria, commit=True, **update_data: dict
+    ) -> List[UUID]:
+        """
+        Update every row matching criteria with a single UPDATE, without
+        loading them into the session. The matching rows are locked first, so
+        the returned ids are the rows the UPDATE changed.
+        """
+        model_ids = [
+            row.id
+            for row in session.query(self.model_calss.id)
+            .filter(*criteria)
+            .with_for_update()
+            .all()
+        ]
+        if model_ids:
+            session.query(self.model_calss).filter(
+                self.model_calss.id.in_(model_ids)
+            ).update(update_data, synchronize_session=False)
+        if commit:
+            session.commit()
+        return model_ids
@@ -5,6 +5,8 @@ from digirent.database.base import SessionLocal
 from digirent.app import Application
 from digirent.app.error import ApplicationError
 from digirent.app.container import ApplicationContainer
+from digirent.core.services.payment_gateway import get_payment_gateway
+from digirent.worker.payments import reconcile_pending_invoices
 
 
 def __create_admin_user(
@@ -61,3 +63,13 @@ def create_admin_user():
         return
     __create_admin_user(first_name, last_name, username, phonenumber, email, password)
     print(f"User with and email {email} successfully created")
+
+
+def reconcile_payments():
+    session: Session = SessionLocal()
+    try:
+        report = reconcile_pending_invoices(session, get_payment_gateway())
+    finally:
+        session.close()
+    for key, value in report.items():
+        print(f"{key}: {value}")
@@ -1,6 +1,6 @@
 from pathlib import Path
 import jwt
-from typing import Any, Optional, Union
+from typing import Any, Union
 from datetime import datetime, timedelta, date
 from passlib.context import CryptContext
 from digirent.core.config import (
@@ -9,11 +9,7 @@ from digirent.core.config import (
     JWT_ALGORITHM,
     STATIC_PATH,
     UPLOAD_PATH,
-    IS_TEST,
-    SENDGRID_API_KEY,
 )
-from sendgrid import SendGridAPIClient
-from sendgrid.helpers.mail import Mail
 
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -107,36 +103,6 @@ def get_human_readable_date(date: date) -> str:
     return date.strftime("%B %d %Y")
 
 
-def send_email(
-    to: str,
-    subject: str,
-    message: str,
-    html: Optional[str] = None,
-):
-    """
-    Send out email with sendgrid
-    """
-    try:
-        msg = Mail(
-            from_email="noreply@digirent.com",
-            to_emails=to,
-            subject=subject,
-            plain_text_content=message,
-            html_content=html,
-        )
-        if not IS_TEST:
-            print("\n\n\n\n")
-            print(str(message))
-            print("\n\n\n\n")
-        sg = SendGridAPIClient(SENDGRID_API_KEY)
-        sg.send(msg)
-    except Exception as e:
-        print("\n\n\n\n")
-        print("Sendgrid failed")
-        print(str(e))
-        print("\n\n\n\n")
-
-
 def float_to_mollie_amount(amount: float) -> str:
     splitted_amount = str(amount).split(".")
     if len(splitted_amount) == 1:
@@ -4,6 +4,7 @@ from fastapi.staticfiles import StaticFiles
 from starlette.middleware.sessions import SessionMiddleware
 from digirent.api.middlewares import ChatManagerMiddleware
 import digirent.core.config as config
+from digirent.core.services.email_templates import get_template_loader
 from digirent.api.auth.router import router as auth_router
 from digirent.api.me.router import router as me_router
 from digirent.api.user.router import router as user_router
@@ -66,6 +67,8 @@ def get_app() -> FastAPI:
     api_app = get_api_app()
     app.mount("/api", app=api_app)
     app.mount("/static", StaticFiles(directory=config.STATIC_PATH), name="static")
+    # compile the email templates before the first request needs them
+    app.add_event_handler("startup", get_template_loader)
     return app
 
 
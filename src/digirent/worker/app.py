@@ -6,17 +6,32 @@ app = Celery(
     "app",
     broker=config.CELERY_BROKER_URL,
     backend=config.CELERY_BACKEND_URL,
-    include=["digirent.worker.rent", "digirent.worker.subscription"],
+    include=[
+        "digirent.worker.rent",
+        "digirent.worker.subscription",
+        "digirent.worker.payments",
+        "digirent.worker.contracts",
+        "digirent.worker.outbox",
+    ],
 )
 
 
 # Route all rent tasks to rent queue
 # Route all subuscription tasks to subscription queue
+# Route all payment tasks to payment queue
+# Route the contract tasks to payment queue, signed contracts create payments
+# Route the outbox task to outbox queue, it sends emails, contracts and payments
 # Create rent and subscription beat schedule for invoices
+# Reconcile pending invoices the payment webhooks missed
+# Apply the contract events the signrequest webhook recorded
+# Perform the external effects of committed state changes
 app.conf.update(
     task_routes={
         "digirent.worker.rent.*": {"queue": "rent-queue"},
         "digirent.worker.subscription.*": {"queue": "subscription-queue"},
+        "digirent.worker.payments.*": {"queue": "payment-queue"},
+        "digirent.worker.contracts.*": {"queue": "payment-queue"},
+        "digirent.worker.outbox.*": {"queue": "outbox-queue"},
     },
     beat_schedule={
         "create_rent_invoice": {
@@ -27,5 +42,25 @@ app.conf.update(
             "task": "digirent.worker.subscription.generate_subscription_invoices",
             "schedule": 300,
         },
+        "process_payment_webhooks": {
+            "task": "digirent.worker.payments.process_payment_webhooks",
+            "schedule": config.PAYMENT_WEBHOOK_POLL_SECONDS,
+            "options": {"expires": config.PAYMENT_WEBHOOK_POLL_SECONDS},
+        },
+        "reconcile_payments": {
+            "task": "digirent.worker.payments.reconcile_payments",
+            "schedule": config.PAYMENT_RECONCILIATION_INTERVAL_SECONDS,
+            "options": {"expires": config.PAYMENT_RECONCILIATION_INTERVAL_SECONDS},
+        },
+        "process_signrequest_webhooks": {
+            "task": "digirent.worker.contracts.process_signrequest_webhooks",
+            "schedule": config.SIGNREQUEST_WEBHOOK_POLL_SECONDS,
+            "options": {"expires": config.SIGNREQUEST_WEBHOOK_POLL_SECONDS},
+        },
+        "process_outbox": {
+            "task": "digirent.worker.outbox.process_outbox",
+            "schedule": config.OUTBOX_POLL_SECONDS,
+            "options": {"expires": config.OUTBOX_POLL_SECONDS},
+        },
     },
 )
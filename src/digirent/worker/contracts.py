@@ -0,0 +1,226 @@
+"""
+SignRequest contract events, recorded in the SignrequestWebhookEvent inbox by
+the contract webhook and applied to their apartment applications here, so
+the webhook never waits on the payment created when a contract is signed.
+"""
+import time
+from datetime import datetime
+from typing import List, Optional
+from uuid import UUID
+from sqlalchemy.orm.session import Session
+from digirent.app import Application
+from digirent.app.container import ApplicationContainer
+from digirent.app.error import ApplicationError
+from digirent.core import config
+from digirent.database.models import (
+    ApartmentApplication,
+    Contract,
+    SignrequestWebhookEvent,
+)
+from .db import db_task
+from .dispatch import DispatchClaims
+
+
+class SignrequestWebhookClaims(DispatchClaims):
+    prefix = "signrequest-webhooks"
+
+
+def signer_datetime(value: Optional[str]) -> Optional[datetime]:
+    return datetime.fromisoformat(value) if value else None
+
+
+def pending_event_applications(
+    session: Session, after_id: Optional[UUID], limit: int
+) -> List[UUID]:
+    """A page of the apartment applications with pending events"""
+    query = (
+        session.query(SignrequestWebhookEvent.apartment_application_id)
+        .filter(SignrequestWebhookEvent.processed_at.is_(None))
+        .distinct()
+    )
+    if after_id:
+        query = query.filter(
+            SignrequestWebhookEvent.apartment_application_id > after_id
+        )
+    return [
+        row.apartment_application_id
+        for row in query.order_by(SignrequestWebhookEvent.apartment_application_id)
+        .limit(limit)
+        .all()
+    ]
+
+
+def apply_contract_event(
+    session: Session,
+    application: Application,
+    apartment_application: ApartmentApplication,
+    event: SignrequestWebhookEvent,
+):
+    """
+    Apply an event to the application's contract. Signatures and declines
+    the contract already has are skipped, so a signer repeated by a later
+    event is applied once.
+    """
+    contract: Contract = apartment_application.contract
+    if event.event_type == "expired":
+        application.expire_contract(
+            session, apartment_application, event.event_timestamp
+        )
+    elif event.event_type == "cancelled":
+        application.cancel_contract(
+            session, apartment_application, event.event_timestamp
+        )
+    tenant = apartment_application.tenant
+    landlord = apartment_application.apartment.landlord
+    for signer in event.signers:
+        if not signer["needs_to_sign"]:
+            continue
+        if tenant.email == signer["email"]:
+            if signer["declined"] and not contract.tenant_declined:
+                application.decline_contract(
+                    session,
+                    apartment_application,
+                    signer_datetime(signer["declined_on"]),
+                    tenant,
+                )
+            elif signer["signed"] and not contract.tenant_has_signed:
+                application.tenant_signed_contract(
+                    session,
+                    apartment_application,
+                    signer_datetime(signer["signed_on"]),
+                )
+        if landlord.email == signer["email"]:
+            if signer["declined"] and not contract.landlord_declined:
+                application.decline_contract(
+                    session,
+                    apartment_application,
+                    signer_datetime(signer["declined_on"]),
+                    landlord,
+                )
+            elif signer["signed"] and not contract.landlord_has_signed:
+                application.landlord_signed_contract(
+                    session,
+                    apartment_application,
+                    signer_datetime(signer["signed_on"]),
+                )
+
+
+def lock_pending_events(
+    session: Session, apartment_application_id: UUID
+) -> List[SignrequestWebhookEvent]:
+    """
+    The pending events of an apartment application in the order they happened,
+    locked until the next commit. Rows locked by another run are skipped, and
+    none are returned while its first pending event is locked, so the events
+    of an application are applied by one run at a time.
+    """
+    query = (
+        session.query(SignrequestWebhookEvent)
+        .filter(
+            SignrequestWebhookEvent.apartment_application_id == apartment_application_id
+        )
+        .filter(SignrequestWebhookEvent.processed_at.is_(None))
+        .order_by(
+            SignrequestWebhookEvent.event_timestamp,
+            SignrequestWebhookEvent.created_at,
+        )
+    )
+    events = query.with_for_update(skip_locked=True).all()
+    first = query.with_entities(SignrequestWebhookEvent.id).first()
+    if not events or not first or events[0].id != first.id:
+        return []
+    return events
+
+
+def process_application_events(
+    session: Session,
+    application: Application,
+    apartment_application_id: UUID,
+    max_attempts: int = config.SIGNREQUEST_WEBHOOK_MAX_ATTEMPTS,
+) -> dict:
+    """
+    Apply the pending events of an apartment application in the order they
+    happened, committing each. Events that no longer apply to the contract
+    are marked processed with their error. An event that fails otherwise is
+    retried on the next run and holds back the events after it, until it has
+    failed max_attempts times.
+    """
+    counts = {"events": 0, "applied": 0, "skipped": 0, "errors": 0}
+    apartment_application = session.query(ApartmentApplication).get(
+        apartment_application_id
+    )
+    while True:
+        # locked again for every event, as applying one commits
+        events = lock_pending_events(session, apartment_application_id)
+        if not events:
+            break
+        event = events[0]
+        counts["events"] += 1
+        try:
+            if not apartment_application or not apartment_application.contract:
+                raise ApplicationError("Apartment application has no contract")
+            apply_contract_event(session, application, apartment_application, event)
+            counts["applied"] += 1
+        except ApplicationError as e:
+            session.rollback()
+            event.last_error = str(e)
+            counts["skipped"] += 1
+        except Exception as e:
+            session.rollback()
+            event.attempts += 1
+            event.last_error = f"{type(e).__name__}: {e}"
+            counts["errors"] += 1
+            if event.attempts < max_attempts:
+                session.commit()
+                break
+        event.processed_at = datetime.utcnow()
+        session.commit()
+    return counts
+
+
+def process_signrequest_events(
+    session: Session,
+    application: Application,
+    batch_size: int = config.SIGNREQUEST_WEBHOOK_BATCH_SIZE,
+    max_seconds: float = config.SIGNREQUEST_WEBHOOK_RUN_SECONDS,
+) -> dict:
+    """
+    Apply the pending inbox events, one apartment application at a time, and
+    start no new application once max_seconds have passed. The rest is left
+    to the next run.
+    """
+    counts = {"events": 0, "applied": 0, "skipped": 0, "errors": 0}
+    started = time.monotonic()
+    after_id = None
+    while True:
+        apartment_application_ids = pending_event_applications(
+            session, after_id, batch_size
+        )
+        if not apartment_application_ids:
+            break
+        for apartment_application_id in apartment_application_ids:
+            application_counts = process_application_events(
+                session, application, apartment_application_id
+            )
+            for key, value in application_counts.items():
+                counts[key] += value
+            if time.monotonic() - started >= max_seconds:
+                return counts
+        after_id = apartment_application_ids[-1]
+    return counts
+
+
+@db_task
+def process_signrequest_webhooks(*args, session: Session):
+    # runs do not overlap while they stop within the claim, the event locks
+    # keep two runs from applying the events of an application out of order
+    claims = SignrequestWebhookClaims(ttl=config.SIGNREQUEST_WEBHOOK_RUN_TTL_SECONDS)
+    if not claims.claim("run"):
+        return None
+    try:
+        counts = process_signrequest_events(session, ApplicationContainer.app())
+    finally:
+        claims.release("run")
+    if counts["events"]:
+        print(f"Processed signrequest webhooks {counts}")
+    return counts
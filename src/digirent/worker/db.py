@@ -0,0 +1,85 @@
+"""
+Database sessions of the celery workers.
+
+Every worker process gets its own connection pool, sized by
+WORKER_DATABASE_POOL_SIZE and WORKER_DATABASE_MAX_OVERFLOW, as soon as it is
+forked, and every task run with db_task gets its own session which is
+committed when the task returns, rolled back when it raises and always closed.
+"""
+import time
+from contextlib import contextmanager
+from functools import wraps
+from typing import Callable, Dict
+from celery.signals import worker_process_init
+from sqlalchemy.orm.session import Session
+from digirent.core import config
+from digirent.database import base
+from digirent.worker.app import app
+
+
+# per task name: runs, failures, total and slowest seconds of this process
+task_metrics: Dict[str, dict] = {}
+
+
+def record_task_run(name: str, seconds: float, failed: bool):
+    metrics = task_metrics.setdefault(
+        name, {"runs": 0, "failures": 0, "seconds": 0.0, "max_seconds": 0.0}
+    )
+    metrics["runs"] += 1
+    metrics["failures"] += int(failed)
+    metrics["seconds"] += seconds
+    metrics["max_seconds"] = max(metrics["max_seconds"], seconds)
+
+
+@worker_process_init.connect
+def configure_worker_engine(**kwargs):
+    base.configure_engine(
+        config.WORKER_DATABASE_POOL_SIZE, config.WORKER_DATABASE_MAX_OVERFLOW
+    )
+
+
+@contextmanager
+def task_session(name: str, session_factory: Callable[[], Session] = None):
+    """
+    A session for one task run: committed when the block completes,
+    rolled back and re-raised when it fails, closed either way. The run is
+    timed and recorded in task_metrics.
+    """
+    session: Session = (session_factory or base.SessionLocal)()
+    started = time.perf_counter()
+    failed = False
+    try:
+        yield session
+        session.commit()
+    except Exception as err:
+        failed = True
+        session.rollback()
+        print(f"Task {name} failed: {type(err).__name__}: {err}")
+        raise
+    finally:
+        session.close()
+        seconds = time.perf_counter() - started
+        record_task_run(name, seconds, failed)
+        print(f"Task {name} {'failed' if failed else 'done'} in {seconds:.3f}s")
+
+
+def db_task(*args, **options):
+    """
+    Register a celery task that is given a task_session as its session
+    keyword argument. Takes the options of app.task, with or without them:
+
+        @db_task
+        def generate_rent_invoices(*args, session: Session): ...
+    """
+
+    def decorator(func):
+        @wraps(func)
+        def run(*task_args, **task_kwargs):
+            with task_session(func.__name__) as session:
+                return func(*task_args, **task_kwargs, session=session)
+
+        return app.task(**options)(run)
+
+    if len(args) == 1 and callable(args[0]) and not options:
+        return decorator(args[0])
+    return decorator
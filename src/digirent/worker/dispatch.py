@@ -0,0 +1,90 @@
+from datetime import date
+from functools import lru_cache
+from typing import Iterable, List, Tuple, Union
+from uuid import UUID
+from celery import Task
+from redis import Redis
+from digirent.core import config
+from digirent.database.enums import InvoiceType
+
+
+def billing_key(
+    kind: InvoiceType, entity_id: Union[UUID, str], billing_period: date
+) -> str:
+    """Idempotency key of the invoice billing entity for billing_period"""
+    return f"{kind.value}:{entity_id}:{billing_period.isoformat()}"
+
+
+@lru_cache()
+def get_redis() -> Redis:
+    return Redis.from_url(config.REDIS_URL)
+
+
+class DispatchClaims:
+    """
+    Short lived redis claims on billing keys. A claim is taken when work is
+    queued, so a task that is still waiting in the queue when the next beat
+    fires is not queued a second time. Claims expire after ttl seconds and
+    are released early when the work fails, so it is retried on the next run.
+    """
+
+    prefix = "invoice-dispatch"
+
+    def __init__(
+        self, redis: Redis = None, ttl: int = config.INVOICE_DISPATCH_CLAIM_TTL_SECONDS
+    ):
+        self.redis = redis or get_redis()
+        self.ttl = ttl
+
+    def claim(self, key: str) -> bool:
+        return bool(self.redis.set(f"{self.prefix}:{key}", 1, nx=True, ex=self.ttl))
+
+    def release(self, *keys: str):
+        if keys:
+            self.redis.delete(*[f"{self.prefix}:{key}" for key in keys])
+
+
+def dispatch_in_chunks(
+    task: Task,
+    kind: InvoiceType,
+    due: Iterable[Tuple[UUID, date]],
+    queue: str,
+    claims: DispatchClaims = None,
+    chunk_size: int = config.INVOICE_TASK_CHUNK_SIZE,
+    batch_size: int = config.INVOICE_DISPATCH_BATCH_SIZE,
+) -> dict:
+    """
+    Queue task(entity_id, billing_period) for every due (entity_id,
+    billing_period) in celery chunks of chunk_size calls, one group per
+    batch_size items. Items whose billing key is already claimed are counted
+    as duplicates and not queued. Returns the counts of the run.
+    """
+    claims = claims or DispatchClaims()
+    counts = {"due": 0, "scheduled": 0, "duplicate": 0}
+    batch: List[Tuple[str, str]] = []
+    keys: List[str] = []
+
+    def flush():
+        try:
+            # chunks run as celery.starmap tasks which are not routed by name
+            task.chunks(batch, chunk_size).apply_async(queue=queue)
+        except Exception:
+            claims.release(*keys)
+            raise
+        counts["scheduled"] += len(batch)
+        batch.clear()
+        keys.clear()
+
+    for entity_id, billing_period in due:
+        counts["due"] += 1
+        key = billing_key(kind, entity_id, billing_period)
+        if not claims.claim(key):
+            counts["duplicate"] += 1
+            continue
+        batch.append((str(entity_id), billing_period.isoformat()))
+        keys.append(key)
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+    return counts
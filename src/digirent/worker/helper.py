@@ -1,17 +1,16 @@
 from sqlalchemy.orm.session import Session
 from digirent.core import config
 from digirent import util
+from digirent.database.billing import record_invoice
 from digirent.database.models import ApartmentApplication, Invoice, User
 from digirent.database.enums import InvoiceType, InvoiceStatus, UserRole
-from mollie.api.client import Client
-
-
-mollie_client = Client()
-mollie_client.set_api_key(config.MOLLIE_API_KEY)
+from digirent.core.services.payment_gateway import get_payment_gateway
 
 
 def create_rent_payment(
-    session: Session, apartment_application: ApartmentApplication
+    session: Session,
+    apartment_application: ApartmentApplication,
+    idempotency_key: str = None,
 ) -> Invoice:
     redirect_url: str = config.MOLLIE_REDIRECT_URL
     webhook_url: str = config.MOLLIE_WEBHOOK_URL
@@ -29,11 +28,14 @@ def create_rent_payment(
         amount=amount,
         description=description,
         next_date=next_date,
+        idempotency_key=idempotency_key,
     )
     session.add(invoice)
+    # a duplicate idempotency key fails here, before a payment is created
     session.flush()
+    record_invoice(session, invoice)
     mollie_amount = util.float_to_mollie_amount(invoice.amount)
-    payment = mollie_client.payments.create(
+    payment = get_payment_gateway().create_payment(
         {
             "amount": {"currency": "EUR", "value": mollie_amount},
             "description": description,
@@ -45,13 +47,16 @@ def create_rent_payment(
                 "created_date": str(start_date),
                 "next_date": str(next_date),
             },
-        }
+        },
+        idempotency_key=str(invoice.id),
     )
     invoice.payment_id = payment.id
     return invoice
 
 
-def create_subscription_payment(session: Session, user: User) -> Invoice:
+def create_subscription_payment(
+    session: Session, user: User, idempotency_key: str = None
+) -> Invoice:
     role_amount_mapping = {
         UserRole.TENANT: config.USER_SUBSCRIPTION_AMOUNT,
         UserRole.LANDLORD: config.LANDLORD_SUBSCRIPTION_AMOUNT,
@@ -74,11 +79,14 @@ def create_subscription_payment(session: Session, user: User) -> Invoice:
         amount=amount,
         description=description,
         next_date=next_date,
+        idempotency_key=idempotency_key,
     )
     session.add(invoice)
+    # a duplicate idempotency key fails here, before a payment is created
     session.flush()
+    record_invoice(session, invoice)
     mollie_amount = util.float_to_mollie_amount(invoice.amount)
-    payment = mollie_client.payments.create(
+    payment = get_payment_gateway().create_payment(
         {
             "amount": {"currency": "EUR", "value": mollie_amount},
             "description": description,
@@ -90,7 +98,8 @@ def create_subscription_payment(session: Session, user: User) -> Invoice:
                 "created_date": str(start_date),
                 "next_date": str(next_date),
             },
-        }
+        },
+        idempotency_key=str(invoice.id),
     )
     invoice.payment_id = payment.id
     return invoice
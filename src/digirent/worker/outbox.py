@@ -0,0 +1,283 @@
+"""
+Performs the effects of the outbox, see digirent.database.outbox. A run leases
+the due effects in batches and performs every kind of effect on its own
+threads, at most its concurrency at once, then records the results in one
+commit. An effect that fails is tried again with exponential backoff until it
+has failed OUTBOX_MAX_ATTEMPTS times.
+"""
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Tuple
+from uuid import UUID
+from sqlalchemy.orm.session import Session
+from digirent.core import config
+from digirent.core.services.mail import (
+    Email,
+    EmailTransportError,
+    batch_by_recipient,
+    deliver,
+    delivery_metrics,
+)
+from digirent.core.services.payment_gateway import Payment, get_payment_gateway
+from digirent.core.services.sign_request import (
+    has_open_contract_document,
+    send_contract_sign_request,
+)
+from digirent.database.billing import apply_invoice_statuses
+from digirent.database.enums import InvoiceStatus, OutboxEffect
+from digirent.database.models import Invoice, OutboxMessage
+from .db import db_task
+from .dispatch import DispatchClaims
+
+
+class OutboxClaims(DispatchClaims):
+    prefix = "outbox"
+
+
+class OutboxHandler(ABC):
+    """
+    Performs one kind of effect. perform runs on the handler's threads and
+    must not use the session, complete records its result in the session
+    and give_up records an effect that failed OUTBOX_MAX_ATTEMPTS times.
+    """
+
+    concurrency = 1
+
+    @abstractmethod
+    def perform(self, payload: dict) -> Any:
+        pass
+
+    def batch(
+        self, messages: List[OutboxMessage]
+    ) -> List[Tuple[dict, List[OutboxMessage]]]:
+        """The payloads to perform for messages, each with its messages"""
+        return [(message.payload, [message]) for message in messages]
+
+    def complete(self, session: Session, payload: dict, result: Any):
+        pass
+
+    def give_up(self, session: Session, payload: dict):
+        pass
+
+
+class EmailHandler(OutboxHandler):
+    concurrency = config.OUTBOX_EMAIL_CONCURRENCY
+
+    def batch(
+        self, messages: List[OutboxMessage]
+    ) -> List[Tuple[dict, List[OutboxMessage]]]:
+        # the notifications of a batch to the same recipient are sent as one
+        # email, which succeeds or fails for all of them
+        batched = batch_by_recipient([Email(**message.payload) for message in messages])
+        return [
+            (email.dict(), [messages[index] for index in indexes])
+            for email, indexes in batched
+        ]
+
+    def perform(self, payload: dict):
+        if deliver([Email(**payload)]):
+            raise EmailTransportError(f"Sending the email to {payload['to']} failed")
+
+
+class ContractSignRequestHandler(OutboxHandler):
+    """
+    Sends the contract of an apartment application to its signers. A request
+    that failed may still have created the document, which SignRequest has no
+    idempotency key for, so nothing is sent while a document for the
+    application is out for signing.
+    """
+
+    concurrency = config.OUTBOX_CONTRACT_CONCURRENCY
+
+    def perform(self, payload: dict):
+        apartment_application_id = UUID(payload["apartment_application_id"])
+        if has_open_contract_document(apartment_application_id):
+            return
+        send_contract_sign_request(
+            apartment_application_id,
+            payload["landlord_email"],
+            payload["tenant_email"],
+        )
+
+
+class RentPaymentHandler(OutboxHandler):
+    """
+    Creates the payment of a rent invoice. The invoice id is the idempotency
+    key, so a payment whose response was lost is not created twice.
+    """
+
+    concurrency = config.OUTBOX_PAYMENT_CONCURRENCY
+
+    def perform(self, payload: dict) -> Payment:
+        return get_payment_gateway().create_payment(
+            payload["payment"], idempotency_key=payload["invoice_id"]
+        )
+
+    def complete(self, session: Session, payload: dict, result: Payment):
+        invoice = session.query(Invoice).get(UUID(payload["invoice_id"]))
+        if invoice:
+            invoice.payment_id = result.id
+
+    def give_up(self, session: Session, payload: dict):
+        # an invoice that never got a payment fails like one whose payment
+        # failed, so its billing state shows it and billing can recover
+        apply_invoice_statuses(
+            session, {UUID(payload["invoice_id"]): InvoiceStatus.FAILED}
+        )
+
+
+HANDLERS: Dict[OutboxEffect, OutboxHandler] = {
+    OutboxEffect.EMAIL: EmailHandler(),
+    OutboxEffect.CONTRACT_SIGN_REQUEST: ContractSignRequestHandler(),
+    OutboxEffect.RENT_PAYMENT: RentPaymentHandler(),
+}
+
+
+def claim_due_messages(
+    session: Session,
+    limit: int,
+    lease_seconds: float = config.OUTBOX_LEASE_SECONDS,
+) -> List[OutboxMessage]:
+    """
+    The oldest effects that are neither processed nor waiting for a retry,
+    leased for lease_seconds in a commit of their own. Rows locked by another
+    run are skipped and leased rows are not due, so an effect is taken by one
+    run at a time. The effects of a run that died are due again once their
+    lease has run out.
+    """
+    now = datetime.utcnow()
+    message_ids = [
+        row.id
+        for row in session.query(OutboxMessage.id)
+        .filter(OutboxMessage.processed_at.is_(None))
+        .filter(OutboxMessage.available_at <= now)
+        .order_by(OutboxMessage.available_at, OutboxMessage.created_at)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+        .all()
+    ]
+    if not message_ids:
+        session.commit()
+        return []
+    session.query(OutboxMessage).filter(OutboxMessage.id.in_(message_ids)).update(
+        {OutboxMessage.available_at: now + timedelta(seconds=lease_seconds)},
+        synchronize_session=False,
+    )
+    session.commit()
+    # in the order they were claimed, created_at is the same for all the
+    # messages of a transaction
+    messages = {
+        message.id: message
+        for message in session.query(OutboxMessage).filter(
+            OutboxMessage.id.in_(message_ids)
+        )
+    }
+    return [messages[message_id] for message_id in message_ids]
+
+
+def perform_messages(
+    messages: List[OutboxMessage], handlers: Dict[OutboxEffect, OutboxHandler]
+) -> Dict[UUID, Future]:
+    """
+    Perform messages, batched by their handler, on a thread pool per effect
+    and wait for all of them. The messages of a batch share its future.
+    """
+    by_effect: Dict[OutboxEffect, List[OutboxMessage]] = {}
+    for message in messages:
+        by_effect.setdefault(message.effect, []).append(message)
+    executors: Dict[OutboxEffect, ThreadPoolExecutor] = {}
+    futures = {}
+    try:
+        for effect, effect_messages in by_effect.items():
+            handler = handlers[effect]
+            executors[effect] = ThreadPoolExecutor(
+                max_workers=handler.concurrency,
+                thread_name_prefix=f"outbox-{effect.value}",
+            )
+            for payload, batch in handler.batch(effect_messages):
+                future = executors[effect].submit(handler.perform, payload)
+                for message in batch:
+                    futures[message.id] = future
+    finally:
+        for executor in executors.values():
+            executor.shutdown(wait=True)
+    return futures
+
+
+def drain_outbox_batch(
+    session: Session,
+    handlers: Dict[OutboxEffect, OutboxHandler] = HANDLERS,
+    batch_size: int = config.OUTBOX_BATCH_SIZE,
+    max_attempts: int = config.OUTBOX_MAX_ATTEMPTS,
+    backoff_seconds: float = config.OUTBOX_RETRY_BACKOFF_SECONDS,
+) -> dict:
+    """
+    Perform a batch of due effects and commit their results. A batch that
+    sent emails reports the delivery metrics of the process.
+    """
+    counts = {"messages": 0, "performed": 0, "retried": 0, "failed": 0}
+    messages = claim_due_messages(session, batch_size)
+    futures = perform_messages(messages, handlers)
+    for message in messages:
+        counts["messages"] += 1
+        try:
+            result = futures[message.id].result()
+            handlers[message.effect].complete(session, message.payload, result)
+            counts["performed"] += 1
+        except Exception as e:
+            message.attempts += 1
+            message.last_error = f"{type(e).__name__}: {e}"
+            if message.attempts < max_attempts:
+                message.available_at = datetime.utcnow() + timedelta(
+                    seconds=backoff_seconds * 2 ** (message.attempts - 1)
+                )
+                counts["retried"] += 1
+                continue
+            handlers[message.effect].give_up(session, message.payload)
+            counts["failed"] += 1
+        message.processed_at = datetime.utcnow()
+    session.commit()
+    if any(message.effect == OutboxEffect.EMAIL for message in messages):
+        print(f"Email delivery {delivery_metrics}")
+    return counts
+
+
+def drain_outbox(
+    session: Session,
+    handlers: Dict[OutboxEffect, OutboxHandler] = HANDLERS,
+    batch_size: int = config.OUTBOX_BATCH_SIZE,
+    max_seconds: float = config.OUTBOX_RUN_SECONDS,
+) -> dict:
+    """
+    Perform the due effects batch by batch until a batch is not full, or no
+    new batch once max_seconds have passed. The rest is left to the next run.
+    """
+    counts = {"messages": 0, "performed": 0, "retried": 0, "failed": 0}
+    started = time.monotonic()
+    while True:
+        batch_counts = drain_outbox_batch(session, handlers, batch_size)
+        for key, value in batch_counts.items():
+            counts[key] += value
+        if batch_counts["messages"] < batch_size:
+            break
+        if time.monotonic() - started >= max_seconds:
+            break
+    return counts
+
+
+@db_task
+def process_outbox(*args, session: Session):
+    # runs do not overlap while they stop within the claim, which keeps the
+    # concurrency limits, the leases keep effects from being taken twice
+    claims = OutboxClaims(ttl=config.OUTBOX_RUN_TTL_SECONDS)
+    if not claims.claim("run"):
+        return None
+    try:
+        counts = drain_outbox(session)
+    finally:
+        claims.release("run")
+    if counts["messages"]:
+        print(f"Processed outbox {counts}")
+    return counts
@@ -0,0 +1,241 @@
+import time
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple, Union
+from uuid import UUID
+from sqlalchemy import and_, bindparam, case, or_
+from sqlalchemy.orm.session import Session
+from digirent.core import config
+from digirent.core.services.payment_gateway import (
+    Payment,
+    PaymentGateway,
+    PaymentGatewayError,
+    get_payment_gateway,
+)
+from digirent.database.billing import apply_invoice_statuses
+from digirent.database.enums import InvoiceStatus, InvoiceType
+from digirent.database.models import Invoice, PaymentWebhookEvent
+from digirent.worker.db import db_task
+
+
+def payment_invoice_id(payment: Payment) -> Optional[UUID]:
+    metadata = payment.metadata or {}
+    try:
+        InvoiceType(metadata.get("type"))
+        return UUID(metadata["invoice_id"])
+    except (KeyError, TypeError, ValueError):
+        print(f"Payment {payment.id} has no valid invoice metadata")
+        return None
+
+
+def invoice_transition(payment: Payment) -> Optional[InvoiceStatus]:
+    """The status a payment moves its invoice to, None while it is in progress"""
+    if payment.is_paid():
+        return InvoiceStatus.PAID
+    if payment.is_pending() or payment.is_open():
+        return None
+    return InvoiceStatus.FAILED
+
+
+def apply_invoice_transitions(
+    session: Session, invoice_payments: List[Tuple[UUID, Payment]]
+) -> dict:
+    """Update invoices to the status of their payment in bulk"""
+    statuses = {}
+    for invoice_id, payment in invoice_payments:
+        status = invoice_transition(payment)
+        if status:
+            statuses[invoice_id] = status
+    return apply_invoice_statuses(session, statuses)
+
+
+def pending_webhook_events(session: Session, after_id: Optional[UUID], limit: int):
+    query = session.query(
+        PaymentWebhookEvent.id,
+        PaymentWebhookEvent.payment_id,
+        PaymentWebhookEvent.version,
+    ).filter(PaymentWebhookEvent.processed_at.is_(None))
+    if after_id:
+        query = query.filter(PaymentWebhookEvent.id > after_id)
+    return query.order_by(PaymentWebhookEvent.id).limit(limit).all()
+
+
+def process_webhook_events(
+    session: Session,
+    events: list,
+    payment_gateway: PaymentGateway,
+    max_attempts: int = config.PAYMENT_WEBHOOK_MAX_ATTEMPTS,
+) -> dict:
+    """
+    Fetch the payments of a batch of inbox events concurrently, apply the
+    resulting invoice transitions and mark the events processed. An event
+    notified again while it was being processed has a newer version and is
+    left pending for the next run.
+    """
+    payments: List[Union[Payment, PaymentGatewayError]] = payment_gateway.get_payments(
+        [event.payment_id for event in events]
+    )
+    fetched = [payment for payment in payments if isinstance(payment, Payment)]
+    invoice_payments = [(payment_invoice_id(payment), payment) for payment in fetched]
+    counts = apply_invoice_transitions(
+        session, [pair for pair in invoice_payments if pair[0] is not None]
+    )
+    counts["events"] = len(events)
+    counts["errors"] = len(events) - len(fetched)
+
+    table = PaymentWebhookEvent.__table__
+    matches_event = and_(
+        table.c.id == bindparam("event_id"),
+        table.c.version == bindparam("event_version"),
+    )
+    now = datetime.utcnow()
+    processed = [
+        {"event_id": event.id, "event_version": event.version}
+        for event, payment in zip(events, payments)
+        if isinstance(payment, Payment)
+    ]
+    errored = [
+        {"event_id": event.id, "event_version": event.version, "error": str(payment)}
+        for event, payment in zip(events, payments)
+        if isinstance(payment, PaymentGatewayError)
+    ]
+    if processed:
+        session.execute(
+            table.update().where(matches_event).values(processed_at=now), processed
+        )
+    if errored:
+        session.execute(
+            table.update()
+            .where(matches_event)
+            .values(
+                attempts=table.c.attempts + 1,
+                last_error=bindparam("error"),
+                # give up on payments that keep failing to load
+                processed_at=case(
+                    [(table.c.attempts + 1 >= max_attempts, now)], else_=None
+                ),
+            ),
+            errored,
+        )
+    return counts
+
+
+@db_task
+def process_payment_webhooks(*args, session: Session):
+    payment_gateway = get_payment_gateway()
+    counts = {"events": 0, "paid": 0, "failed": 0, "errors": 0}
+    after_id = None
+    while True:
+        events = pending_webhook_events(
+            session, after_id, config.PAYMENT_WEBHOOK_BATCH_SIZE
+        )
+        if not events:
+            break
+        batch_counts = process_webhook_events(session, events, payment_gateway)
+        session.commit()
+        for key, value in batch_counts.items():
+            counts[key] += value
+        after_id = events[-1].id
+    if counts["events"]:
+        print(f"Processed payment webhooks {counts}")
+    return counts
+
+
+def pending_invoices(
+    session: Session,
+    created_before: datetime,
+    after: Optional[Tuple[datetime, UUID]],
+    limit: int,
+):
+    """A keyset page of pending invoices with a payment, ordered by age"""
+    query = (
+        session.query(Invoice.id, Invoice.payment_id, Invoice.created_at)
+        .filter(Invoice.status == InvoiceStatus.PENDING)
+        .filter(Invoice.payment_id.isnot(None))
+        .filter(Invoice.created_at < created_before)
+    )
+    if after:
+        created_at, invoice_id = after
+        query = query.filter(
+            or_(
+                Invoice.created_at > created_at,
+                and_(Invoice.created_at == created_at, Invoice.id > invoice_id),
+            )
+        )
+    return query.order_by(Invoice.created_at, Invoice.id).limit(limit).all()
+
+
+def reconcile_invoices(
+    session: Session, invoices: list, payment_gateway: PaymentGateway
+) -> dict:
+    """Fetch the payments of a page of pending invoices and apply their status"""
+    payments: List[Union[Payment, PaymentGatewayError]] = payment_gateway.get_payments(
+        [invoice.payment_id for invoice in invoices]
+    )
+    counts = apply_invoice_transitions(
+        session,
+        [
+            (invoice.id, payment)
+            for invoice, payment in zip(invoices, payments)
+            if isinstance(payment, Payment)
+        ],
+    )
+    error_payment_ids = [
+        invoice.payment_id
+        for invoice, payment in zip(invoices, payments)
+        if isinstance(payment, PaymentGatewayError)
+    ]
+    counts["checked"] = len(invoices)
+    counts["errors"] = len(error_payment_ids)
+    counts["unchanged"] = (
+        counts["checked"] - counts["paid"] - counts["failed"] - counts["errors"]
+    )
+    counts["error_payment_ids"] = error_payment_ids
+    return counts
+
+
+def reconcile_pending_invoices(
+    session: Session,
+    payment_gateway: PaymentGateway,
+    min_age: timedelta = timedelta(
+        minutes=config.PAYMENT_RECONCILIATION_MIN_AGE_MINUTES
+    ),
+    batch_size: int = config.PAYMENT_RECONCILIATION_BATCH_SIZE,
+) -> dict:
+    """
+    Bring pending invoices older than min_age in line with their payment,
+    catching up on webhooks that never arrived. Every page is committed on its
+    own so a failing run keeps the progress it made.
+    """
+    started = time.monotonic()
+    created_before = datetime.utcnow() - min_age
+    report = {
+        "checked": 0,
+        "paid": 0,
+        "failed": 0,
+        "unchanged": 0,
+        "errors": 0,
+        "batches": 0,
+        "error_payment_ids": [],
+    }
+    after = None
+    while True:
+        invoices = pending_invoices(session, created_before, after, batch_size)
+        if not invoices:
+            break
+        counts = reconcile_invoices(session, invoices, payment_gateway)
+        session.commit()
+        for key, value in counts.items():
+            report[key] += value
+        report["batches"] += 1
+        after = (invoices[-1].created_at, invoices[-1].id)
+    # keep the report small enough for the result backend
+    report["error_payment_ids"] = report["error_payment_ids"][:20]
+    report["seconds"] = round(time.monotonic() - started, 3)
+    return report
+
+
+@db_task
+def reconcile_payments(*args, session: Session):
+    report = reconcile_pending_invoices(session, get_payment_gateway())
+    print(f"Reconciled pending invoices {report}")
+    return report
@@ -1,62 +1,86 @@
-from typing import List
+from datetime import date
 from uuid import UUID
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Query
 from digirent.util import get_current_date
-from digirent.database import models
-from digirent.database.enums import (
-    ApartmentApplicationStatus,
-    InvoiceType,
-)
-from digirent.database.models import ApartmentApplication, Invoice
-from digirent.worker.app import app
-from digirent.database.base import SessionLocal
+from digirent.database.enums import ApartmentApplicationStatus, InvoiceType
+from digirent.database.models import ApartmentApplication, BillingState
 from sqlalchemy.orm.session import Session
+from .db import db_task
+from .dispatch import DispatchClaims, billing_key, dispatch_in_chunks
 from .helper import create_rent_payment
 
 
-@app.task
-def create_rent_invoice(apartment_application_id: UUID):
-    session: Session = SessionLocal()
+@db_task
+def create_rent_invoice(
+    apartment_application_id: UUID, billing_period: str = None, *, session: Session
+):
+    """
+    Create the rent invoice and payment of an apartment application.
+    With billing_period the invoice is keyed on it, a second call for the
+    same period is skipped instead of charging the tenant twice.
+    """
+    idempotency_key = (
+        billing_key(
+            InvoiceType.RENT,
+            apartment_application_id,
+            date.fromisoformat(billing_period),
+        )
+        if billing_period
+        else None
+    )
     try:
         apartment_application = session.query(ApartmentApplication).get(
             apartment_application_id
         )
         print("\n\n\n\n\nStarting create rent invoice")
-        create_rent_payment(session, apartment_application)
+        create_rent_payment(session, apartment_application, idempotency_key)
         session.commit()
         print("\n\n\n\nEnd create rent invoice")
-    except Exception:
+        return "created"
+    except IntegrityError:
         session.rollback()
-    finally:
-        session.close()
+        print(f"Rent invoice {idempotency_key} already exists")
+        return "skipped"
+    except Exception:
+        # released so the next run dispatches it again, task_session rolls
+        # back and records the failure
+        if idempotency_key:
+            DispatchClaims().release(idempotency_key)
+        raise
 
 
-@app.task
-def generate_rent_invoices(*args):
-    session: Session = SessionLocal()
-    try:
-        print("\n\n\n\n\nStarting rent invoice worker")
-        all_completed_apartment_applications: List[models.ApartmentApplication] = (
-            session.query(models.ApartmentApplication)
-            .filter(
-                models.ApartmentApplication.status
-                == ApartmentApplicationStatus.COMPLETED
-            )
-            .all()
+def due_rent_applications(session: Session, current_date: date) -> Query:
+    """
+    Ids of completed apartment applications whose latest rent invoice is due,
+    with the due date which is the billing period to invoice.
+
+    The due date is read from the application's billing state, served by its
+    next_due_date index, and completion from the application's persisted
+    status. Applications without a rent invoice have no billing state and
+    are skipped, their first invoice is created when the application is
+    awarded.
+    """
+    return (
+        session.query(ApartmentApplication.id, BillingState.next_due_date)
+        .join(
+            BillingState,
+            BillingState.apartment_application_id == ApartmentApplication.id,
         )
-        for apartment_application in all_completed_apartment_applications:
-            latest_invoice: Invoice = (
-                session.query(Invoice)
-                .filter(Invoice.type == InvoiceType.RENT)
-                .filter(Invoice.apartment_application_id == apartment_application.id)
-                .order_by(Invoice.created_at.desc())
-                .first()
-            )
-            current_date = get_current_date()
-            if latest_invoice.next_date <= current_date:
-                # current date is greater than or equal to last invoice's next date
-                create_rent_invoice.delay(apartment_application.id)
-        print("\n\n\n\nEnd rent invoice worker")
-    except Exception:
-        session.rollback()
-    finally:
-        session.close()
+        .filter(BillingState.next_due_date <= current_date)
+        .filter(ApartmentApplication.status == ApartmentApplicationStatus.COMPLETED)
+    )
+
+
+@db_task
+def generate_rent_invoices(*args, session: Session):
+    print("\n\n\n\n\nStarting rent invoice worker")
+    due_applications = due_rent_applications(session, get_current_date())
+    counts = dispatch_in_chunks(
+        create_rent_invoice,
+        InvoiceType.RENT,
+        due_applications.yield_per(500),
+        queue="rent-queue",
+    )
+    print(f"\n\n\n\nEnd rent invoice worker {counts}")
+    return counts
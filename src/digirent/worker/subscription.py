@@ -1,55 +1,86 @@
-from typing import List
+from datetime import date
 from uuid import UUID
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Query
+from digirent.core import config
 from digirent.util import get_current_date
 from digirent.database.enums import (
     InvoiceType,
     UserRole,
 )
-from digirent.database.models import User, Invoice
-from digirent.worker.app import app
-from digirent.database.base import SessionLocal
+from digirent.database.models import BillingState, User
 from sqlalchemy.orm.session import Session
+from .db import db_task
+from .dispatch import DispatchClaims, billing_key, dispatch_in_chunks
 from .helper import create_subscription_payment
 
 
-@app.task
-def create_subscription_invoice(user_id: UUID):
-    session: Session = SessionLocal()
+@db_task
+def create_subscription_invoice(
+    user_id: UUID, billing_period: str = None, *, session: Session
+):
+    """
+    Create the subscription invoice and payment of a user.
+    With billing_period the invoice is keyed on it, a second call for the
+    same period is skipped instead of charging the user twice.
+    """
+    idempotency_key = (
+        billing_key(
+            InvoiceType.SUBSCRIPTION, user_id, date.fromisoformat(billing_period)
+        )
+        if billing_period
+        else None
+    )
     try:
         user = session.query(User).get(user_id)
         print("\n\n\n\n\nStarting create subscription invoice")
-        create_subscription_payment(session, user)
+        create_subscription_payment(session, user, idempotency_key)
         session.commit()
         print("\n\n\n\nEnd create subscription invoice")
-    except Exception:
+        return "created"
+    except IntegrityError:
         session.rollback()
-    finally:
-        session.close()
+        print(f"Subscription invoice {idempotency_key} already exists")
+        return "skipped"
+    except Exception:
+        # released so the next run dispatches it again, task_session rolls
+        # back and records the failure
+        if idempotency_key:
+            DispatchClaims().release(idempotency_key)
+        raise
 
 
-@app.task
-def generate_subscription_invoices(*args):
-    session: Session = SessionLocal()
-    try:
-        print("\n\n\n\n\nStarting subscription invoice worker")
-        # ? should be active users TODO
-        non_admin_users: List[User] = (
-            session.query(User).filter(User.role != UserRole.ADMIN).all()
-        )
-        for user in non_admin_users:
-            latest_invoice: Invoice = (
-                session.query(Invoice)
-                .filter(Invoice.type == InvoiceType.SUBSCRIPTION)
-                .filter(Invoice.user_id == user.id)
-                .order_by(Invoice.created_at.desc())
-                .first()
-            )
-            current_date = get_current_date()
-            if latest_invoice.next_date <= current_date:
-                # current date is greater than or equal to last invoice's next date
-                create_subscription_invoice.delay(user.id)
-        print("\n\n\n\nEnd subscription invoice worker")
-    except Exception:
-        session.rollback()
-    finally:
-        session.close()
+def due_subscriptions(session: Session, current_date: date) -> Query:
+    """
+    Ids of active non admin users whose latest subscription invoice is due,
+    with the due date which is the billing period to invoice.
+
+    Like due_rent_applications, the due date is read from the user's billing
+    state. Active is User.is_active in SQL: not suspended and email verified.
+    Users without a subscription invoice have no billing state and are
+    skipped.
+    """
+    return (
+        session.query(User.id, BillingState.next_due_date)
+        .join(BillingState, BillingState.user_id == User.id)
+        .filter(BillingState.next_due_date <= current_date)
+        .filter(User.role != UserRole.ADMIN)
+        .filter(User.is_suspended.is_(False))
+        .filter(User.email_verified.is_(True))
+    )
+
+
+@db_task
+def generate_subscription_invoices(*args, session: Session):
+    print("\n\n\n\n\nStarting subscription invoice worker")
+    counts = dispatch_in_chunks(
+        create_subscription_invoice,
+        InvoiceType.SUBSCRIPTION,
+        # yield_per streams rows from a server side cursor
+        due_subscriptions(session, get_current_date()).yield_per(
+            config.SUBSCRIPTION_DISPATCH_FETCH_SIZE
+        ),
+        queue="subscription-queue",
+    )
+    print(f"\n\n\n\nEnd subscription invoice worker {counts}")
+    return counts
@@ -22,7 +22,7 @@ def new_apartment_application(
 def rejected_apartment_application(
     new_apartment_application: ApartmentApplication, session: Session
 ) -> ApartmentApplication:
-    new_apartment_application.is_rejected = True
+    new_apartment_application.transition_to(ApartmentApplicationStatus.REJECTED)
     session.commit()
     assert new_apartment_application.status == ApartmentApplicationStatus.REJECTED
     return new_apartment_application
@@ -32,7 +32,7 @@ def rejected_apartment_application(
 def considered_apartment_application(
     new_apartment_application: ApartmentApplication, session: Session
 ):
-    new_apartment_application.is_considered = True
+    new_apartment_application.transition_to(ApartmentApplicationStatus.CONSIDERED)
     session.commit()
     assert new_apartment_application.status == ApartmentApplicationStatus.CONSIDERED
     return new_apartment_application
@@ -44,6 +44,9 @@ def new_contract(
 ):
     contract = Contract(apartment_application_id=considered_apartment_application.id)
     session.add(contract)
+    considered_apartment_application.transition_to(
+        ApartmentApplicationStatus.PROCESSING
+    )
     session.commit()
     assert contract.status == ContractStatus.NEW
     return contract
@@ -66,6 +69,7 @@ def signed_contract(
     contract: Contract = process_apartment_application.contract
     contract.tenant_has_signed = True
     contract.landlord_has_signed = True
+    process_apartment_application.transition_to(ApartmentApplicationStatus.AWARDED)
     session.commit()
     assert contract.status == ContractStatus.SIGNED
     assert process_apartment_application.status == ApartmentApplicationStatus.AWARDED
@@ -78,9 +82,15 @@ def completed_contract(signed_contract: Contract, session: Session):
     signed_contract.landlord_has_signed = True
     signed_contract.landlord_has_provided_keys = True
     signed_contract.tenant_has_received_keys = True
+    signed_contract.apartment_application.transition_to(
+        ApartmentApplicationStatus.COMPLETED
+    )
     session.commit()
     assert signed_contract.status == ContractStatus.COMPLETED
-    assert process_apartment_application.status == ApartmentApplicationStatus.COMPLETED
+    assert (
+        signed_contract.apartment_application.status
+        == ApartmentApplicationStatus.COMPLETED
+    )
     return signed_contract
 
 
@@ -99,6 +109,7 @@ def failed_apartment_application(
     assert process_apartment_application.status == ApartmentApplicationStatus.PROCESSING
     process_apartment_application.contract.canceled = True
     process_apartment_application.contract.canceled_on = datetime.utcnow()
+    process_apartment_application.transition_to(ApartmentApplicationStatus.FAILED)
     session.commit()
     assert process_apartment_application.status == ApartmentApplicationStatus.FAILED
     return process_apartment_application
@@ -131,7 +142,9 @@ def another_new_apartment_application(
 def another_considered_apartment_application(
     another_new_apartment_application: ApartmentApplication, session: Session
 ):
-    another_new_apartment_application.is_considered = True
+    another_new_apartment_application.transition_to(
+        ApartmentApplicationStatus.CONSIDERED
+    )
     session.commit()
     assert (
         another_new_apartment_application.status
@@ -3,6 +3,7 @@ from typing import List
 from digirent.database.enums import (
     ApartmentApplicationStatus,
     ContractStatus,
+    OutboxEffect,
 )
 from digirent.app.error import ApplicationError
 import pytest
@@ -13,6 +14,7 @@ from digirent.database.models import (
     Apartment,
     ApartmentApplication,
     Contract,
+    OutboxMessage,
     Tenant,
 )
 
@@ -78,6 +80,12 @@ def test_landlord_start_move_in_process_ok(
     assert session.query(Contract).count() == 1
     contract: Contract = session.query(Contract).all()[0]
     assert contract.status == ContractStatus.NEW
+    message: OutboxMessage = session.query(OutboxMessage).one()
+    assert message.effect == OutboxEffect.CONTRACT_SIGN_REQUEST
+    assert message.payload["apartment_application_id"] == str(
+        considered_apartment_application.id
+    )
+    assert not message.processed_at
 
 
 def test_tenant_sign_contract_for_move_in_process_ok(
@@ -180,7 +188,10 @@ def test_all_other_applications_rejected_on_application_completed_ok(
     )
     assert app3.status == ApartmentApplicationStatus.AWARDED
     application.provide_keys_to_tenant(session, app3)
-    application.tenant_receive_keys(session, app3)
+    _, rejected_application_ids = application.tenant_receive_keys(session, app3)
+    assert sorted(rejected_application_ids) == sorted(
+        app.id for app in (app2, app4, app5)
+    )
     assert all(
         app.status == ApartmentApplicationStatus.REJECTED
         for app in (app1, app2, app4, app5)
@@ -400,7 +400,7 @@ def new_apartment_application(
 def rejected_apartment_application(
     new_apartment_application: ApartmentApplication, session: Session
 ) -> ApartmentApplication:
-    new_apartment_application.is_rejected = True
+    new_apartment_application.transition_to(ApartmentApplicationStatus.REJECTED)
     session.commit()
     assert new_apartment_application.status == ApartmentApplicationStatus.REJECTED
     return new_apartment_application
@@ -410,7 +410,7 @@ def rejected_apartment_application(
 def considered_apartment_application(
     new_apartment_application: ApartmentApplication, session: Session
 ):
-    new_apartment_application.is_considered = True
+    new_apartment_application.transition_to(ApartmentApplicationStatus.CONSIDERED)
     session.commit()
     assert new_apartment_application.status == ApartmentApplicationStatus.CONSIDERED
     return new_apartment_application
@@ -422,6 +422,9 @@ def new_contract(
 ):
     contract = Contract(apartment_application_id=considered_apartment_application.id)
     session.add(contract)
+    considered_apartment_application.transition_to(
+        ApartmentApplicationStatus.PROCESSING
+    )
     session.commit()
     assert contract.status == ContractStatus.NEW
     return contract
@@ -444,6 +447,7 @@ def signed_contract(
     contract: Contract = process_apartment_application.contract
     contract.tenant_has_signed = True
     contract.landlord_has_signed = True
+    process_apartment_application.transition_to(ApartmentApplicationStatus.AWARDED)
     session.commit()
     assert contract.status == ContractStatus.SIGNED
     assert process_apartment_application.status == ApartmentApplicationStatus.AWARDED
@@ -456,9 +460,15 @@ def completed_contract(signed_contract: Contract, session: Session):
     signed_contract.landlord_has_signed = True
     signed_contract.landlord_has_provided_keys = True
     signed_contract.tenant_has_received_keys = True
+    signed_contract.apartment_application.transition_to(
+        ApartmentApplicationStatus.COMPLETED
+    )
     session.commit()
     assert signed_contract.status == ContractStatus.COMPLETED
-    assert process_apartment_application.status == ApartmentApplicationStatus.COMPLETED
+    assert (
+        signed_contract.apartment_application.status
+        == ApartmentApplicationStatus.COMPLETED
+    )
     return signed_contract
 
 
@@ -486,7 +496,7 @@ def another_considered_application(
     another_tenant: Tenant, apartment: Apartment, session: Session
 ) -> ApartmentApplication:
     app = ApartmentApplication(tenant_id=another_tenant.id, apartment_id=apartment.id)
-    app.is_considered = True
+    app.transition_to(ApartmentApplicationStatus.CONSIDERED)
     session.add(app)
     session.commit()
     assert app.status == ApartmentApplicationStatus.CONSIDERED
@@ -1,7 +1,23 @@
+from datetime import datetime
+from uuid import uuid4
 from fastapi.testclient import TestClient
+from sqlalchemy import event
 from sqlalchemy.orm.session import Session
-from digirent.database.enums import ApartmentApplicationStatus, ContractStatus
-from digirent.database.models import Landlord, Tenant, Apartment, ApartmentApplication
+from digirent.database.enums import (
+    ApartmentApplicationStatus,
+    ContractStatus,
+    OutboxEffect,
+)
+from digirent.app import Application
+from digirent.database.models import (
+    Landlord,
+    Tenant,
+    Apartment,
+    ApartmentApplication,
+    OutboxMessage,
+    SignrequestWebhookEvent,
+)
+from digirent.worker.contracts import process_signrequest_events
 
 
 def test_tenant_apply_for_apartment_ok(
@@ -125,6 +141,195 @@ def test_another_landlord_consider_tenants_application_fail(
     assert new_apartment_application.status == ApartmentApplicationStatus.NEW
 
 
+def test_landlord_bulk_reject_applications_ok(
+    client: TestClient,
+    session: Session,
+    landlord: Landlord,
+    landlord_auth_header: dict,
+    new_apartment_application: ApartmentApplication,
+    another_new_apartment_application: ApartmentApplication,
+):
+    landlord.email_verified = True
+    session.commit()
+    another_new_apartment_application.transition_to(
+        ApartmentApplicationStatus.CONSIDERED
+    )
+    session.commit()
+    unknown_id = str(uuid4())
+    response = client.post(
+        "/api/applications/bulk/reject",
+        json={
+            "applicationIds": [
+                str(new_apartment_application.id),
+                str(another_new_apartment_application.id),
+                unknown_id,
+            ]
+        },
+        headers=landlord_auth_header,
+    )
+    assert response.status_code == 200
+    assert response.json() == [
+        {"id": str(new_apartment_application.id), "outcome": "rejected"},
+        {"id": str(another_new_apartment_application.id), "outcome": "invalid_status"},
+        {"id": unknown_id, "outcome": "not_found"},
+    ]
+    session.expire_all()
+    assert new_apartment_application.status == ApartmentApplicationStatus.REJECTED
+    assert new_apartment_application.is_rejected
+    assert (
+        another_new_apartment_application.status
+        == ApartmentApplicationStatus.CONSIDERED
+    )
+    emails = (
+        session.query(OutboxMessage)
+        .filter(OutboxMessage.effect == OutboxEffect.EMAIL)
+        .all()
+    )
+    assert [email.payload["to"] for email in emails] == [
+        new_apartment_application.tenant.email
+    ]
+
+
+def test_another_landlord_bulk_consider_applications_fail(
+    client: TestClient,
+    session: Session,
+    another_landlord: Landlord,
+    another_landlord_auth_header: dict,
+    new_apartment_application: ApartmentApplication,
+):
+    another_landlord.email_verified = True
+    session.commit()
+    response = client.post(
+        "/api/applications/bulk/consider",
+        json={"applicationIds": [str(new_apartment_application.id)]},
+        headers=another_landlord_auth_header,
+    )
+    assert response.status_code == 200
+    assert response.json() == [
+        {"id": str(new_apartment_application.id), "outcome": "not_found"}
+    ]
+    session.expire_all()
+    assert new_apartment_application.status == ApartmentApplicationStatus.NEW
+
+
+def test_landlord_fetch_apartment_applications_page(
+    client: TestClient,
+    session: Session,
+    landlord: Landlord,
+    landlord_auth_header: dict,
+    process_apartment_application: ApartmentApplication,
+    another_new_apartment_application: ApartmentApplication,
+):
+    landlord.email_verified = True
+    process_apartment_application.created_at = datetime(2026, 10, 1)
+    another_new_apartment_application.created_at = datetime(2026, 10, 2)
+    session.commit()
+    statements = []
+
+    def count_statement(*args):
+        statements.append(1)
+
+    event.listen(session.get_bind(), "before_cursor_execute", count_statement)
+    url = f"/api/applications/apartments/{process_apartment_application.apartment_id}"
+    response = client.get(url, params={"page_size": 1}, headers=landlord_auth_header)
+    assert response.status_code == 200
+    result = response.json()
+    assert [application["id"] for application in result["data"]] == [
+        str(another_new_apartment_application.id)
+    ]
+    assert result["data"][0]["apartment"]["name"] == (
+        another_new_apartment_application.apartment.name
+    )
+    assert result["data"][0]["tenant"]["email"] == (
+        another_new_apartment_application.tenant.email
+    )
+    assert result["data"][0]["contract"] is None
+    del statements[:]
+    response = client.get(
+        url,
+        params={"page_size": 1, "cursor": result["nextCursor"]},
+        headers=landlord_auth_header,
+    )
+    assert response.status_code == 200
+    result = response.json()
+    assert [application["id"] for application in result["data"]] == [
+        str(process_apartment_application.id)
+    ]
+    assert result["data"][0]["contract"]["status"] == ContractStatus.NEW.value
+    assert result["nextCursor"] is None
+    one_application_statements = len(statements)
+    del statements[:]
+    response = client.get(url, params={"page_size": 2}, headers=landlord_auth_header)
+    assert len(response.json()["data"]) == 2
+    # the contract, apartment and tenant come with the page query
+    assert len(statements) == one_application_statements
+    event.remove(session.get_bind(), "before_cursor_execute", count_statement)
+    response = client.get(
+        url, params={"status": "processing"}, headers=landlord_auth_header
+    )
+    assert [application["id"] for application in response.json()["data"]] == [
+        str(process_apartment_application.id)
+    ]
+
+
+def test_another_landlord_fetch_apartment_applications_page_fail(
+    client: TestClient,
+    session: Session,
+    another_landlord: Landlord,
+    another_landlord_auth_header: dict,
+    new_apartment_application: ApartmentApplication,
+):
+    another_landlord.email_verified = True
+    session.commit()
+    response = client.get(
+        f"/api/applications/apartments/{new_apartment_application.apartment_id}",
+        headers=another_landlord_auth_header,
+    )
+    assert response.status_code == 404
+
+
+def test_fetch_my_apartment_applications_page(
+    client: TestClient,
+    session: Session,
+    tenant: Tenant,
+    tenant_auth_header: dict,
+    landlord: Landlord,
+    landlord_auth_header: dict,
+    new_apartment_application: ApartmentApplication,
+    another_new_apartment_application: ApartmentApplication,
+):
+    tenant.email_verified = True
+    landlord.email_verified = True
+    session.commit()
+    response = client.get("/api/me/applications", headers=tenant_auth_header)
+    assert response.status_code == 200
+    assert [application["id"] for application in response.json()["data"]] == [
+        str(new_apartment_application.id)
+    ]
+    response = client.get(
+        "/api/me/applications",
+        params={"status": "new"},
+        headers=landlord_auth_header,
+    )
+    assert response.status_code == 200
+    assert {application["id"] for application in response.json()["data"]} == {
+        str(new_apartment_application.id),
+        str(another_new_apartment_application.id),
+    }
+    response = client.get(
+        "/api/me/applications",
+        params={"status": "rejected"},
+        headers=landlord_auth_header,
+    )
+    assert response.json()["data"] == []
+    response = client.get(
+        "/api/me/applications",
+        params={"cursor": "not a cursor"},
+        headers=landlord_auth_header,
+    )
+    assert response.status_code == 400
+
+
 def test_landlord_fetch_apartment_applications(
     client: TestClient,
     apartment: Apartment,
@@ -418,6 +623,159 @@ def test_event_handler_tenant_signed_document(client: TestClient):
     assert response.status_code == 200
 
 
+def signrequest_event(
+    event_type: str, apartment_application_id, timestamp: str, signers: list
+) -> dict:
+    return {
+        "uuid": str(uuid4()),
+        "status": "ok",
+        "event_type": event_type,
+        "timestamp": timestamp,
+        "event_hash": uuid4().hex,
+        "document": {
+            "uuid": str(uuid4()),
+            "external_id": str(apartment_application_id),
+            "status": "si",
+            "signrequest": {
+                "signers": [
+                    {
+                        "email": email,
+                        "needs_to_sign": True,
+                        "signed": True,
+                        "signed_on": timestamp,
+                        "declined": False,
+                        "declined_on": None,
+                    }
+                    for email in signers
+                ]
+            },
+        },
+    }
+
+
+def test_contract_webhook_records_events_once(
+    client: TestClient,
+    session: Session,
+    process_apartment_application: ApartmentApplication,
+):
+    tenant_email = process_apartment_application.tenant.email
+    event = signrequest_event(
+        "signer_signed",
+        process_apartment_application.id,
+        "2020-10-23T11:40:13Z",
+        [tenant_email],
+    )
+    for _ in range(3):
+        response = client.post("/api/applications/contract", json=event)
+        assert response.status_code == 200
+    viewed = signrequest_event(
+        "signer_viewed",
+        process_apartment_application.id,
+        "2020-10-23T11:41:13Z",
+        [tenant_email],
+    )
+    response = client.post("/api/applications/contract", json=viewed)
+    assert response.status_code == 200
+    events = session.query(SignrequestWebhookEvent).all()
+    assert len(events) == 1
+    assert str(events[0].event_uuid) == event["uuid"]
+    assert events[0].apartment_application_id == process_apartment_application.id
+    assert events[0].signers[0]["email"] == tenant_email
+    assert events[0].processed_at is None
+    session.expire_all()
+    assert not process_apartment_application.contract.tenant_has_signed
+
+
+def test_contract_webhook_without_external_id_is_rejected(
+    client: TestClient,
+    session: Session,
+    process_apartment_application: ApartmentApplication,
+):
+    event = signrequest_event(
+        "signer_signed",
+        None,
+        "2020-10-23T11:40:13Z",
+        [process_apartment_application.tenant.email],
+    )
+    event["document"]["external_id"] = None
+    response = client.post("/api/applications/contract", json=event)
+    assert response.status_code == 422
+    assert not session.query(SignrequestWebhookEvent).count()
+
+
+def test_contract_webhook_events_are_applied_in_order(
+    client: TestClient,
+    session: Session,
+    application: Application,
+    process_apartment_application: ApartmentApplication,
+):
+    tenant_email = process_apartment_application.tenant.email
+    landlord_email = process_apartment_application.apartment.landlord.email
+    events = [
+        signrequest_event(
+            "expired",
+            process_apartment_application.id,
+            "2020-10-23T11:45:00Z",
+            [tenant_email, landlord_email],
+        ),
+        signrequest_event(
+            "signed",
+            process_apartment_application.id,
+            "2020-10-23T11:42:00Z",
+            [tenant_email, landlord_email],
+        ),
+        signrequest_event(
+            "signer_signed",
+            process_apartment_application.id,
+            "2020-10-23T11:40:00Z",
+            [tenant_email],
+        ),
+    ]
+    # delivered out of order
+    for webhook_event in events:
+        client.post("/api/applications/contract", json=webhook_event)
+
+    counts = process_signrequest_events(session, application)
+    assert counts == {"events": 3, "applied": 2, "skipped": 1, "errors": 0}
+    session.expire_all()
+    contract = process_apartment_application.contract
+    assert contract.tenant_has_signed
+    assert contract.landlord_has_signed
+    assert not contract.expired
+    assert process_apartment_application.status == ApartmentApplicationStatus.AWARDED
+    expired = (
+        session.query(SignrequestWebhookEvent)
+        .filter(SignrequestWebhookEvent.event_type == "expired")
+        .one()
+    )
+    assert expired.last_error
+    assert (
+        session.query(SignrequestWebhookEvent)
+        .filter(SignrequestWebhookEvent.processed_at.is_(None))
+        .count()
+        == 0
+    )
+    assert process_signrequest_events(session, application)["events"] == 0
+
+
+def test_contract_webhook_run_stops_starting_applications_in_time(
+    client: TestClient, session: Session, application: Application
+):
+    for _ in range(2):
+        client.post(
+            "/api/applications/contract",
+            json=signrequest_event("signed", uuid4(), "2020-10-23T11:42:00Z", []),
+        )
+    counts = process_signrequest_events(session, application, max_seconds=0)
+    assert counts["events"] == 1
+    assert (
+        session.query(SignrequestWebhookEvent)
+        .filter(SignrequestWebhookEvent.processed_at.is_(None))
+        .count()
+        == 1
+    )
+
+
 def test_landlord_confirm_keys_provided_to_tenant(
     client: TestClient,
     session: Session,
@@ -451,3 +809,35 @@ def test_tenant_confirm_received_keys(
     session.expire_all()
     assert awarded_apartment_application.contract.landlord_has_provided_keys
     assert awarded_apartment_application.contract.tenant_has_received_keys
+
+
+def test_tenant_received_keys_rejects_other_applications(
+    client: TestClient,
+    session: Session,
+    tenant: Tenant,
+    tenant_auth_header: dict,
+    awarded_apartment_application: ApartmentApplication,
+    another_new_apartment_application: ApartmentApplication,
+):
+    tenant.email_verified = True
+    awarded_apartment_application.contract.landlord_has_provided_keys = True
+    session.commit()
+    response = client.post(
+        f"/api/applications/{awarded_apartment_application.id}/keys/received",
+        headers=tenant_auth_header,
+    )
+    assert response.status_code == 200
+    session.expire_all()
+    assert awarded_apartment_application.status == ApartmentApplicationStatus.COMPLETED
+    assert (
+        another_new_apartment_application.status == ApartmentApplicationStatus.REJECTED
+    )
+    assert another_new_apartment_application.is_rejected
+    emails = (
+        session.query(OutboxMessage)
+        .filter(OutboxMessage.effect == OutboxEffect.EMAIL)
+        .all()
+    )
+    assert [email.payload["to"] for email in emails] == [
+        another_new_apartment_application.tenant.email
+    ]
@@ -0,0 +1,78 @@
+from datetime import date, timedelta
+from fastapi.testclient import TestClient
+from sqlalchemy.orm.session import Session
+from digirent.database.billing import apply_invoice_statuses, record_invoice
+from digirent.database.enums import InvoiceStatus, InvoiceType
+from digirent.database.models import BillingState, Invoice, Tenant
+
+
+def create_invoice(
+    session: Session, tenant: Tenant, amount: float, next_date: date
+) -> Invoice:
+    invoice = Invoice(
+        type=InvoiceType.SUBSCRIPTION,
+        status=InvoiceStatus.PENDING,
+        user_id=tenant.id,
+        amount=amount,
+        description="Subscription",
+        next_date=next_date,
+    )
+    session.add(invoice)
+    session.flush()
+    record_invoice(session, invoice)
+    session.commit()
+    return invoice
+
+
+def billing_state(session: Session, tenant: Tenant) -> BillingState:
+    session.expire_all()
+    return session.query(BillingState).filter(BillingState.user_id == tenant.id).one()
+
+
+def test_billing_state_follows_invoices(session: Session, tenant: Tenant):
+    today = date.today()
+    first = create_invoice(session, tenant, 10.1, today)
+    second = create_invoice(session, tenant, 20.2, today + timedelta(days=30))
+    state = billing_state(session, tenant)
+    assert state.latest_invoice_id == second.id
+    assert state.latest_invoice_status == InvoiceStatus.PENDING
+    assert state.next_due_date == today + timedelta(days=30)
+    assert state.amount_outstanding == 30.3
+    assert not state.in_arrears
+
+    counts = apply_invoice_statuses(
+        session, {first.id: InvoiceStatus.FAILED, second.id: InvoiceStatus.PAID}
+    )
+    session.commit()
+    assert counts == {"paid": 1, "failed": 1}
+    state = billing_state(session, tenant)
+    assert state.latest_invoice_status == InvoiceStatus.PAID
+    assert state.amount_outstanding == 10.1
+    assert state.amount_in_arrears == 10.1
+    assert state.last_paid_at
+
+    # a paid invoice can not fail, a failed one can still be paid
+    counts = apply_invoice_statuses(
+        session, {first.id: InvoiceStatus.PAID, second.id: InvoiceStatus.FAILED}
+    )
+    session.commit()
+    assert counts == {"paid": 1, "failed": 0}
+    state = billing_state(session, tenant)
+    assert state.amount_outstanding == 0
+    assert state.amount_in_arrears == 0
+
+
+def test_fetch_my_billing(
+    client: TestClient, session: Session, tenant: Tenant, tenant_auth_header: dict
+):
+    response = client.get("/api/me/billing", headers=tenant_auth_header)
+    assert response.status_code == 200
+    assert response.json() == {"subscription": None, "tenancies": []}
+    invoice = create_invoice(session, tenant, 10, date.today())
+    response = client.get("/api/me/billing", headers=tenant_auth_header)
+    assert response.status_code == 200
+    subscription = response.json()["subscription"]
+    assert subscription["latestInvoiceId"] == str(invoice.id)
+    assert subscription["amountOutstanding"] == 10
+    assert subscription["nextDueDate"] == date.today().isoformat()
+    assert not subscription["inArrears"]
@@ -0,0 +1,126 @@
+import asyncio
+import json
+from types import SimpleNamespace
+from uuid import uuid4
+import pytest
+from digirent.api.chat import codec
+from digirent.api.chat.chat import ChatEventType, ChatManager, chat_event
+from digirent.api.chat.codec import ChatEncoding
+
+
+class FakeWebSocket:
+    def __init__(self, user_id, send_delay: float = 0):
+        self.state = SimpleNamespace(user=SimpleNamespace(id=user_id))
+        self.send_delay = send_delay
+        self.frames = []
+        self.close_code = None
+
+    @property
+    def sent(self):
+        events = []
+        for frame in self.frames:
+            if isinstance(frame, bytes):
+                frame = codec.decode(ChatEncoding.MSGPACK, frame)
+            else:
+                frame = json.loads(frame)
+            events.extend(frame if isinstance(frame, list) else [frame])
+        return events
+
+    async def send_text(self, data):
+        await asyncio.sleep(self.send_delay)
+        self.frames.append(data)
+
+    async def send_bytes(self, data):
+        await asyncio.sleep(self.send_delay)
+        self.frames.append(data)
+
+    async def close(self, code=1000):
+        self.close_code = code
+
+
+def run(coroutine):
+    return asyncio.get_event_loop().run_until_complete(coroutine)
+
+
+def message_event(to_user_id) -> dict:
+    return chat_event(ChatEventType.MESSAGE, {"to": str(to_user_id), "message": "hi"})
+
+
+def test_events_are_delivered_through_send_queue():
+    async def scenario():
+        chat_manager = ChatManager(heartbeat_interval=10, idle_timeout=30)
+        websocket = FakeWebSocket(uuid4())
+        await chat_manager.connect(websocket)
+        chat_manager.send_to_user(websocket.state.user.id, message_event(uuid4()))
+        await asyncio.sleep(0.01)
+        chat_manager.disconnect(websocket)
+        return chat_manager, websocket
+
+    chat_manager, websocket = run(scenario())
+    assert len(websocket.sent) == 1
+    assert websocket.sent[0]["eventType"] == ChatEventType.MESSAGE
+    assert not chat_manager.chat_users
+
+
+def test_slow_consumer_does_not_block_sender_and_is_evicted():
+    async def scenario():
+        chat_manager = ChatManager(
+            max_queue_size=4,
+            high_water_mark=2,
+            slow_consumer_timeout=10,
+            heartbeat_interval=10,
+            idle_timeout=30,
+        )
+        slow_websocket = FakeWebSocket(uuid4(), send_delay=10)
+        await chat_manager.connect(slow_websocket)
+        for _ in range(5):
+            chat_manager.send_to_user(
+                slow_websocket.state.user.id, message_event(uuid4())
+            )
+        await asyncio.sleep(0.01)
+        return chat_manager, slow_websocket
+
+    chat_manager, slow_websocket = run(asyncio.wait_for(scenario(), timeout=1))
+    assert slow_websocket.close_code == 1008
+    assert not chat_manager.chat_users
+    assert chat_manager.stats["evictions"] == 1
+
+
+def test_idle_connection_is_pinged_then_evicted():
+    async def scenario():
+        chat_manager = ChatManager(heartbeat_interval=0.01, idle_timeout=0.035)
+        websocket = FakeWebSocket(uuid4())
+        await chat_manager.connect(websocket)
+        await asyncio.sleep(0.1)
+        return chat_manager, websocket
+
+    chat_manager, websocket = run(scenario())
+    assert any(event["eventType"] == ChatEventType.PING for event in websocket.sent)
+    assert websocket.close_code == 1008
+    assert chat_manager.stats["evictions"] == 1
+    assert chat_manager.stats["connections"] == 0
+
+
+@pytest.mark.skipif(
+    ChatEncoding.MSGPACK not in codec.supported_encodings(),
+    reason="msgpack is not installed",
+)
+def test_msgpack_events_are_coalesced_into_one_frame():
+    async def scenario():
+        chat_manager = ChatManager(
+            heartbeat_interval=10, idle_timeout=30, coalesce_window=0.01
+        )
+        websocket = FakeWebSocket(uuid4())
+        await chat_manager.connect(websocket, ChatEncoding.MSGPACK, batch=True)
+        for _ in range(3):
+            chat_manager.send_to_user(websocket.state.user.id, message_event(uuid4()))
+        await asyncio.sleep(0.05)
+        chat_manager.disconnect(websocket)
+        return websocket
+
+    websocket = run(scenario())
+    assert len(websocket.frames) == 1
+    assert isinstance(websocket.frames[0], bytes)
+    assert [event["eventType"] for event in websocket.sent] == [
+        ChatEventType.MESSAGE
+    ] * 3
@@ -0,0 +1,159 @@
+from contextlib import ExitStack
+from datetime import datetime, timedelta
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.orm.session import Session
+from starlette.websockets import WebSocketDisconnect
+from digirent.api.chat.chat import ChatEventType
+from digirent.database.base import pool_status
+from digirent.database.models import Admin, ChatMessage, Landlord, Tenant, User
+
+
+def token_from_header(auth_header: dict) -> str:
+    return auth_header["Authorization"].split("Bearer")[-1].strip()
+
+
+def verify_users(session: Session, *users: User):
+    for user in users:
+        user.email_verified = True
+    session.commit()
+
+
+def test_chat_websockets_do_not_hold_pooled_connections(
+    client: TestClient,
+    session: Session,
+    tenant: Tenant,
+    landlord: Landlord,
+    admin: Admin,
+    another_tenant: Tenant,
+    another_landlord: Landlord,
+    tenant_auth_header: dict,
+    landlord_auth_header: dict,
+    admin_auth_header: dict,
+    another_tenant_auth_header: dict,
+    another_landlord_auth_header: dict,
+):
+    verify_users(session, tenant, landlord, admin, another_tenant, another_landlord)
+    auth_headers = [
+        tenant_auth_header,
+        landlord_auth_header,
+        admin_auth_header,
+        another_tenant_auth_header,
+        another_landlord_auth_header,
+    ]
+    checked_out_before = pool_status()["checked_out"]
+    with ExitStack() as stack:
+        for auth_header in auth_headers:
+            websocket = stack.enter_context(
+                client.websocket_connect(
+                    f"/api/chat/ws/{token_from_header(auth_header)}"
+                )
+            )
+            event = websocket.receive_json()
+            assert event["eventType"] == ChatEventType.USER_CONNECTED
+            assert pool_status()["checked_out"] == checked_out_before
+
+
+def test_chat_websocket_with_invalid_token_is_closed(client: TestClient):
+    checked_out_before = pool_status()["checked_out"]
+    with pytest.raises(WebSocketDisconnect):
+        with client.websocket_connect("/api/chat/ws/invalidtoken"):
+            pass
+    assert pool_status()["checked_out"] == checked_out_before
+
+
+def test_reconnect_with_last_seen_receives_missed_messages(
+    client: TestClient,
+    session: Session,
+    tenant: Tenant,
+    landlord: Landlord,
+    another_tenant: Tenant,
+    landlord_auth_header: dict,
+):
+    verify_users(session, landlord)
+    now = datetime.utcnow()
+    session.add_all(
+        [
+            ChatMessage(
+                from_user_id=tenant.id,
+                to_user_id=landlord.id,
+                message="seen",
+                created_at=now - timedelta(minutes=10),
+            ),
+            ChatMessage(
+                from_user_id=another_tenant.id,
+                to_user_id=landlord.id,
+                message="missed 1",
+                created_at=now - timedelta(minutes=4),
+            ),
+            ChatMessage(
+                from_user_id=tenant.id,
+                to_user_id=landlord.id,
+                message="missed 2",
+                created_at=now - timedelta(minutes=2),
+            ),
+            ChatMessage(
+                from_user_id=landlord.id,
+                to_user_id=tenant.id,
+                message="sent by landlord",
+                created_at=now - timedelta(minutes=1),
+            ),
+        ]
+    )
+    session.commit()
+    last_seen = (now - timedelta(minutes=5)).isoformat()
+    token = token_from_header(landlord_auth_header)
+    with client.websocket_connect(
+        f"/api/chat/ws/{token}?last_seen={last_seen}"
+    ) as websocket:
+        assert websocket.receive_json()["eventType"] == ChatEventType.USER_CONNECTED
+        event = websocket.receive_json()
+    assert event["eventType"] == ChatEventType.MISSED_MESSAGES
+    assert event["data"]["final"]
+    assert not event["data"]["truncated"]
+    assert [m["message"] for m in event["data"]["messages"]] == [
+        "missed 1",
+        "missed 2",
+    ]
+
+
+def test_unread_counts_follow_messages_and_read_receipts(
+    client: TestClient,
+    session: Session,
+    tenant: Tenant,
+    landlord: Landlord,
+    tenant_auth_header: dict,
+    landlord_auth_header: dict,
+):
+    verify_users(session, tenant, landlord)
+    tenant_token = token_from_header(tenant_auth_header)
+    landlord_token = token_from_header(landlord_auth_header)
+    with client.websocket_connect(f"/api/chat/ws/{tenant_token}") as websocket:
+        websocket.receive_json()
+        for message in ["first", "second"]:
+            websocket.send_json(
+                {
+                    "eventType": ChatEventType.MESSAGE,
+                    "data": {"to": str(landlord.id), "message": message},
+                }
+            )
+            assert websocket.receive_json()["eventType"] == ChatEventType.MESSAGE
+    response = client.get("/api/chat/unread", headers=landlord_auth_header)
+    assert response.status_code == 200
+    result = response.json()
+    assert result["total"] == 2
+    assert result["data"][0]["userId"] == str(tenant.id)
+    assert result["data"][0]["unreadCount"] == 2
+    response = client.get("/api/chat/unread", headers=tenant_auth_header)
+    assert response.json()["total"] == 0
+
+    with client.websocket_connect(f"/api/chat/ws/{landlord_token}") as websocket:
+        websocket.receive_json()
+        websocket.send_json(
+            {"eventType": ChatEventType.READ, "data": {"with": str(tenant.id)}}
+        )
+        event = websocket.receive_json()
+    assert event["eventType"] == ChatEventType.READ
+    assert event["data"]["unread_count"] == 0
+    response = client.get("/api/chat/unread", headers=landlord_auth_header)
+    assert response.json() == {"total": 0, "data": []}
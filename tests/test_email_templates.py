@@ -0,0 +1,45 @@
+import os
+import re
+from types import SimpleNamespace
+import pytest
+from digirent.api.user.router import verification_email
+from digirent.core.services.email_templates import Template, TemplateLoader
+
+
+def test_template_renders_placeholders():
+    template = Template("Hello {{ first_name }}, {{first_name}}! {{{unsubscribe}}}")
+    assert template.names == ["first_name", "first_name"]
+    assert template.render({"first_name": "Ann"}) == "Hello Ann, Ann! {{{unsubscribe}}}"
+    with pytest.raises(KeyError):
+        template.render({})
+
+
+def test_template_loader_escapes_html_and_reloads(tmp_path):
+    (tmp_path / "notice.txt").write_text("Hi {{name}}")
+    (tmp_path / "notice.html").write_text("<p>Hi {{name}}</p>")
+    loader = TemplateLoader(tmp_path, autoreload=True)
+    assert loader.get("notice.txt").render({"name": "<Ann>"}) == "Hi <Ann>"
+    assert (
+        loader.get("notice.html").render({"name": "<Ann>"}) == "<p>Hi &lt;Ann&gt;</p>"
+    )
+    (tmp_path / "notice.txt").write_text("Bye {{name}}")
+    mtime = os.path.getmtime(tmp_path / "notice.txt") + 1
+    os.utime(tmp_path / "notice.txt", (mtime, mtime))
+    assert loader.get("notice.txt").render({"name": "Ann"}) == "Bye Ann"
+    assert loader.get("missing.txt") is None
+
+
+def test_template_loader_compiles_once_without_autoreload(tmp_path):
+    (tmp_path / "notice.txt").write_text("Hi {{name}}")
+    loader = TemplateLoader(tmp_path, autoreload=False)
+    (tmp_path / "notice.txt").write_text("Bye {{name}}")
+    assert loader.get("notice.txt").render({"name": "Ann"}) == "Hi Ann"
+
+
+def test_verification_email_bodies_share_one_token():
+    user = SimpleNamespace(email="ann@digirent.com", first_name="Ann", last_name="Lee")
+    email = verification_email(user)
+    assert email["to"] == "ann@digirent.com"
+    [text_url] = re.findall(r"https?://\S+/verify\?token=[\w.-]+", email["message"])
+    assert f'href="{text_url}"' in email["html"]
+    assert "Hello Ann Lee" in email["html"]
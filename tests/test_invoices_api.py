@@ -0,0 +1,134 @@
+from datetime import date, datetime, timedelta
+from fastapi.testclient import TestClient
+from sqlalchemy.orm.session import Session
+from digirent.core.services.payment_gateway import get_payment_gateway
+from digirent.database.enums import InvoiceStatus, InvoiceType
+from digirent.database.models import Admin, Invoice, Tenant, User
+
+
+def create_invoices(session: Session, user: User, count: int) -> list:
+    now = datetime.utcnow()
+    invoices = [
+        Invoice(
+            type=InvoiceType.SUBSCRIPTION,
+            status=InvoiceStatus.PAID if index % 2 else InvoiceStatus.PENDING,
+            user_id=user.id,
+            amount=10,
+            description="Subscription",
+            payment_id=f"tr_{index}",
+            next_date=date.today(),
+            # two invoices per timestamp so pages split ties on id
+            created_at=now - timedelta(days=index // 2),
+        )
+        for index in range(count)
+    ]
+    session.add_all(invoices)
+    session.commit()
+    return invoices
+
+
+def fetch_pages(client: TestClient, url: str, headers: dict, **params) -> list:
+    pages, cursor = [], None
+    while True:
+        response = client.get(
+            url, headers=headers, params={**params, "cursor": cursor, "page_size": 2}
+        )
+        assert response.status_code == 200
+        pages.append([invoice["id"] for invoice in response.json()["data"]])
+        cursor = response.json()["nextCursor"]
+        if not cursor:
+            return pages
+
+
+def test_fetch_all_invoices_in_pages(
+    client: TestClient,
+    session: Session,
+    tenant: Tenant,
+    admin: Admin,
+    admin_auth_header: dict,
+):
+    invoices = create_invoices(session, tenant, 5)
+    pages = fetch_pages(client, "/api/invoices/", admin_auth_header)
+    newest_first = sorted(
+        invoices, key=lambda invoice: (invoice.created_at, invoice.id)
+    )
+    assert [invoice_id for page in pages for invoice_id in page] == [
+        str(invoice.id) for invoice in reversed(newest_first)
+    ]
+    assert [len(page) for page in pages] == [2, 2, 1]
+    pages = fetch_pages(
+        client, "/api/invoices/", admin_auth_header, status="paid", user_id=tenant.id
+    )
+    assert sorted(invoice_id for page in pages for invoice_id in page) == sorted(
+        str(invoice.id) for invoice in invoices if invoice.status == InvoiceStatus.PAID
+    )
+    response = client.get(
+        "/api/invoices/", headers=admin_auth_header, params={"cursor": "invalid"}
+    )
+    assert response.status_code == 400
+
+
+def test_fetch_my_invoices(
+    client: TestClient,
+    session: Session,
+    tenant: Tenant,
+    tenant_auth_header: dict,
+    admin: Admin,
+):
+    invoices = create_invoices(session, tenant, 3)
+    create_invoices(session, admin, 2)
+    pages = fetch_pages(client, "/api/me/invoices", tenant_auth_header)
+    assert sorted(invoice_id for page in pages for invoice_id in page) == sorted(
+        str(invoice.id) for invoice in invoices
+    )
+    today = date.today().isoformat()
+    pages = fetch_pages(
+        client,
+        "/api/me/invoices",
+        tenant_auth_header,
+        created_from=today,
+        created_to=today,
+    )
+    assert len(pages[0]) == 2
+
+
+def test_invoice_without_payment_yet(
+    client: TestClient,
+    session: Session,
+    tenant: Tenant,
+    admin: Admin,
+    admin_auth_header: dict,
+):
+    (invoice,) = create_invoices(session, tenant, 1)
+    invoice.payment_id = None
+    session.commit()
+    response = client.get("/api/invoices/", headers=admin_auth_header)
+    assert response.status_code == 200
+    assert response.json()["data"][0]["paymentId"] is None
+    response = client.post(
+        f"/api/invoices/{invoice.id}/verify", headers=admin_auth_header
+    )
+    assert response.status_code == 400
+
+
+def test_verify_invoice_applies_the_payment_status(
+    client: TestClient,
+    session: Session,
+    tenant: Tenant,
+    admin: Admin,
+    admin_auth_header: dict,
+):
+    (invoice,) = create_invoices(session, tenant, 1)
+    payment_gateway = get_payment_gateway()
+    invoice.payment_id = payment_gateway.create_payment(
+        {"metadata": {"invoice_id": str(invoice.id)}}
+    ).id
+    session.commit()
+    payment_gateway.set_status(invoice.payment_id, "paid")
+    response = client.post(
+        f"/api/invoices/{invoice.id}/verify", headers=admin_auth_header
+    )
+    assert response.status_code == 200
+    assert response.json()["status"] == InvoiceStatus.PAID.value
+    session.expire_all()
+    assert invoice.status == InvoiceStatus.PAID
@@ -0,0 +1,127 @@
+import smtplib
+from digirent.core.services.mail import (
+    Email,
+    EmailTransport,
+    EmailTransportError,
+    FileTransport,
+    MemoryTransport,
+    RateLimiter,
+    SmtpTransport,
+    batch_by_recipient,
+    deliver,
+    delivery_metrics,
+)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds: float):
+        self.now += seconds
+
+
+class FailingTransport(EmailTransport):
+    name = "failing"
+
+    def send(self, email: Email):
+        if email.to.startswith("bounce"):
+            raise EmailTransportError("rejected")
+
+
+class FakeSMTP:
+    connections = []
+
+    def __init__(self, host, port, timeout=None):
+        self.sent = []
+        self.closed = False
+        self.disconnect_next = False
+        FakeSMTP.connections.append(self)
+
+    def send_message(self, message):
+        if self.disconnect_next:
+            raise smtplib.SMTPServerDisconnected("idle timeout")
+        self.sent.append(message["To"])
+
+    def close(self):
+        self.closed = True
+
+    def quit(self):
+        self.closed = True
+
+
+def test_batch_by_recipient_merges_notifications():
+    batched = batch_by_recipient(
+        [
+            Email(to="tenant@digirent.com", subject="Notice", message="first"),
+            Email(to="other@digirent.com", subject="Notice", message="other"),
+            Email(to="Tenant@digirent.com", subject="Notice", message="second"),
+            Email(to="tenant@digirent.com", subject="Verify", message="v", html="v"),
+        ]
+    )
+    assert [(email.to, indexes) for email, indexes in batched] == [
+        ("tenant@digirent.com", [0, 2]),
+        ("other@digirent.com", [1]),
+        ("tenant@digirent.com", [3]),
+    ]
+    assert batched[0][0].message == "first\n\nsecond"
+    assert batched[2][0].html == "v"
+
+
+def test_rate_limiter_spaces_calls():
+    clock = Clock()
+    limiter = RateLimiter(rate=2, clock=clock, sleep=clock.sleep)
+    for _ in range(5):
+        limiter.acquire()
+    # the first call goes through, the others wait half a second each
+    assert clock.now == 2
+
+
+def test_deliver_returns_failures_and_records_metrics():
+    delivery_metrics.pop("failing", None)
+    failed = deliver(
+        [
+            Email(to="tenant@digirent.com", subject="Notice", message="sent"),
+            Email(to="bounce@digirent.com", subject="Notice", message="failed"),
+        ],
+        transport=FailingTransport(),
+        rate_limiter=RateLimiter(rate=0),
+    )
+    assert [email.to for email in failed] == ["bounce@digirent.com"]
+    assert delivery_metrics["failing"]["sent"] == 1
+    assert delivery_metrics["failing"]["failed"] == 1
+
+
+def test_smtp_transport_reuses_connections(monkeypatch):
+    monkeypatch.setattr(smtplib, "SMTP", FakeSMTP)
+    FakeSMTP.connections = []
+    transport = SmtpTransport(host="localhost", port=25, username=None)
+    for index in range(3):
+        transport.send(Email(to=f"user{index}@digirent.com", subject="s", message="m"))
+    assert len(FakeSMTP.connections) == 1
+    FakeSMTP.connections[0].disconnect_next = True
+    transport.send(Email(to="user3@digirent.com", subject="s", message="m"))
+    assert len(FakeSMTP.connections) == 2
+    assert FakeSMTP.connections[0].closed
+    assert FakeSMTP.connections[1].sent == ["user3@digirent.com"]
+
+
+def test_file_transport_appends_json_lines(tmp_path):
+    path = tmp_path / "emails.jsonl"
+    transport = FileTransport(path=str(path))
+    transport.send(Email(to="tenant@digirent.com", subject="s", message="m"))
+    transport.send(Email(to="landlord@digirent.com", subject="s", message="m"))
+    assert len(path.read_text().splitlines()) == 2
+
+
+def test_memory_transport_keeps_emails():
+    transport = MemoryTransport()
+    deliver(
+        [Email(to="tenant@digirent.com", subject="s", message="m")],
+        transport=transport,
+        rate_limiter=RateLimiter(rate=0),
+    )
+    assert [email.to for email in transport.outbox] == ["tenant@digirent.com"]
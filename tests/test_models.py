@@ -201,6 +201,33 @@ def test_apartment_applications(tenant: Tenant, apartment: Apartment, session: S
     assert apartment_application.status == ApartmentApplicationStatus.NEW
 
 
+def test_apartment_application_status_transitions(
+    tenant: Tenant, apartment: Apartment, session: Session
+):
+    apartment_application = ApartmentApplication(
+        tenant_id=tenant.id, apartment_id=apartment.id
+    )
+    session.add(apartment_application)
+    session.commit()
+    with pytest.raises(ValueError):
+        apartment_application.transition_to(ApartmentApplicationStatus.PROCESSING)
+    apartment_application.transition_to(ApartmentApplicationStatus.CONSIDERED)
+    session.commit()
+    assert apartment_application.is_considered
+    assert session.query(ApartmentApplication.id).filter(
+        ApartmentApplication.apartment_id == apartment.id
+    ).filter(
+        ApartmentApplication.status == ApartmentApplicationStatus.CONSIDERED
+    ).one() == (
+        apartment_application.id,
+    )
+    apartment_application.transition_to(ApartmentApplicationStatus.REJECTED)
+    assert apartment_application.is_rejected
+    assert not apartment_application.can_transition_to(
+        ApartmentApplicationStatus.CONSIDERED
+    )
+
+
 def test_booking_request_relationships(
     apartment: Apartment,
     session: Session,
@@ -0,0 +1,222 @@
+import threading
+import time
+from datetime import datetime
+from uuid import uuid4
+from sqlalchemy.orm.session import Session
+from digirent.core.services import mail
+from digirent.core.services.mail import MemoryTransport
+from digirent.database.billing import record_invoice
+from digirent.database.enums import InvoiceStatus, InvoiceType, OutboxEffect
+from digirent.database.models import BillingState, Invoice, OutboxMessage
+from digirent.database.outbox import add_emails, add_outbox_message
+from digirent.worker import outbox
+from digirent.worker.outbox import (
+    HANDLERS,
+    ContractSignRequestHandler,
+    OutboxHandler,
+    RentPaymentHandler,
+    claim_due_messages,
+    drain_outbox,
+    drain_outbox_batch,
+)
+
+
+class FailingHandler(OutboxHandler):
+    def perform(self, payload: dict):
+        raise RuntimeError("unavailable")
+
+
+class SlowHandler(OutboxHandler):
+    def __init__(self, concurrency: int):
+        self.concurrency = concurrency
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.performed = []
+        self._lock = threading.Lock()
+
+    def perform(self, payload: dict):
+        with self._lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(0.01)
+        with self._lock:
+            self.in_flight -= 1
+            self.performed.append(payload["n"])
+
+
+class UnavailableGatewayHandler(RentPaymentHandler):
+    def perform(self, payload: dict):
+        raise RuntimeError("unavailable")
+
+
+def test_drain_outbox_sends_emails(session: Session, monkeypatch, capsys):
+    mail.delivery_metrics.pop("memory", None)
+    transport = MemoryTransport()
+    monkeypatch.setattr(mail, "get_email_transport", lambda: transport)
+    add_emails(
+        session,
+        [
+            {"to": "tenant@digirent.com", "subject": "One", "message": "1"},
+            {"to": "landlord@digirent.com", "subject": "Two", "message": "2"},
+        ],
+    )
+    session.commit()
+    counts = drain_outbox(session)
+    assert counts == {"messages": 2, "performed": 2, "retried": 0, "failed": 0}
+    assert sorted(email.to for email in transport.outbox) == [
+        "landlord@digirent.com",
+        "tenant@digirent.com",
+    ]
+    assert all(message.processed_at for message in session.query(OutboxMessage))
+    out = capsys.readouterr().out
+    assert "Email delivery" in out
+    assert "'memory': {'sent': 2, 'failed': 0" in out
+    assert drain_outbox(session)["messages"] == 0
+
+
+def test_drain_outbox_merges_notifications_to_a_recipient(
+    session: Session, monkeypatch
+):
+    transport = MemoryTransport()
+    monkeypatch.setattr(mail, "get_email_transport", lambda: transport)
+    add_emails(
+        session,
+        [
+            {"to": "tenant@digirent.com", "subject": "Notice", "message": "1"},
+            {"to": "tenant@digirent.com", "subject": "Notice", "message": "2"},
+        ],
+    )
+    session.commit()
+    counts = drain_outbox(session)
+    assert counts["performed"] == 2
+    assert [email.message for email in transport.outbox] == ["1\n\n2"]
+
+
+def test_drain_outbox_retries_with_backoff_then_gives_up(session: Session):
+    message = add_outbox_message(session, OutboxEffect.EMAIL, {"to": "x"})
+    session.commit()
+    handlers = {OutboxEffect.EMAIL: FailingHandler()}
+    counts = drain_outbox_batch(session, handlers, max_attempts=2, backoff_seconds=60)
+    assert counts["retried"] == 1
+    assert message.attempts == 1
+    assert message.last_error == "RuntimeError: unavailable"
+    assert message.available_at > datetime.utcnow()
+    assert not message.processed_at
+    # not due before its backoff has passed
+    assert drain_outbox_batch(session, handlers)["messages"] == 0
+    message.available_at = datetime.utcnow()
+    session.commit()
+    counts = drain_outbox_batch(session, handlers, max_attempts=2)
+    assert counts["failed"] == 1
+    assert message.attempts == 2
+    assert message.processed_at
+
+
+def test_drain_outbox_limits_concurrency_per_effect(session: Session):
+    for n in range(6):
+        add_outbox_message(session, OutboxEffect.EMAIL, {"n": n})
+    session.commit()
+    handler = SlowHandler(concurrency=2)
+    counts = drain_outbox(session, {OutboxEffect.EMAIL: handler}, batch_size=4)
+    assert counts["performed"] == 6
+    assert sorted(handler.performed) == list(range(6))
+    assert handler.max_in_flight == 2
+
+
+def test_rent_payment_sets_invoice_payment_id(session: Session):
+    invoice = Invoice(
+        type=InvoiceType.RENT, amount=100, next_date=datetime.utcnow().date()
+    )
+    session.add(invoice)
+    session.flush()
+    add_outbox_message(
+        session,
+        OutboxEffect.RENT_PAYMENT,
+        {
+            "invoice_id": str(invoice.id),
+            "payment": {
+                "amount": {"currency": "EUR", "value": "100.00"},
+                "description": "Rent",
+                "metadata": {"invoice_id": str(invoice.id)},
+            },
+        },
+    )
+    session.commit()
+    assert isinstance(HANDLERS[OutboxEffect.RENT_PAYMENT], RentPaymentHandler)
+    counts = drain_outbox(session)
+    assert counts["performed"] == 1
+    session.refresh(invoice)
+    assert invoice.payment_id
+
+
+def test_rent_payment_given_up_fails_the_invoice(session: Session):
+    invoice = Invoice(
+        user_id=None,
+        type=InvoiceType.RENT,
+        amount=100,
+        next_date=datetime.utcnow().date(),
+    )
+    session.add(invoice)
+    session.flush()
+    record_invoice(session, invoice)
+    add_outbox_message(
+        session,
+        OutboxEffect.RENT_PAYMENT,
+        {"invoice_id": str(invoice.id), "payment": {}},
+    )
+    session.commit()
+    handlers = {OutboxEffect.RENT_PAYMENT: UnavailableGatewayHandler()}
+    counts = drain_outbox_batch(session, handlers, max_attempts=1)
+    assert counts["failed"] == 1
+    session.expire_all()
+    assert invoice.status == InvoiceStatus.FAILED
+    assert session.query(BillingState).one().latest_invoice_status == (
+        InvoiceStatus.FAILED
+    )
+
+
+def test_claimed_messages_are_leased(session: Session):
+    message = add_outbox_message(session, OutboxEffect.EMAIL, {"to": "x"})
+    session.commit()
+    assert claim_due_messages(session, 10, lease_seconds=60) == [message]
+    # another run does not take it while it is performed
+    assert claim_due_messages(session, 10) == []
+    assert message.available_at > datetime.utcnow()
+    # the lease of a run that died runs out
+    message.available_at = datetime.utcnow()
+    session.commit()
+    assert claim_due_messages(session, 10) == [message]
+
+
+def test_drain_outbox_stops_starting_batches_in_time(session: Session):
+    for n in range(3):
+        add_outbox_message(session, OutboxEffect.EMAIL, {"n": n})
+    session.commit()
+    handler = SlowHandler(concurrency=1)
+    counts = drain_outbox(
+        session, {OutboxEffect.EMAIL: handler}, batch_size=1, max_seconds=0
+    )
+    assert counts["performed"] == 1
+
+
+def test_contract_sign_request_is_not_sent_twice(monkeypatch):
+    open_documents, sent = set(), []
+
+    def send(apartment_application_id, landlord_email, tenant_email):
+        sent.append(apartment_application_id)
+        open_documents.add(apartment_application_id)
+
+    monkeypatch.setattr(
+        outbox, "has_open_contract_document", open_documents.__contains__
+    )
+    monkeypatch.setattr(outbox, "send_contract_sign_request", send)
+    payload = {
+        "apartment_application_id": str(uuid4()),
+        "landlord_email": "landlord@digirent.com",
+        "tenant_email": "tenant@digirent.com",
+    }
+    handler = ContractSignRequestHandler()
+    handler.perform(payload)
+    # a retry of a request that created the document before it failed
+    handler.perform(payload)
+    assert len(sent) == 1
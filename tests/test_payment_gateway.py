@@ -0,0 +1,153 @@
+import asyncio
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+import pytest
+from fastapi.testclient import TestClient
+from digirent.core.services.fake_mollie import create_fake_mollie_app
+from digirent.core.services.payment_gateway import (
+    FakePaymentGateway,
+    MolliePaymentGateway,
+    PaymentGateway,
+    PaymentGatewayError,
+)
+
+payment_data = {
+    "amount": {"currency": "EUR", "value": "450.35"},
+    "description": "Invoice for payment",
+    "metadata": {"type": "rent", "invoice_id": "some-invoice-id"},
+}
+
+
+class MollieHandler(BaseHTTPRequestHandler):
+    """Fails the first request of every path with 503, then succeeds"""
+
+    requests = []
+
+    def log_message(self, *args):
+        pass
+
+    def respond(self, status: int, body: dict):
+        content = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def do_POST(self):
+        length = int(self.headers["Content-Length"])
+        self.requests.append(
+            (
+                self.path,
+                self.headers["Idempotency-Key"],
+                json.loads(self.rfile.read(length)),
+            )
+        )
+        if len(self.requests) == 1:
+            return self.respond(503, {"detail": "Service unavailable"})
+        self.respond(201, {"id": "tr_12345", "status": "open"})
+
+    def do_GET(self):
+        self.respond(404, {"detail": "No payment exists with token tr_unknown"})
+
+
+@pytest.fixture
+def mollie_server():
+    MollieHandler.requests = []
+    server = HTTPServer(("127.0.0.1", 0), MollieHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}/v2"
+    server.shutdown()
+
+
+def test_mollie_gateway_retries_create_with_the_same_idempotency_key(mollie_server):
+    gateway = MolliePaymentGateway(
+        api_key="test_key", base_url=mollie_server, retry_backoff=0.01
+    )
+    payment = gateway.create_payment(payment_data, idempotency_key="invoice-1")
+    assert payment.id == "tr_12345"
+    assert payment.is_open()
+    assert [request[:2] for request in MollieHandler.requests] == [
+        ("/v2/payments", "invoice-1"),
+        ("/v2/payments", "invoice-1"),
+    ]
+    assert MollieHandler.requests[-1][2] == payment_data
+
+
+def test_mollie_gateway_raises_client_errors_without_retrying(mollie_server):
+    gateway = MolliePaymentGateway(api_key="test_key", base_url=mollie_server)
+    with pytest.raises(PaymentGatewayError) as err:
+        asyncio.get_event_loop().run_until_complete(gateway.aget_payment("tr_unknown"))
+    assert err.value.status_code == 404
+
+
+def test_fake_gateway_payments():
+    gateway = FakePaymentGateway()
+    payment = gateway.create_payment(payment_data, idempotency_key="invoice-1")
+    assert payment.metadata == payment_data["metadata"]
+    assert gateway.create_payment(payment_data, "invoice-1").id == payment.id
+    gateway.set_status(payment.id, "paid")
+    assert gateway.get_payment(payment.id).is_paid()
+    with pytest.raises(PaymentGatewayError):
+        gateway.get_payment("tr_unknown")
+
+
+def test_get_payments_bounds_concurrency():
+    gateway = FakePaymentGateway(latency=0.01)
+    payment_ids = [
+        gateway.create_payment(payment_data, f"invoice-{index}").id
+        for index in range(20)
+    ]
+    payments = gateway.get_payments(payment_ids + ["tr_unknown"], concurrency=4)
+    assert [payment.id for payment in payments[:-1]] == payment_ids
+    assert isinstance(payments[-1], PaymentGatewayError)
+    assert gateway.calls == 41
+    assert gateway.max_in_flight == 4
+
+
+def test_mollie_get_payments_keeps_the_shared_client_open(mollie_server):
+    gateway = MolliePaymentGateway(api_key="test_key", base_url=mollie_server)
+    loop = asyncio.new_event_loop()
+    try:
+        with pytest.raises(PaymentGatewayError):
+            loop.run_until_complete(gateway.aget_payment("tr_unknown"))
+        async_client = gateway.async_client
+        (payment,) = gateway.get_payments(["tr_unknown"])
+        assert isinstance(payment, PaymentGatewayError)
+        assert gateway.async_client is async_client
+        # still usable on the caller's loop
+        with pytest.raises(PaymentGatewayError) as err:
+            loop.run_until_complete(gateway.aget_payment("tr_unknown"))
+        assert err.value.status_code == 404
+        loop.run_until_complete(gateway.aclose())
+    finally:
+        loop.close()
+
+
+def test_fake_mollie_api():
+    client = TestClient(create_fake_mollie_app())
+    headers = {"Idempotency-Key": "invoice-1"}
+    response = client.post("/v2/payments", json=payment_data, headers=headers)
+    assert response.status_code == 201
+    payment = response.json()
+    assert payment["status"] == "open"
+    response = client.post("/v2/payments", json=payment_data, headers=headers)
+    assert response.json()["id"] == payment["id"]
+    response = client.patch(f"/v2/payments/{payment['id']}", json={"status": "paid"})
+    assert response.json()["status"] == "paid"
+    assert client.get(f"/v2/payments/{payment['id']}").json()["status"] == "paid"
+    assert client.get("/v2/payments/tr_unknown").status_code == 404
+
+
+def test_incomplete_gateway_fails_when_created():
+    class SyncOnlyGateway(PaymentGateway):
+        def create_payment(self, data: dict, idempotency_key: str = None):
+            pass
+
+        def get_payment(self, payment_id: str):
+            pass
+
+    with pytest.raises(TypeError):
+        SyncOnlyGateway()
@@ -0,0 +1,107 @@
+from datetime import date, datetime, timedelta
+from fastapi.testclient import TestClient
+from sqlalchemy.orm.session import Session
+from digirent.core.services.payment_gateway import get_payment_gateway
+from digirent.database.enums import InvoiceStatus, InvoiceType
+from digirent.database.models import Invoice, PaymentWebhookEvent, Tenant
+from digirent.worker.payments import (
+    process_payment_webhooks,
+    reconcile_pending_invoices,
+)
+
+
+def create_invoice(session: Session, tenant: Tenant) -> Invoice:
+    invoice = Invoice(
+        type=InvoiceType.SUBSCRIPTION,
+        status=InvoiceStatus.PENDING,
+        user_id=tenant.id,
+        amount=10,
+        description="Subscription",
+        next_date=date.today(),
+    )
+    session.add(invoice)
+    session.flush()
+    payment = get_payment_gateway().create_payment(
+        {"metadata": {"type": invoice.type.value, "invoice_id": str(invoice.id)}}
+    )
+    invoice.payment_id = payment.id
+    session.commit()
+    return invoice
+
+
+def test_payment_webhook_records_payment_once(client: TestClient, session: Session):
+    for _ in range(3):
+        response = client.post("/api/payments/webhook", data={"id": "tr_12345"})
+        assert response.status_code == 200
+    events = session.query(PaymentWebhookEvent).all()
+    assert len(events) == 1
+    assert events[0].payment_id == "tr_12345"
+    assert events[0].version == 3
+    assert events[0].processed_at is None
+
+
+def test_payment_webhooks_are_processed_in_batches(
+    client: TestClient, session: Session, tenant: Tenant
+):
+    paid_invoice = create_invoice(session, tenant)
+    failed_invoice = create_invoice(session, tenant)
+    open_invoice = create_invoice(session, tenant)
+    payment_gateway = get_payment_gateway()
+    payment_gateway.set_status(paid_invoice.payment_id, "paid")
+    payment_gateway.set_status(failed_invoice.payment_id, "expired")
+    for invoice in [paid_invoice, failed_invoice, open_invoice]:
+        client.post("/api/payments/webhook", data={"id": invoice.payment_id})
+    client.post("/api/payments/webhook", data={"id": "tr_unknown"})
+
+    counts = process_payment_webhooks()
+    assert counts == {"events": 4, "paid": 1, "failed": 1, "errors": 1}
+    session.expire_all()
+    assert paid_invoice.status == InvoiceStatus.PAID
+    assert failed_invoice.status == InvoiceStatus.FAILED
+    assert open_invoice.status == InvoiceStatus.PENDING
+    unknown = (
+        session.query(PaymentWebhookEvent)
+        .filter(PaymentWebhookEvent.payment_id == "tr_unknown")
+        .one()
+    )
+    assert unknown.processed_at is None
+    assert unknown.attempts == 1
+    assert (
+        session.query(PaymentWebhookEvent)
+        .filter(PaymentWebhookEvent.processed_at.isnot(None))
+        .count()
+        == 3
+    )
+
+
+def test_reconcile_pending_invoices_in_pages(session: Session, tenant: Tenant):
+    invoices = [create_invoice(session, tenant) for _ in range(5)]
+    created_at = datetime.utcnow() - timedelta(hours=2)
+    for invoice in invoices:
+        invoice.created_at = created_at
+    recent_invoice = create_invoice(session, tenant)
+    payment_gateway = get_payment_gateway()
+    payment_gateway.set_status(invoices[0].payment_id, "paid")
+    payment_gateway.set_status(invoices[3].payment_id, "canceled")
+    invoices[4].payment_id = "tr_unknown"
+    session.commit()
+
+    report = reconcile_pending_invoices(session, payment_gateway, batch_size=2)
+    assert report["batches"] == 3
+    assert {key: report[key] for key in ["checked", "paid", "failed", "unchanged"]} == {
+        "checked": 5,
+        "paid": 1,
+        "failed": 1,
+        "unchanged": 2,
+    }
+    assert report["errors"] == 1
+    assert report["error_payment_ids"] == ["tr_unknown"]
+    session.expire_all()
+    assert [invoice.status for invoice in invoices] == [
+        InvoiceStatus.PAID,
+        InvoiceStatus.PENDING,
+        InvoiceStatus.PENDING,
+        InvoiceStatus.FAILED,
+        InvoiceStatus.PENDING,
+    ]
+    assert recent_invoice.status == InvoiceStatus.PENDING
@@ -0,0 +1,98 @@
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy.orm.session import Session
+from digirent.database.billing import record_invoice
+from digirent.database.enums import ApartmentApplicationStatus, InvoiceType
+from digirent.database.models import ApartmentApplication, Invoice
+from digirent.util import get_current_date
+from digirent.database import base
+from digirent.worker import rent
+from digirent.worker.db import task_metrics
+from digirent.worker.rent import create_rent_invoice, due_rent_applications
+
+
+def rent_invoice(
+    apartment_application: ApartmentApplication, next_date, days_ago: int
+) -> Invoice:
+    return Invoice(
+        apartment_application_id=apartment_application.id,
+        type=InvoiceType.RENT,
+        amount=100,
+        next_date=next_date,
+        created_at=datetime.utcnow() - timedelta(days=days_ago),
+    )
+
+
+def add_invoices(session: Session, *invoices: Invoice):
+    for invoice in invoices:
+        session.add(invoice)
+        session.flush()
+        record_invoice(session, invoice)
+    session.commit()
+
+
+def complete(session: Session, apartment_application: ApartmentApplication):
+    apartment_application.contract.landlord_has_provided_keys = True
+    apartment_application.contract.tenant_has_received_keys = True
+    apartment_application.transition_to(ApartmentApplicationStatus.COMPLETED)
+    session.commit()
+
+
+def test_due_rent_applications_uses_latest_invoice(
+    session: Session, awarded_apartment_application: ApartmentApplication
+):
+    today = get_current_date()
+    complete(session, awarded_apartment_application)
+    add_invoices(
+        session,
+        rent_invoice(awarded_apartment_application, today - timedelta(days=30), 60),
+        rent_invoice(awarded_apartment_application, today, 30),
+    )
+    assert due_rent_applications(session, today).all() == [
+        (awarded_apartment_application.id, today)
+    ]
+    add_invoices(
+        session,
+        rent_invoice(awarded_apartment_application, today + timedelta(days=30), 0),
+    )
+    assert not due_rent_applications(session, today).all()
+
+
+def test_due_rent_applications_skips_applications_without_invoice(
+    session: Session, awarded_apartment_application: ApartmentApplication
+):
+    complete(session, awarded_apartment_application)
+    assert not due_rent_applications(session, get_current_date()).all()
+
+
+def test_due_rent_applications_skips_uncompleted_applications(
+    session: Session, awarded_apartment_application: ApartmentApplication
+):
+    today = get_current_date()
+    add_invoices(session, rent_invoice(awarded_apartment_application, today, 30))
+    assert not due_rent_applications(session, today).all()
+
+
+def test_failed_rent_invoice_releases_its_claim_and_raises(
+    session: Session, awarded_apartment_application: ApartmentApplication, monkeypatch
+):
+    released = []
+
+    class Claims:
+        def release(self, *keys: str):
+            released.extend(keys)
+
+    def create_rent_payment(*args):
+        raise RuntimeError("unavailable")
+
+    # the fixture's session stays open for its teardown
+    monkeypatch.setattr(session, "close", lambda: None)
+    monkeypatch.setattr(base, "SessionLocal", lambda: session)
+    monkeypatch.setattr(rent, "DispatchClaims", Claims)
+    monkeypatch.setattr(rent, "create_rent_payment", create_rent_payment)
+    failures = task_metrics.get("create_rent_invoice", {}).get("failures", 0)
+    today = get_current_date()
+    with pytest.raises(RuntimeError):
+        create_rent_invoice(awarded_apartment_application.id, today.isoformat())
+    assert released == [f"rent:{awarded_apartment_application.id}:{today.isoformat()}"]
+    assert task_metrics["create_rent_invoice"]["failures"] == failures + 1
@@ -0,0 +1,105 @@
+import threading
+import time
+from types import SimpleNamespace
+import pytest
+from digirent.core.services import sign_request
+from digirent.core.services.sign_request import ReadCache, has_open_contract_document
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_read_cache_keeps_reads_for_ttl():
+    clock = Clock()
+    cache = ReadCache(ttl=60, clock=clock)
+    reads = []
+
+    def read():
+        reads.append(1)
+        return len(reads)
+
+    assert cache.get(("document", "doc-1"), read) == 1
+    clock.now = 59
+    assert cache.get(("document", "doc-1"), read) == 1
+    clock.now = 61
+    assert cache.get(("document", "doc-1"), read) == 2
+
+
+def test_read_cache_invalidates_reads_by_id():
+    cache = ReadCache(ttl=60)
+    cache.get(("documents", "external-1", 1, 20), lambda: "first page")
+    cache.get(("document", "doc-1"), lambda: "document")
+    cache.get(("documents", "external-2", 1, 20), lambda: "other")
+    cache.invalidate("external-1", "doc-1")
+    assert cache.get(("documents", "external-1", 1, 20), lambda: "new") == "new"
+    assert cache.get(("document", "doc-1"), lambda: "new document") == "new document"
+    assert cache.get(("documents", "external-2", 1, 20), lambda: "new") == "other"
+
+
+def test_read_cache_coalesces_concurrent_misses():
+    cache = ReadCache(ttl=60)
+    reads = []
+    started = threading.Event()
+
+    def read():
+        reads.append(1)
+        started.set()
+        time.sleep(0.1)
+        return "document"
+
+    results = []
+    threads = [
+        threading.Thread(
+            target=lambda: results.append(cache.get(("document", "doc-1"), read))
+        )
+        for _ in range(5)
+    ]
+    threads[0].start()
+    started.wait()
+    for thread in threads[1:]:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == ["document"] * 5
+    assert len(reads) == 1
+
+
+def test_read_cache_does_not_keep_failures():
+    cache = ReadCache(ttl=60)
+
+    def fail():
+        raise ValueError("signrequest unavailable")
+
+    with pytest.raises(ValueError):
+        cache.get(("document", "doc-1"), fail)
+    assert cache.get(("document", "doc-1"), lambda: "document") == "document"
+
+
+def test_read_cache_evicts_oldest_entries():
+    cache = ReadCache(ttl=60, max_entries=2)
+    for document_id in ["doc-1", "doc-2", "doc-3"]:
+        cache.get(("document", document_id), lambda: document_id)
+    assert cache.get(("document", "doc-1"), lambda: "read again") == "read again"
+    assert cache.get(("document", "doc-3"), lambda: "read again") == "doc-3"
+
+
+def test_only_documents_out_for_signing_are_open(monkeypatch):
+    statuses = []
+
+    def documents(document_external_id, page_size, cached):
+        assert not cached
+        return SimpleNamespace(
+            results=[SimpleNamespace(status=status) for status in statuses]
+        )
+
+    monkeypatch.setattr(sign_request, "get_list_of_documents", documents)
+    assert not has_open_contract_document("application-1")
+    statuses.extend(["de", "xp"])
+    assert not has_open_contract_document("application-1")
+    statuses.append("se")
+    assert has_open_contract_document("application-1")
@@ -0,0 +1,59 @@
+from datetime import datetime, timedelta
+from sqlalchemy.orm.session import Session
+from digirent.database.billing import record_invoice
+from digirent.database.enums import InvoiceType
+from digirent.database.models import Admin, Invoice, Landlord, Tenant, User
+from digirent.util import get_current_date
+from digirent.worker.subscription import due_subscriptions
+
+
+def subscription_invoice(user: User, next_date, days_ago: int) -> Invoice:
+    return Invoice(
+        user_id=user.id,
+        type=InvoiceType.SUBSCRIPTION,
+        amount=10,
+        next_date=next_date,
+        created_at=datetime.utcnow() - timedelta(days=days_ago),
+    )
+
+
+def add_invoices(session: Session, *invoices: Invoice):
+    for invoice in invoices:
+        session.add(invoice)
+        session.flush()
+        record_invoice(session, invoice)
+    session.commit()
+
+
+def verify(session: Session, *users: User):
+    for user in users:
+        user.email_verified = True
+    session.commit()
+
+
+def test_due_subscriptions_uses_latest_invoice(
+    session: Session, tenant: Tenant, landlord: Landlord
+):
+    today = get_current_date()
+    verify(session, tenant, landlord)
+    add_invoices(
+        session,
+        subscription_invoice(tenant, today - timedelta(days=30), 60),
+        subscription_invoice(tenant, today, 30),
+        subscription_invoice(landlord, today - timedelta(days=1), 31),
+        subscription_invoice(landlord, today + timedelta(days=29), 1),
+    )
+    assert due_subscriptions(session, today).all() == [(tenant.id, today)]
+
+
+def test_due_subscriptions_skips_inactive_users_and_admins(
+    session: Session, tenant: Tenant, landlord: Landlord, admin: Admin
+):
+    today = get_current_date()
+    verify(session, tenant, admin)
+    tenant.is_suspended = True
+    add_invoices(
+        session,
+        *[subscription_invoice(user, today, 30) for user in [tenant, landlord, admin]]
+    )
+    assert not due_subscriptions(session, today).all()
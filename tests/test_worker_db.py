@@ -0,0 +1,52 @@
+import os
+import pytest
+from sqlalchemy import create_engine
+from digirent.database.base import add_pid_guard
+from digirent.worker.db import task_metrics, task_session
+
+
+class FakeSession:
+    def __init__(self):
+        self.calls = []
+
+    def commit(self):
+        self.calls.append("commit")
+
+    def rollback(self):
+        self.calls.append("rollback")
+
+    def close(self):
+        self.calls.append("close")
+
+
+def test_task_session_commits_and_closes():
+    session = FakeSession()
+    with task_session("test_task_session_commits", lambda: session) as yielded:
+        assert yielded is session
+    assert session.calls == ["commit", "close"]
+    metrics = task_metrics["test_task_session_commits"]
+    assert metrics["runs"] == 1
+    assert metrics["failures"] == 0
+
+
+def test_task_session_rolls_back_and_reraises():
+    session = FakeSession()
+    with pytest.raises(ValueError):
+        with task_session("test_task_session_rolls_back", lambda: session):
+            raise ValueError("task failed")
+    assert session.calls == ["rollback", "close"]
+    metrics = task_metrics["test_task_session_rolls_back"]
+    assert metrics["runs"] == 1
+    assert metrics["failures"] == 1
+
+
+def test_pid_guard_replaces_connections_of_another_process(monkeypatch):
+    engine = create_engine("sqlite:///:memory:")
+    add_pid_guard(engine)
+    with engine.connect() as connection:
+        parent_connection = connection.connection.connection
+    # the pool still holds the connection, as after a fork
+    monkeypatch.setattr(os, "getpid", lambda: -1)
+    with engine.connect() as connection:
+        assert connection.connection.connection is not parent_connection
+        assert connection.scalar("select 1") == 1
@@ -0,0 +1,75 @@
+from datetime import date
+from uuid import uuid4
+import pytest
+from digirent.database.enums import InvoiceType
+from digirent.worker.dispatch import billing_key, dispatch_in_chunks
+
+
+class FakeClaims:
+    def __init__(self, *claimed: str):
+        self.claimed = set(claimed)
+
+    def claim(self, key: str) -> bool:
+        if key in self.claimed:
+            return False
+        self.claimed.add(key)
+        return True
+
+    def release(self, *keys: str):
+        self.claimed.difference_update(keys)
+
+
+class FakeTask:
+    def __init__(self, fail: bool = False):
+        self.fail = fail
+        self.groups = []
+
+    def chunks(self, items, chunk_size):
+        task = self
+
+        class Chunks:
+            def apply_async(self, queue):
+                if task.fail:
+                    raise ConnectionError("broker is down")
+                task.groups.append((list(items), chunk_size, queue))
+
+        return Chunks()
+
+
+def test_dispatch_in_chunks_skips_claimed_billing_keys():
+    billing_period = date(2026, 10, 1)
+    due = [(uuid4(), billing_period) for _ in range(5)]
+    claims = FakeClaims(billing_key(InvoiceType.RENT, due[0][0], billing_period))
+    task = FakeTask()
+    counts = dispatch_in_chunks(
+        task,
+        InvoiceType.RENT,
+        due,
+        queue="rent-queue",
+        claims=claims,
+        chunk_size=2,
+        batch_size=3,
+    )
+    assert counts == {"due": 5, "scheduled": 4, "duplicate": 1}
+    assert [len(items) for items, _, _ in task.groups] == [3, 1]
+    assert all(queue == "rent-queue" for _, _, queue in task.groups)
+    assert task.groups[0][0][0] == (str(due[1][0]), "2026-10-01")
+
+    counts = dispatch_in_chunks(
+        task, InvoiceType.RENT, due, queue="rent-queue", claims=claims
+    )
+    assert counts == {"due": 5, "scheduled": 0, "duplicate": 5}
+
+
+def test_dispatch_in_chunks_releases_claims_when_queueing_fails():
+    due = [(uuid4(), date(2026, 10, 1)) for _ in range(3)]
+    claims = FakeClaims()
+    with pytest.raises(ConnectionError):
+        dispatch_in_chunks(
+            FakeTask(fail=True),
+            InvoiceType.SUBSCRIPTION,
+            due,
+            queue="subscription-queue",
+            claims=claims,
+        )
+    assert not claims.claimed